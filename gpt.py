@@ -5,8 +5,14 @@ from io import BytesIO
 from PIL import Image
 from tqdm import tqdm
 import time
+import argparse
+import asyncio
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from pipeline.assets import GEN_INSTRUCTION, GEN_MERGED, GEN_SOURCE, get_asset_cache
+from pipeline.image_pack import IMAGE_PACKS_ENV
+from pipeline.io_utils import image_exists, image_size, load_image
 
 
 # ================= Configuration Section =================
@@ -95,41 +101,60 @@ def pil_to_bytes_stream(image, name="image.png"):
     img_byte_arr.name = name
     return img_byte_arr
 
+def display_size(size, max_size=MAX_DISPLAY_SIZE):
+    """Size after resize_image_if_needed, or None if no downscale is needed"""
+    w, h = size
+    if max(w, h) > max_size:
+        scale = max_size / max(w, h)
+        return (int(w * scale), int(h * scale))
+    return None
+
+def load_display_image(path, max_size=MAX_DISPLAY_SIZE):
+    """
+    Load an image as RGB at display size. The target size is taken from the header,
+    so JPEGs are decoded at a reduced scale instead of full resolution.
+    """
+    target = display_size(image_size(path), max_size)
+    img = load_image(path, target_size=target)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if target is not None and img.size != target:
+        img = img.resize(target, Image.Resampling.LANCZOS)
+    return img
+
 def process_and_merge_images(source_path, layer_path=None, max_size=MAX_DISPLAY_SIZE):
     """
     Read source image and layer (optional), composite them, and resize.
     If layer_path is None or empty, only process source_path
     """
     try:
-        # 1. Open Source image
-        source_img = Image.open(source_path).convert("RGBA")
-        
+        # 1. Final size from the source header (decode can then be reduced)
+        target = display_size(image_size(source_path), max_size)
+
         # 2. Check if need to composite Layer
-        if layer_path and os.path.exists(layer_path):
-            layer_img = Image.open(layer_path).convert("RGBA")
-            
+        if layer_path and image_exists(layer_path):
+            # Compositing needs RGBA
+            source_img = load_image(source_path, target_size=target, need_alpha=True)
+            layer_img = load_image(layer_path, target_size=source_img.size, need_alpha=True)
+
             # Resize layer to match source
             if source_img.size != layer_img.size:
                 layer_img = layer_img.resize(source_img.size, Image.Resampling.LANCZOS)
-            
+
             # Composite
             final_img = Image.alpha_composite(source_img, layer_img)
         else:
-            # If no layer, use source directly
+            # If no layer, use source directly (no RGBA round trip)
             # (If layer_path exists but file not found, skip compositing and use original image,
             # If you want to raise error, add raise FileNotFoundError in else)
-            final_img = source_img
+            return load_display_image(source_path, max_size)
 
         # 3. Convert to RGB (remove Alpha channel)
         final_img = final_img.convert("RGB")
 
         # 4. Size optimization (Resize)
-        w, h = final_img.size
-        if max(w, h) > max_size:
-            scale = max_size / max(w, h)
-            new_w = int(w * scale)
-            new_h = int(h * scale)
-            final_img = final_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+        if target is not None and final_img.size != target:
+            final_img = final_img.resize(target, Image.Resampling.LANCZOS)
 
         return final_img
 
@@ -141,6 +166,72 @@ def process_and_merge_images(source_path, layer_path=None, max_size=MAX_DISPLAY_
         return None
 
 
+GENERATION_FILE_NAMES = {
+    GEN_MERGED: "merged.png",
+    GEN_SOURCE: "source.png",
+    GEN_INSTRUCTION: "instruction.png",
+}
+
+
+def bytes_to_named_stream(data, name):
+    """Wrap already-encoded image bytes as a named stream for images.edit"""
+    stream = BytesIO(data)
+    stream.name = name
+    return stream
+
+def generation_asset_inputs(task_name, source_full_path, instr_full_path):
+    """Input files of each generation-side image, in the order they are sent"""
+    has_instr = bool(instr_full_path) and image_exists(instr_full_path)
+    if task_name == "Pose_Control":
+        roles = {GEN_SOURCE: [source_full_path]}
+        if has_instr:
+            roles[GEN_INSTRUCTION] = [instr_full_path]
+        return roles
+    return {GEN_MERGED: [source_full_path] + ([instr_full_path] if has_instr else [])}
+
+def build_generation_images(task_name, source_full_path, instr_full_path):
+    """
+    Encode the images sent to images.edit for one sample.
+    Returns [(asset_role, file_name, png_bytes), ...] or None if the sample must be skipped.
+    """
+    prepared = []
+    # *** Special handling for Pose_Control ***
+    if task_name == "Pose_Control":
+        # 1. Source Image
+        if not image_exists(source_full_path):
+            print(f"Source image missing: {source_full_path}")
+            return None
+        src_img = load_display_image(source_full_path)
+        prepared.append((GEN_SOURCE, GENERATION_FILE_NAMES[GEN_SOURCE], pil_to_bytes_stream(src_img).getvalue()))
+
+        # 2. Visual Instruction (if exists)
+        if instr_full_path and image_exists(instr_full_path):
+            inst_img = load_display_image(instr_full_path)
+            prepared.append((GEN_INSTRUCTION, GENERATION_FILE_NAMES[GEN_INSTRUCTION], pil_to_bytes_stream(inst_img).getvalue()))
+
+    # *** Other tasks (default merge) ***
+    else:
+        combined_img = process_and_merge_images(source_full_path, instr_full_path)
+        if combined_img is None:
+            return None
+        prepared.append((GEN_MERGED, GENERATION_FILE_NAMES[GEN_MERGED], pil_to_bytes_stream(combined_img).getvalue()))
+    return prepared
+
+def load_generation_images(task_name, item_id, source_full_path, instr_full_path):
+    """Same as build_generation_images, served from the asset cache ($VIBE_ASSET_CACHE) when up to date"""
+    cache = get_asset_cache()
+    if cache is not None:
+        prepared = []
+        for role, inputs in generation_asset_inputs(task_name, source_full_path, instr_full_path).items():
+            data = cache.get(task_name, item_id, role, inputs)
+            if data is None:
+                break
+            prepared.append((role, GENERATION_FILE_NAMES[role], data))
+        else:
+            return prepared
+    return build_generation_images(task_name, source_full_path, instr_full_path)
+
+
 # ================= Main Logic Class =================
 
 class BenchmarkEvaluator:
@@ -150,15 +241,18 @@ class BenchmarkEvaluator:
         self.model_name = "gpt-image-1"
         self.run_suffix = CUSTOM_RUN_SUFFIX
 
-    def run_task(self, task_name):
-        """运行指定的Task，并将结果保存在原数据目录下的模型文件夹中"""
+    def prepare_task(self, task_name):
+        """Create the output folders and load annotations plus any existing results.
+
+        Returns None for an unknown task, otherwise a dict with the paths and state
+        shared by the sync and async runners.
+        """
         if task_name not in TASK_CONFIG:
             print(f"Task '{task_name}' not found.")
-            return
+            return None
 
         config = TASK_CONFIG[task_name]
         json_path = config['json_path']
-        image_root = config['image_root']
         
         # --- [Key Modification] Build save path ---
         base_task_dir = os.path.dirname(json_path)
@@ -199,7 +293,44 @@ class BenchmarkEvaluator:
                 print(f"Skipping {len(processed_ids)} already processed items.")
             except json.JSONDecodeError:
                 print("Existing JSON is corrupt. Starting fresh.")
+
+        return {
+            "data": data,
+            "results": results,
+            "processed_ids": processed_ids,
+            "image_root": config['image_root'],
+            "base_task_dir": base_task_dir,
+            "save_dir": save_dir,
+            "img_save_dir": img_save_dir,
+            "output_json_path": output_json_path,
+        }
+
+    @staticmethod
+    def item_inputs(item, image_root, base_task_dir):
+        """(source_full_path, instr_full_path or None, prompt_text) for one annotation."""
+        source_rel_path = item['file_paths']['source']
+        source_full_path = os.path.join(image_root, source_rel_path)
         
+        instr_rel_path = item['file_paths'].get('visual_instruction', "")
+        if instr_rel_path and instr_rel_path.strip() != "":
+            instr_full_path = os.path.join(base_task_dir, instr_rel_path)
+        else:
+            instr_full_path = None # Mark as None, subsequent function will recognize
+        prompt_text = item['text_prompt']['input_prompt']
+        return source_full_path, instr_full_path, prompt_text
+
+    def run_task(self, task_name):
+        """运行指定的Task，并将结果保存在原数据目录下的模型文件夹中"""
+        state = self.prepare_task(task_name)
+        if state is None:
+            return
+        data = state["data"]
+        results = state["results"]
+        processed_ids = state["processed_ids"]
+        save_dir = state["save_dir"]
+        img_save_dir = state["img_save_dir"]
+        output_json_path = state["output_json_path"]
+
         # Iterate through data
         for item in tqdm(data, desc=f"Processing {task_name}"):
             item_id = item['id']
@@ -207,47 +338,18 @@ class BenchmarkEvaluator:
             if item_id in processed_ids:
                 continue
             
-            # --- Path resolution (unchanged) ---
-            source_rel_path = item['file_paths']['source']
-            source_full_path = os.path.join(image_root, source_rel_path)
-            
-            instr_rel_path = item['file_paths'].get('visual_instruction', "")
-            if instr_rel_path and instr_rel_path.strip() != "":
-                instr_full_path = os.path.join(base_task_dir, instr_rel_path)
-            else:
-                instr_full_path = None # Mark as None, subsequent function will recognize
-            prompt_text = item['text_prompt']['input_prompt']
-
-            image_streams = []
+            source_full_path, instr_full_path, prompt_text = self.item_inputs(
+                item, state["image_root"], state["base_task_dir"]
+            )
 
             try:
-                # *** Special handling for Pose_Control ***
-                if task_name == "Pose_Control":
-                    # 1. Source Image
-                    if os.path.exists(source_full_path):
-                        src_img = Image.open(source_full_path).convert("RGB")
-                        src_img = resize_image_if_needed(src_img)
-                        image_streams.append(pil_to_bytes_stream(src_img, name="source.png"))
-                    else:
-                        print(f"Source image missing for {item_id}")
-                        continue
-                    
-                    # 2. Visual Instruction (if exists)
-                    if instr_full_path and os.path.exists(instr_full_path):
-                        inst_img = Image.open(instr_full_path).convert("RGB")
-                        inst_img = resize_image_if_needed(inst_img)
-                        image_streams.append(pil_to_bytes_stream(inst_img, name="instruction.png"))
-                
-                # *** Other tasks (default merge) ***
-                else:
-                    combined_img = process_and_merge_images(source_full_path, instr_full_path)
-                    if combined_img is None:
-                        continue
-                    image_streams.append(pil_to_bytes_stream(combined_img, name="merged.png"))
-
+                prepared = load_generation_images(task_name, item_id, source_full_path, instr_full_path)
             except Exception as e:
                 print(f"Error preparing images for {item_id}: {e}")
                 continue
+            if prepared is None:
+                continue
+            image_streams = [bytes_to_named_stream(data, name) for _, name, data in prepared]
 
             current_result = {}
 
@@ -313,11 +415,178 @@ class BenchmarkEvaluator:
         
         print(f"Task finished. Results and images saved to: {save_dir}")
 
+class AsyncBenchmarkEvaluator(BenchmarkEvaluator):
+    """Async runner: bounded in-flight images.edit calls, several tasks per process.
+
+    Image preparation and the API call of one item run under a shared semaphore,
+    so at most `concurrency` items hold decoded inputs at a time. Finished images
+    go through a single writer coroutine, which writes the PNGs and rewrites each
+    touched task's results JSON once per drained batch.
+    """
+
+    def __init__(self, concurrency=4):
+        super().__init__()
+        self.aclient = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        self.concurrency = max(1, int(concurrency))
+
+    @staticmethod
+    def _write_batch(batch):
+        touched = {}
+        for state, item_id, image_bytes, record in batch:
+            with open(os.path.join(state["img_save_dir"], record["saved_image_path"]), "wb") as img_file:
+                img_file.write(image_bytes)
+            state["results"] = [r for r in state["results"] if r['id'] != item_id]
+            state["results"].append(record)
+            touched[state["output_json_path"]] = state
+        for output_json_path, state in touched.items():
+            with open(output_json_path, 'w', encoding='utf-8') as f:
+                json.dump(state["results"], f, indent=4, ensure_ascii=False)
+
+    async def _writer(self, queue):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                done = True
+            batch = [b for b in batch if b is not None]
+            if batch:
+                try:
+                    await loop.run_in_executor(None, self._write_batch, batch)
+                except OSError as e:
+                    print(f"Error writing results: {e}")
+
+    async def _run_item(self, task_name, state, item, sem, queue, stats):
+        loop = asyncio.get_running_loop()
+        item_id = item['id']
+        source_full_path, instr_full_path, prompt_text = self.item_inputs(
+            item, state["image_root"], state["base_task_dir"]
+        )
+        async with sem:
+            try:
+                prepared = await loop.run_in_executor(
+                    None, load_generation_images, task_name, item_id, source_full_path, instr_full_path
+                )
+            except Exception as e:
+                print(f"Error preparing images for {item_id}: {e}")
+                prepared = None
+            if prepared is None:
+                stats["failed"] += 1
+                return
+            image_streams = [bytes_to_named_stream(data, name) for _, name, data in prepared]
+
+            t0 = time.perf_counter()
+            try:
+                response = await self.aclient.images.edit(
+                    model=self.model_name,
+                    image=image_streams,
+                    prompt=prompt_text,
+                    n=1,
+                    extra_query={
+                    "api-version": "2025-04-01-preview",
+                },
+                )
+                image_bytes = base64.b64decode(response.data[0].b64_json)
+            except openai.AuthenticationError as e:
+                print(f"AuthenticationError occurred: {e}")
+                if hasattr(e, "status_code") and e.status_code == 401:
+                    await asyncio.sleep(5)
+            except openai.RateLimitError as e:
+                print(f"RateLimitError occurred: {e}")
+                if hasattr(e, "status_code") and e.status_code == 429:
+                    await asyncio.sleep(5)
+            except openai.BadRequestError as e:
+                print(f"BadRequestError occurred: {e}")
+                if hasattr(e, "status_code") and e.status_code == 400:
+                    await asyncio.sleep(5)
+            except openai.InternalServerError as e:
+                print(f"InternalServerError occurred: {e}")
+                await asyncio.sleep(10)
+            else:
+                stats["latencies"].append(time.perf_counter() - t0)
+                record = {
+                    "id": item_id,
+                    "input_prompt": prompt_text,
+                    "saved_image_path": f"{item_id}.png",
+                    "status": "success"
+                }
+                await queue.put((state, item_id, image_bytes, record))
+                return
+        stats["failed"] += 1
+
+    async def run_task_async(self, task_name, sem, queue):
+        state = self.prepare_task(task_name)
+        if state is None:
+            return None
+        pending = [item for item in state["data"] if item['id'] not in state["processed_ids"]]
+        stats = {"task": task_name, "pending": len(pending), "failed": 0, "latencies": []}
+
+        t0 = time.perf_counter()
+        with tqdm(total=len(pending), desc=f"Processing {task_name}") as bar:
+            async def _one(item):
+                await self._run_item(task_name, state, item, sem, queue, stats)
+                bar.update(1)
+            await asyncio.gather(*(_one(item) for item in pending))
+        elapsed = time.perf_counter() - t0
+
+        lat = stats.pop("latencies")
+        stats["generated"] = len(lat)
+        stats["elapsed_s"] = round(elapsed, 2)
+        stats["images_per_min"] = round(60.0 * len(lat) / elapsed, 2) if elapsed > 0 else None
+        stats["latency_mean_s"] = round(sum(lat) / len(lat), 2) if lat else None
+        print(f"Task finished. Results and images saved to: {state['save_dir']}")
+        return stats
+
+    async def run_tasks_async(self, task_names):
+        """Run several tasks concurrently under one semaphore; returns per-task stats."""
+        sem = asyncio.Semaphore(self.concurrency)
+        queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        writer = asyncio.ensure_future(self._writer(queue))
+        try:
+            all_stats = await asyncio.gather(*(self.run_task_async(t, sem, queue) for t in task_names))
+        finally:
+            await queue.put(None)
+            await writer
+            await self.aclient.close()
+
+        all_stats = [s for s in all_stats if s is not None]
+        for s in all_stats:
+            print(
+                f"[THROUGHPUT] {s['task']}: generated={s['generated']}/{s['pending']} failed={s['failed']} "
+                f"elapsed={s['elapsed_s']}s images/min={s['images_per_min']} latency mean={s['latency_mean_s']}s"
+            )
+        return all_stats
+
+    def run_tasks(self, task_names):
+        return asyncio.run(self.run_tasks_async(task_names))
+
 # ================= Entry Point =================
 
 if __name__ == "__main__":
-    evaluator = BenchmarkEvaluator()
-    
-    # Test Flow task
-    target_task = "Reorientation"
-    evaluator.run_task(target_task)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate edited images for VIBE tasks with gpt-image-1.")
+    parser.add_argument("--task", action="append", default=None,
+                        help="Task name (repeatable). Default: Reorientation.")
+    parser.add_argument("--all_tasks", action="store_true", help="Run every task in TASK_CONFIG.")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Maximum number of in-flight images.edit calls (async runner).")
+    parser.add_argument("--sync", action="store_true", help="Use the sequential single-request loop.")
+    parser.add_argument("--image_packs", default=None,
+                        help="Packed image stores built by `python -m pipeline.pack_images` (same as $VIBE_IMAGE_PACKS).")
+    args = parser.parse_args()
+
+    if args.image_packs:
+        os.environ[IMAGE_PACKS_ENV] = args.image_packs
+
+    if args.all_tasks:
+        target_tasks = list(TASK_CONFIG.keys())
+    else:
+        target_tasks = args.task or ["Reorientation"]
+
+    if args.sync:
+        evaluator = BenchmarkEvaluator()
+        for target_task in target_tasks:
+            evaluator.run_task(target_task)
+    else:
+        AsyncBenchmarkEvaluator(concurrency=args.concurrency).run_tasks(target_tasks)
@@ -0,0 +1,188 @@
+"""Adaptive repeat allocation: extra judge passes only where the judge is unstable.
+
+Pass 1 judges every item ({stem}_1.json). Later passes ({stem}_pass_k.json,
+k = 2..N) re-judge only the items picked for them, within a budget of judge
+calls:
+
+    value of one more pass for item i = v_i / (r_i * (r_i + 1)) / cost_i
+
+is how much that pass shrinks the variance of the summary mean per call, with
+v_i the item's predicted judge variance (summed over metrics), r_i its passes so
+far and cost_i its judge calls per pass. Allocation is greedy on that value and
+re-planned after every pass with the new observations.
+
+v for an (item, metric) comes from its own repeated scores when it has at least
+two (current passes plus --adaptive_prior files), shrunk towards a baseline: the
+mean within-item variance of items in the same first-pass score bucket (0, in
+between, 1). Without any repeated scores, a seeded random pilot of items is
+re-judged in pass 2 first to estimate those baselines.
+
+The aggregated summary has the aggregate_run_summaries layout. "mean" is the
+mean over items of each item's mean over its passes, which equals the mean of
+per-pass summaries when every item has every pass. "var" estimates the same
+quantity as the variance across per-pass summaries, sum(s_i^2) / n^2, with s_i^2
+each item's sample variance over its passes (the bucket baseline for items
+judged once).
+"""
+
+import heapq
+import math
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .records import OVERALL, ScoreColumns, collect_score_columns
+
+N_BUCKETS = 3
+# floor for items nothing is known about, so every item can be picked
+FALLBACK_VAR = 0.01
+
+
+def first_pass_buckets(first: np.ndarray) -> np.ndarray:
+    """0 for a first-pass score of 0, 2 for 1, 1 in between (also for NaN)."""
+    b = np.ones(first.shape, dtype=np.int64)
+    b[first <= 0.0] = 0
+    b[first >= 1.0] = 2
+    return b
+
+
+def stack(cols: Sequence[ScoreColumns], key: str) -> np.ndarray:
+    """Passes x items matrix of one summary key, NaN where a pass has no score."""
+    if not cols:
+        return np.empty((0, 0))
+    return np.vstack([c.as_numpy(key) for c in cols])
+
+
+def _item_stats(mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(observations per item, sum of squared deviations from the item mean)."""
+    valid = ~np.isnan(mat)
+    r = valid.sum(axis=0)
+    with np.errstate(invalid="ignore"):
+        mu = np.where(r > 0, np.nansum(mat, axis=0) / np.maximum(r, 1), 0.0)
+    ss = np.where(valid, (mat - mu) ** 2, 0.0).sum(axis=0)
+    return r, ss
+
+
+def bucket_baseline(mat: np.ndarray, buckets: np.ndarray) -> np.ndarray:
+    """Mean sample variance of items with >= 2 observations, per first-pass bucket (NaN if none)."""
+    r, ss = _item_stats(mat)
+    out = np.full(N_BUCKETS, np.nan)
+    rep = r >= 2
+    if not rep.any():
+        return out
+    var = ss[rep] / (r[rep] - 1)
+    overall = float(var.mean())
+    for b in range(N_BUCKETS):
+        sel = buckets[rep] == b
+        out[b] = float(var[sel].mean()) if sel.any() else overall
+    return out
+
+
+def predicted_variance(mat: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """Per-item judge variance of one metric; `mat` includes prior observations."""
+    buckets = first_pass_buckets(first)
+    base = bucket_baseline(mat, buckets)
+    if np.isnan(base).all():
+        with np.errstate(invalid="ignore"):
+            v0 = np.where(np.isnan(first), 0.25, first * (1.0 - first)) + FALLBACK_VAR
+    else:
+        v0 = base[buckets]
+    r, ss = _item_stats(mat)
+    # (ss + v0) / r: the baseline counts as one pseudo-observation of variance
+    return np.where(r >= 2, (ss + v0) / np.maximum(r, 1), v0)
+
+
+def plan_targets(
+    v: np.ndarray,
+    repeats: np.ndarray,
+    cost: np.ndarray,
+    max_repeats: int,
+    budget: float,
+) -> np.ndarray:
+    """
+    Greedy target number of passes per item under `budget` judge calls, starting
+    from `repeats`. Items with cost 0 (not judged) or repeats 0 are never picked.
+    """
+    targets = repeats.copy()
+    heap: List[Tuple[float, int]] = []
+    for i in np.flatnonzero((cost > 0) & (repeats > 0) & (repeats < max_repeats) & (v > 0)):
+        r = int(repeats[i])
+        heapq.heappush(heap, (-v[i] / (r * (r + 1)) / cost[i], int(i)))
+    left = budget
+    while heap:
+        _, i = heapq.heappop(heap)
+        if cost[i] > left:
+            continue
+        left -= cost[i]
+        targets[i] += 1
+        r = int(targets[i])
+        if r < max_repeats:
+            heapq.heappush(heap, (-v[i] / (r * (r + 1)) / cost[i], i))
+    return targets
+
+
+def pilot_positions(candidates: Sequence[int], frac: float, seed: str, max_items: int) -> List[int]:
+    k = min(len(candidates), max_items, max(5, math.ceil(frac * len(candidates))))
+    return sorted(random.Random(seed).sample(list(candidates), k)) if k > 0 else []
+
+
+def aggregate_adaptive(
+    cols: Sequence[ScoreColumns],
+    metric_names: Sequence[str],
+    calls_planned: int,
+    budget: float,
+) -> Dict[str, Any]:
+    """{"n", "mean", "var"} over passes of unequal size, plus an "adaptive" block."""
+    keys = set(metric_names) | {OVERALL}
+    for c in cols:
+        keys |= {k for k in c.columns if len(c.values(k))}
+
+    out_mean: Dict[str, Any] = {}
+    out_var: Dict[str, Any] = {}
+    for k in sorted(keys):
+        mat = stack(cols, k)
+        r, ss = _item_stats(mat)
+        has = r > 0
+        if not has.any():
+            out_mean[k] = None
+            out_var[k] = None
+            continue
+        item_mean = np.nansum(mat, axis=0)[has] / r[has]
+        mu = float(np.cumsum(item_mean)[-1]) / len(item_mean)
+
+        base = bucket_baseline(mat, first_pass_buckets(mat[0]))
+        s2 = np.where(r >= 2, ss / np.maximum(r - 1, 1), np.nan_to_num(base[first_pass_buckets(mat[0])]))
+        var = float(s2[has].sum()) / len(item_mean) ** 2 * 1e4
+
+        out_mean[k] = round(mu * 100.0 + 1e-12, 2)
+        out_var[k] = round(var + 1e-12, 4)
+
+    judged_in_pass = np.zeros((len(cols), cols[0].n if cols else 0), dtype=bool)
+    for m in metric_names:
+        judged_in_pass |= ~np.isnan(stack(cols, m))
+    passes = judged_in_pass.sum(axis=0)
+    judged = passes[passes > 0]
+    return {
+        "n": len(cols),
+        "mean": out_mean,
+        "var": out_var,
+        "adaptive": {
+            "items": int(len(judged)),
+            "passes_per_item": {str(p): int((judged == p).sum()) for p in range(1, len(cols) + 1)},
+            "extra_calls_planned": calls_planned,
+            "call_budget": budget,
+        },
+    }
+
+
+def prior_columns(prior_items: List[Any], ids: Sequence[str], metric_names: Sequence[str]) -> ScoreColumns:
+    """A prior run's scores placed at the positions of the current file (matched by id)."""
+    pos = {str(sid): i for i, sid in enumerate(ids)}
+    aligned: List[Optional[Any]] = [None] * len(ids)
+    for it in prior_items:
+        i = pos.get(str(it.get("id")))
+        if i is not None:
+            aligned[i] = it
+    placeholder = {"status": "missing"}
+    return collect_score_columns([it if it is not None else placeholder for it in aligned], list(metric_names))
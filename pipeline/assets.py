@@ -0,0 +1,115 @@
+"""Read side of the precomputed asset cache built by `python -m pipeline.prepare_assets`.
+
+Layout:
+    {cache_root}/v{ASSET_FORMAT_VERSION}/{task}/manifest.json
+    {cache_root}/v{ASSET_FORMAT_VERSION}/{task}/{role}/{sample_id}.png
+
+manifest.json:
+    {"format_version": 2, "task": ..., "entries": {sample_id: {role: {
+        "file": "role/id.png", "sha256": <output hash>,
+        "inputs": {abs_path: {"size": ..., "mtime_ns": ..., "sha256": ...}}}}}}
+
+An entry is only served when every input path the consumer would have read
+still has the recorded size and mtime; anything else is a miss and the caller
+computes the image as before.
+"""
+
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from .io_utils import read_json
+
+ASSET_FORMAT_VERSION = 2
+ASSET_CACHE_ENV = "VIBE_ASSET_CACHE"
+MANIFEST_NAME = "manifest.json"
+
+# Judge-side roles (pipeline.evaluator.prepare_judge_images)
+JUDGE_SOURCE = "judge_source"
+JUDGE_INSTRUCTION = "judge_instruction"
+# Generation-side roles (gpt.py)
+GEN_MERGED = "gen_merged"
+GEN_SOURCE = "gen_source"
+GEN_INSTRUCTION = "gen_instruction"
+
+
+def safe_name(sample_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", str(sample_id))
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stat_inputs(paths: List[str], with_hash: bool = False) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Fingerprint input files; None if any of them is missing."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for p in paths:
+        if not p:
+            continue
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None
+        rec: Dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if with_hash:
+            rec["sha256"] = file_sha256(p)
+        out[os.path.abspath(p)] = rec
+    return out
+
+
+class AssetCache:
+    def __init__(self, cache_root: str):
+        self.root = os.path.join(cache_root, f"v{ASSET_FORMAT_VERSION}")
+
+    def task_dir(self, task_name: str) -> str:
+        return os.path.join(self.root, task_name)
+
+    def manifest(self, task_name: str) -> Dict[str, Any]:
+        path = os.path.join(self.task_dir(task_name), MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        return _load_manifest(path, mtime)
+
+    def get(self, task_name: str, sample_id: str, role: str, input_paths: List[str]) -> Optional[bytes]:
+        entry = self.manifest(task_name).get("entries", {}).get(str(sample_id), {}).get(role)
+        if not entry:
+            return None
+        current = stat_inputs(input_paths)
+        if current is None:
+            return None
+        recorded = entry.get("inputs", {})
+        if set(recorded) != set(current):
+            return None
+        for p, rec in current.items():
+            if recorded[p].get("size") != rec["size"] or recorded[p].get("mtime_ns") != rec["mtime_ns"]:
+                return None
+        try:
+            with open(os.path.join(self.task_dir(task_name), entry["file"]), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+@lru_cache(maxsize=64)
+def _load_manifest(path: str, mtime_ns: int) -> Dict[str, Any]:
+    m = read_json(path)
+    if m.get("format_version") != ASSET_FORMAT_VERSION:
+        return {}
+    return m
+
+
+def get_asset_cache() -> Optional[AssetCache]:
+    """The cache named by $VIBE_ASSET_CACHE, if set and present on disk."""
+    root = os.environ.get(ASSET_CACHE_ENV)
+    if not root or not os.path.isdir(root):
+        return None
+    return AssetCache(root)
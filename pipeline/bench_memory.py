@@ -0,0 +1,91 @@
+"""Peak-memory benchmark for building a judge request body from encoded images.
+
+    python -m pipeline.bench_memory [--size 1536] [--images 3] [--iters 5]
+
+Compares the str-based path (base64 -> str -> data URL -> json.dumps) with the
+buffer-reuse path (encode_data_url_into + assemble_json_body) using tracemalloc.
+Both start from PNG bytes, which is what prepare_judge_images hands over.
+"""
+
+import argparse
+import json
+import os
+import tracemalloc
+from typing import Callable, List
+
+from PIL import Image
+
+from .io_utils import (
+    GrowableBuffer,
+    assemble_json_body,
+    encode_data_url_into,
+    pil_to_png_bytes,
+    png_bytes_to_data_url,
+)
+
+
+def _make_pngs(size: int, n: int) -> List[bytes]:
+    # noise compresses badly, which is the worst (largest) case for payload size
+    return [pil_to_png_bytes(Image.frombytes("RGBA", (size, size), os.urandom(size * size * 4))) for _ in range(n)]
+
+
+def _messages(urls: List[str]) -> dict:
+    content = [{"type": "text", "text": "rubric " * 500}]
+    content += [{"type": "image_url", "image_url": {"url": u}, "detail": "high"} for u in urls]
+    return {"model": "judge", "messages": [{"role": "user", "content": content}]}
+
+
+def legacy_body(pngs: List[bytes]) -> int:
+    urls = [png_bytes_to_data_url(b) for b in pngs]
+    body = json.dumps(_messages(urls)).encode("utf-8")
+    return len(body)
+
+
+def make_buffered_body(n: int) -> Callable[[List[bytes]], int]:
+    bufs = [GrowableBuffer() for _ in range(n)]
+
+    def _run(pngs: List[bytes]) -> int:
+        placeholders = [f"@@VIBE_IMAGE_{k}@@" for k in range(len(pngs))]
+        views = [encode_data_url_into(b, buf) for b, buf in zip(pngs, bufs)]
+        chunks, total = assemble_json_body(_messages(placeholders), placeholders, views)
+        del chunks, views
+        return total
+
+    return _run
+
+
+def measure(fn: Callable[[List[bytes]], int], pngs: List[bytes], iters: int) -> float:
+    fn(pngs)  # warm-up (grows reusable buffers to size)
+    peak = 0
+    for _ in range(iters):
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        fn(pngs)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak / (1 << 20)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=1536, help="Square image side in pixels.")
+    ap.add_argument("--images", type=int, default=3)
+    ap.add_argument("--iters", type=int, default=5)
+    args = ap.parse_args()
+
+    pngs = _make_pngs(args.size, args.images)
+    png_mb = sum(len(b) for b in pngs) / (1 << 20)
+    buffered = make_buffered_body(args.images)
+    assert legacy_body(pngs) == buffered(pngs), "body sizes differ"
+
+    legacy_peak = measure(legacy_body, pngs, args.iters)
+    buffered_peak = measure(buffered, pngs, args.iters)
+    print(f"images: {args.images} x {args.size}px, PNG total {png_mb:.1f} MiB")
+    print(f"legacy   peak transient allocation: {legacy_peak:8.1f} MiB")
+    print(f"buffered peak transient allocation: {buffered_peak:8.1f} MiB")
+    if legacy_peak > 0:
+        print(f"reduction: {100.0 * (1 - buffered_peak / legacy_peak):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
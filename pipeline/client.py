@@ -1,10 +1,25 @@
 import os
-from openai import OpenAI
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
+from .lazy import lazy_module
 
-def make_client() -> OpenAI:
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+@lru_cache(maxsize=8)
+def _client_for(api_key: str, base_url: Optional[str]) -> "OpenAI":
+    return lazy_module("openai").OpenAI(api_key=api_key, base_url=base_url)
+
+
+def make_client() -> "OpenAI":
+    # one client per key and base URL, so its connection pool is reused across calls (and worker jobs)
     api_key = os.environ["OPENAI_API_KEY"]
-    return OpenAI(api_key=api_key)
+    return _client_for(api_key, os.environ.get("OPENAI_BASE_URL") or None)
 
 def get_model_name() -> str:
     return os.environ.get("OPENAI_MODEL", "gpt-5.1_2025-11-13")
+
+def get_deployment_name() -> str:
+    return get_model_name()
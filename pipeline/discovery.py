@@ -0,0 +1,109 @@
+"""Which files in a --results_root directory are result files to evaluate.
+
+Next to every result file it evaluates, run_eval writes
+
+    {stem}_{i}.json            the copy judged in repeat i (--repeat)
+    {stem}_pass_{k}.json       adaptive pass k >= 2, only the re-judged items (--adaptive_budget)
+    {task}_summary.json        the aggregated summary
+    {task}_summary_{i}.json    the summary of repeat i
+    {task}_summary_pass_{k}.json   the summary of adaptive pass k
+    shards/                    shard journals (--shard)
+
+(summaries are named after the result file's stem instead when several result
+files share the directory, see summary_names), so a directory that has been
+evaluated once holds several times more *.json files than result files. Among the files matching the include patterns
+(default "*.json"), a file is skipped as
+
+    summary       its name ends in _summary.json, _summary_{i}.json or _summary_pass_{k}.json
+    repeat copy   it is {stem}_{i}.json or {stem}_pass_{k}.json and {stem}.json is in the
+                  same directory
+    not a list    its JSON does not start with "[" (result files are a list
+                  of generation records; summaries, thresholds and reports
+                  are objects)
+
+Everything else is a base result file. A result file whose own name ends
+in _{i} is still found when no {stem}.json sits next to it.
+"""
+
+import fnmatch
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_PATTERNS = ("*.json",)
+
+SKIP_SUMMARY = "summary"
+SKIP_REPEAT_COPY = "repeat copy"
+SKIP_NOT_A_LIST = "not a list"
+
+# infix of adaptive pass files: {stem}_pass_{k}.json, {task}_summary_pass_{k}.json
+ADAPTIVE_PASS = "pass"
+
+SUMMARY_RE = re.compile(rf"_summary(_({ADAPTIVE_PASS}_)?\d+)?\.json$")
+REPEAT_COPY_RE = re.compile(r"^(?P<stem>.+)_\d+(?P<ext>\.json)$")
+PASS_COPY_RE = re.compile(rf"^(?P<stem>.+)_{ADAPTIVE_PASS}_\d+(?P<ext>\.json)$")
+
+# bytes read to find the first JSON token
+_HEAD_BYTES = 4096
+
+
+def _starts_with_list(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_HEAD_BYTES).lstrip(b"\xef\xbb\xbf \t\r\n")
+    except OSError:
+        return False
+    return head.startswith(b"[")
+
+
+def skip_reason(fn: str, names: Iterable[str], path: Optional[str] = None) -> Optional[str]:
+    """Why `fn` (a file name among `names`, the directory listing) is not a base result file, or None."""
+    if SUMMARY_RE.search(fn):
+        return SKIP_SUMMARY
+    for m in (REPEAT_COPY_RE.match(fn), PASS_COPY_RE.match(fn)):
+        if m and (m.group("stem") + m.group("ext")) in names:
+            return SKIP_REPEAT_COPY
+    if path is not None and not _starts_with_list(path):
+        return SKIP_NOT_A_LIST
+    return None
+
+
+def discover_result_files(
+    root: str, patterns: Iterable[str] = DEFAULT_PATTERNS
+) -> Tuple[List[str], Dict[str, List[str]]]:
+    """(base result files in name order, {skip reason: [skipped files]}) for one directory."""
+    names = set(os.listdir(root))
+    found: List[str] = []
+    skipped: Dict[str, List[str]] = {}
+    for fn in sorted(names):
+        path = os.path.join(root, fn)
+        if not os.path.isfile(path) or not any(fnmatch.fnmatch(fn, pat) for pat in patterns):
+            continue
+        reason = skip_reason(fn, names, path)
+        if reason is None:
+            found.append(path)
+        else:
+            skipped.setdefault(reason, []).append(path)
+    return found, skipped
+
+
+def report_discovery(root: str, found: List[str], skipped: Dict[str, List[str]]) -> None:
+    parts = [f"{reason} {len(paths)}" for reason, paths in sorted(skipped.items())]
+    tail = f"; skipped {', '.join(parts)}" if parts else ""
+    print(f"[DISCOVER] {root}: {len(found)} result file(s){tail}")
+
+
+def summary_names(paths: List[str], task_name: str) -> Dict[str, str]:
+    """
+    {result file: NAME of its NAME_summary.json / NAME_summary_{i}.json}. NAME is the
+    task name, except when several result files share a directory: then each
+    file uses its own stem, so no two files write the same summary.
+    """
+    per_dir: Dict[str, int] = {}
+    for p in paths:
+        d = os.path.dirname(os.path.abspath(p))
+        per_dir[d] = per_dir.get(d, 0) + 1
+    return {
+        p: os.path.splitext(os.path.basename(p))[0] if per_dir[os.path.dirname(os.path.abspath(p))] > 1 else task_name
+        for p in paths
+    }
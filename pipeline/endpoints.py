@@ -0,0 +1,248 @@
+"""Pool of judge endpoints with rate-limit-aware routing and failover.
+
+    export VIBE_JUDGE_ENDPOINTS=./endpoints.json   # or run_eval --endpoints ./endpoints.json
+
+endpoints.json is a list of endpoints:
+
+    [{"name": "east", "base_url": "https://.../openai/v1", "api_key_env": "EAST_KEY",
+      "model": "gpt-5.1", "weight": 2, "rpm": 300, "tpm": 400000},
+     {"name": "west", "base_url": "https://west.openai.azure.com", "api_key": "...",
+      "model": "judge-deployment", "api_version": "2025-04-01-preview", "rpm": 120}]
+
+`api_key_env` names an environment variable holding the key (preferred over
+`api_key`); `api_version` makes it an Azure deployment (`model` is the
+deployment name). `rpm` / `tpm` are the endpoint's quota per minute.
+
+Each request goes to the healthy endpoint with the most headroom: the smaller of
+its remaining request and token quota over the last minute, discounted by its
+requests over that minute per unit of weight (so endpoints without quotas share
+the load in proportion to their weights). A 429, 5xx, connection or auth error takes the
+endpoint out of rotation for a backoff period (Retry-After when the server
+sends one), so the retry goes to another endpoint. When every endpoint is
+saturated or cooling down, acquire() waits for the first one to free up.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .client import get_deployment_name
+from .io_utils import read_json
+from .lazy import lazy_module
+
+ENDPOINTS_ENV = "VIBE_JUDGE_ENDPOINTS"
+
+WINDOW_S = 60.0
+# tokens reserved per request until an endpoint has reported real usage
+DEFAULT_CALL_TOKENS = 4000
+# backoff (seconds) after a failure, doubled per consecutive failure up to the cap
+BACKOFF_S = {"rate_limit": 5.0, "server": 10.0, "auth": 300.0}
+BACKOFF_CAP_S = 120.0
+
+
+@dataclass
+class Endpoint:
+    name: str
+    base_url: str
+    model: str
+    api_key: str = ""
+    api_version: Optional[str] = None
+    weight: float = 1.0
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    # runtime state, guarded by the pool lock
+    window: Deque[List[float]] = field(default_factory=deque)   # [start time, tokens] per request
+    inflight: int = 0
+    failures: int = 0
+    cooldown_until: float = 0.0
+    avg_tokens: float = DEFAULT_CALL_TOKENS
+    calls: int = 0
+    errors: int = 0
+    _client: Any = None
+
+    def client(self) -> Any:
+        # no SDK-level retries: a failed request is retried on the endpoint the pool picks next
+        if self._client is None:
+            openai = lazy_module("openai")
+            if self.api_version:
+                self._client = openai.AzureOpenAI(
+                    azure_endpoint=self.base_url, api_key=self.api_key, api_version=self.api_version, max_retries=0
+                )
+            else:
+                self._client = openai.OpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0)
+        return self._client
+
+
+def _endpoint_from_config(cfg: Dict[str, Any], pos: int) -> Endpoint:
+    for key in ("base_url", "model"):
+        if not cfg.get(key):
+            raise ValueError(f"Endpoint #{pos} needs '{key}': {cfg}")
+    api_key = cfg.get("api_key", "")
+    if cfg.get("api_key_env"):
+        if cfg["api_key_env"] not in os.environ:
+            raise ValueError(f"Endpoint #{pos}: environment variable {cfg['api_key_env']} is not set")
+        api_key = os.environ[cfg["api_key_env"]]
+    weight = float(cfg.get("weight", 1.0))
+    if weight <= 0:
+        raise ValueError(f"Endpoint #{pos}: weight must be positive")
+    return Endpoint(
+        name=str(cfg.get("name") or f"endpoint{pos}"),
+        base_url=cfg["base_url"],
+        model=cfg["model"],
+        api_key=api_key,
+        api_version=cfg.get("api_version"),
+        weight=weight,
+        rpm=cfg.get("rpm"),
+        tpm=cfg.get("tpm"),
+    )
+
+
+def failure_kind(exc: BaseException) -> Optional[str]:
+    """"rate_limit" / "server" / "auth" for errors that say the endpoint is unhealthy, else None."""
+    openai = lazy_module("openai")
+    if isinstance(exc, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(exc, (openai.InternalServerError, openai.APIConnectionError)):
+        return "server"
+    if isinstance(exc, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return "auth"
+    if isinstance(exc, openai.APIStatusError) and exc.status_code >= 500:
+        return "server"
+    return None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EndpointPool:
+    def __init__(self, endpoints: List[Endpoint]):
+        if not endpoints:
+            raise ValueError("Endpoint pool needs at least one endpoint")
+        names = [ep.name for ep in endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate endpoint names: {names}")
+        self.endpoints = endpoints
+        self._lock = threading.Condition()
+
+    @classmethod
+    def from_file(cls, path: str) -> "EndpointPool":
+        raw = read_json(path)
+        if not isinstance(raw, list):
+            raise ValueError(f"{path} must hold a list of endpoints")
+        return cls([_endpoint_from_config(cfg, i) for i, cfg in enumerate(raw)])
+
+    def _expire(self, ep: Endpoint, now: float) -> None:
+        while ep.window and ep.window[0][0] <= now - WINDOW_S:
+            ep.window.popleft()
+
+    def _headroom(self, ep: Endpoint) -> float:
+        room = 1.0
+        if ep.rpm:
+            room = min(room, 1.0 - len(ep.window) / ep.rpm)
+        if ep.tpm:
+            used = sum(tokens for _, tokens in ep.window)
+            room = min(room, 1.0 - (used + ep.avg_tokens) / ep.tpm)
+        return room
+
+    def _next_free(self, now: float) -> float:
+        """Seconds until some endpoint may have room again."""
+        waits = []
+        for ep in self.endpoints:
+            if ep.cooldown_until > now:
+                waits.append(ep.cooldown_until - now)
+            elif ep.window:
+                waits.append(ep.window[0][0] + WINDOW_S - now)
+        return max(0.05, min(waits)) if waits else 0.05
+
+    def acquire(self) -> Tuple[Endpoint, List[float]]:
+        """(endpoint, reservation) for one request; blocks while every endpoint is saturated or down."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                best = None
+                for ep in self.endpoints:
+                    if ep.cooldown_until > now:
+                        continue
+                    self._expire(ep, now)
+                    room = self._headroom(ep)
+                    if room <= 0:
+                        continue
+                    # requests of the last minute (in flight included) per unit of weight
+                    key = room / (1.0 + len(ep.window) / ep.weight)
+                    if best is None or key > best[0]:
+                        best = (key, ep)
+                if best is not None:
+                    ep = best[1]
+                    reservation = [now, ep.avg_tokens]
+                    ep.window.append(reservation)
+                    ep.inflight += 1
+                    return ep, reservation
+                self._lock.wait(self._next_free(now))
+
+    def release(self, ep: Endpoint, reservation: List[float], tokens: Optional[int] = None,
+                error: Optional[BaseException] = None) -> None:
+        """Report how a request acquired from the pool ended (usage tokens on success)."""
+        with self._lock:
+            ep.inflight -= 1
+            kind = failure_kind(error) if error is not None else None
+            if kind is not None:
+                ep.errors += 1
+                ep.failures += 1
+                wait = _retry_after(error)
+                if wait is None:
+                    wait = min(BACKOFF_CAP_S, BACKOFF_S[kind] * 2 ** (ep.failures - 1))
+                ep.cooldown_until = time.monotonic() + wait
+                print(f"[WARN] Judge endpoint {ep.name} out of rotation for {wait:.0f}s after "
+                      f"{type(error).__name__}")
+            elif error is None:
+                ep.calls += 1
+                ep.failures = 0
+                if tokens:
+                    reservation[1] = tokens
+                    ep.avg_tokens = 0.8 * ep.avg_tokens + 0.2 * tokens
+            self._lock.notify_all()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                ep.name: {
+                    "calls": ep.calls,
+                    "errors": ep.errors,
+                    "inflight": ep.inflight,
+                    "healthy": ep.cooldown_until <= now,
+                }
+                for ep in self.endpoints
+            }
+
+
+_pools: Dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool() -> Optional[EndpointPool]:
+    """The pool configured by $VIBE_JUDGE_ENDPOINTS (one per process), or None."""
+    path = os.environ.get(ENDPOINTS_ENV)
+    if not path:
+        return None
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = EndpointPool.from_file(path)
+        return _pools[path]
+
+
+def judge_models() -> Tuple[str, ...]:
+    """Models that may answer this process's judge calls: the pool's, else $OPENAI_MODEL's."""
+    pool = get_endpoint_pool()
+    if pool is None:
+        return (get_deployment_name(),)
+    return tuple(dict.fromkeys(ep.model for ep in pool.endpoints))
@@ -1,20 +1,41 @@
+import inspect
 import os
+import threading
 import time
-import openai
-from typing import Any, Dict, Optional, Tuple
-
-from PIL import Image
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from .client import make_client, get_deployment_name
+from .endpoints import failure_kind, get_endpoint_pool
+from .hedging import get_hedger, request_timeout
+from .assets import JUDGE_INSTRUCTION, JUDGE_SOURCE, get_asset_cache
 from .config import TASK_CONFIG
-from .io_utils import read_json, merge_source_and_layer, pil_to_data_url, read_text, load_rgba
-
-# Tasks where we want to remove the residual-mark clause from Visual_Coherence prompt
-VC_PROMPT_CLAUSE_REMOVE_TASKS = [
-    "Addition",
-]
+from .io_utils import (
+    GrowableBuffer,
+    assemble_json_body,
+    encode_data_url_into,
+    image_exists,
+    image_size,
+    load_image,
+    merge_source_and_layer,
+    packed_png,
+    pil_to_png_bytes,
+    png_bytes_to_data_url,
+    read_json,
+)
+from .prompts import (  # noqa: F401  (VC_* re-exported for existing callers)
+    VC_PROMPT_CLAUSE_REMOVE_TASKS,
+    VC_RESIDUAL_CLAUSE,
+    load_template,
+    maybe_modify_visual_coherence_prompt,
+    split_for_prefix_cache,
+)
+from .lazy import lazy_module
+from .stats import usage_to_dict
+from .streaming import read_verdict_stream, streaming_enabled
 
-VC_RESIDUAL_CLAUSE = "- residual visual instruction marks such as arrows, boxes, strokes, or masks that should not appear in the final image."
+if TYPE_CHECKING:
+    from PIL import Image
 
 USE_LAST_TWO_IMAGES_METRICS = [
     "Contextual_Preservation",
@@ -31,20 +52,21 @@ USE_FIRST_AND_LAST_IMAGES_METRICS = [
     "BII_CIC_CP",
 ]
 
-def maybe_modify_visual_coherence_prompt(task_name: str, metric_name: str, prompt: str) -> str:
-    if metric_name == "Visual_Coherence" and task_name in VC_PROMPT_CLAUSE_REMOVE_TASKS:
-        return prompt.replace(VC_RESIDUAL_CLAUSE, "")
-    return prompt
+# tasks whose instruction image is a target image rather than source + layer
+INPUT_TARGET_TASKS = ("Billiards", "Paper_Folding")
+
+@lru_cache(maxsize=32)
+def _annotation_index(json_path: str, mtime_ns: int) -> Dict[str, Dict[str, Any]]:
+    return {str(it.get("id")): it for it in read_json(json_path)}
+
 
 def find_annotation_item(task_name: str, sample_id: str) -> Optional[Dict[str, Any]]:
     cfg = TASK_CONFIG.get(task_name)
     if not cfg:
         return None
-    data = read_json(cfg["json_path"])
-    for it in data:
-        if str(it.get("id")) == str(sample_id):
-            return it
-    return None
+    # Indexed once per annotation file (re-read if it changes on disk).
+    json_path = cfg["json_path"]
+    return _annotation_index(json_path, os.stat(json_path).st_mtime_ns).get(str(sample_id))
 
 
 def resolve_source_and_layer_paths(task_name: str, ann_item: Dict[str, Any]) -> Tuple[str, str]:
@@ -71,101 +93,270 @@ def resolve_input_and_target_paths(task_name: str, ann_item: Dict[str, Any]) ->
     target_abs = os.path.join(task_dir, target_rel) 
     return input_abs, target_abs
 
+def gen_path_candidates(gen_prefix: str, saved_image_path: str) -> Tuple[str, str]:
+    """(gen_prefix/saved_image_path, gen_prefix/imgs/saved_image_path): where a generated image is looked for."""
+    return (
+        os.path.normpath(os.path.join(gen_prefix, saved_image_path)),
+        os.path.normpath(os.path.join(gen_prefix, "imgs", saved_image_path)),
+    )
 
-def evaluate_one(
+
+_payload_buffers = threading.local()
+
+
+def _data_url_buffers(n: int) -> List[GrowableBuffer]:
+    """Per-thread reusable output buffers, one per image of a request."""
+    bufs = getattr(_payload_buffers, "bufs", None)
+    if bufs is None:
+        bufs = _payload_buffers.bufs = []
+    while len(bufs) < n:
+        bufs.append(GrowableBuffer())
+    return bufs[:n]
+
+
+def supports_raw_body(client: Any) -> bool:
+    """True if `client.post` takes a pre-serialised `content` body (openai>=2 style, non-Azure)."""
+    post = getattr(client, "post", None)
+    if post is None or isinstance(client, lazy_module("openai").AzureOpenAI):
+        return False
+    try:
+        return "content" in inspect.signature(post).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+ROLE_SOURCE = "source"
+ROLE_INSTRUCTION = "instruction"
+ROLE_GENERATED = "generated"
+
+
+def image_roles_for_metric(metric_name: Optional[str]) -> Tuple[str, ...]:
+    """Which of (source, instruction, generated) images a metric sends, in order."""
+    if metric_name in USE_LAST_TWO_IMAGES_METRICS:
+        return (ROLE_INSTRUCTION, ROLE_GENERATED)
+    if metric_name in USE_FIRST_AND_LAST_IMAGES_METRICS:
+        return (ROLE_SOURCE, ROLE_GENERATED)
+    return (ROLE_SOURCE, ROLE_INSTRUCTION, ROLE_GENERATED)
+
+
+def judge_asset_inputs(task_name: str, ann_item: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Files each judge-side derived image is computed from (used to validate the asset cache)."""
+    if task_name in INPUT_TARGET_TASKS:
+        input_abs, target_abs = resolve_input_and_target_paths(task_name, ann_item)
+        return {ROLE_SOURCE: [input_abs], ROLE_INSTRUCTION: [target_abs]}
+    source_abs, layer_abs = resolve_source_and_layer_paths(task_name, ann_item)
+    layer = [layer_abs] if layer_abs and image_exists(layer_abs) else []
+    return {ROLE_SOURCE: [source_abs], ROLE_INSTRUCTION: [source_abs] + layer}
+
+
+JUDGE_ASSET_ROLES = {ROLE_SOURCE: JUDGE_SOURCE, ROLE_INSTRUCTION: JUDGE_INSTRUCTION}
+
+
+def prepare_judge_images(
     task_name: str,
     sample_id: str,
-    prompt_txt_path: str,
     gen_image_abs: str,
-    per_item_input_prompt: Optional[str] = None,
-    metric_name: Optional[str] = None,
-    metric_spec: Optional[Any] = None,   # MetricSpec，提供 parse_fn
-) -> Dict[str, Any]:
+    roles: Tuple[str, ...] = (ROLE_SOURCE, ROLE_INSTRUCTION, ROLE_GENERATED),
+    use_asset_cache: bool = True,
+) -> Tuple[Optional[Dict[str, bytes]], Optional[str]]:
     """
-    Calls GPT once per metric per sample, with retries.
-    Will keep retrying API calls until `metric_spec.parse_fn(text)` succeeds (no error).
+    Decode, composite and PNG-encode the judge images of one sample.
+    Returns ({role: png_bytes}, None) or (None, error). Only `roles` are encoded.
+    Source/instruction images come from the asset cache ($VIBE_ASSET_CACHE) when
+    it holds an up-to-date entry. Image files are read from the image packs
+    ($VIBE_IMAGE_PACKS) that hold them; plain packed PNGs are sent as they are.
     """
     ann_item = find_annotation_item(task_name, sample_id)
     if ann_item is None:
-        return {"eval_ok": False, "error": f"annotation item not found: task={task_name} id={sample_id}"}
+        return None, f"annotation item not found: task={task_name} id={sample_id}"
 
-    if task_name in ["Billiards", "Paper_Folding"]:
+    out: Dict[str, bytes] = {}
+    cache = get_asset_cache() if use_asset_cache else None
+    if cache is not None:
+        inputs = judge_asset_inputs(task_name, ann_item)
+        for role, asset_role in JUDGE_ASSET_ROLES.items():
+            if role in roles:
+                data = cache.get(task_name, sample_id, asset_role, inputs[role])
+                if data is not None:
+                    out[role] = data
+        if all(r in out for r in roles if r != ROLE_GENERATED):
+            source_path = inputs[ROLE_SOURCE][0]
+            if not image_exists(source_path):
+                return None, f"missing source image: {source_path}"
+            if ROLE_GENERATED in roles:
+                out[ROLE_GENERATED] = _generated_png(gen_image_abs, source_path)
+            return {r: out[r] for r in roles}, None
+
+    # Images are decoded only for the roles still missing; sizes come from headers.
+    def need(role: str) -> bool:
+        return role in roles and role not in out
+
+    if task_name in INPUT_TARGET_TASKS:
         input_abs, target_abs = resolve_input_and_target_paths(task_name, ann_item)
-        if not os.path.exists(input_abs):
-            return {"eval_ok": False, "error": f"missing source image: {input_abs}"}
-        img1 = load_rgba(input_abs)
-        img2 = load_rgba(target_abs)
+        if not image_exists(input_abs):
+            return None, f"missing source image: {input_abs}"
+        source_path = input_abs
+        _use_packed_png(out, ROLE_SOURCE, input_abs, roles)
+        _use_packed_png(out, ROLE_INSTRUCTION, target_abs, roles)
+        img1 = load_image(input_abs) if need(ROLE_SOURCE) else None
+        img2 = load_image(target_abs) if need(ROLE_INSTRUCTION) else None
     else:
         source_abs, layer_abs = resolve_source_and_layer_paths(task_name, ann_item)
-        if not os.path.exists(source_abs):
-            return {"eval_ok": False, "error": f"missing source image: {source_abs}"}
+        if not image_exists(source_abs):
+            return None, f"missing source image: {source_abs}"
 
-        img1 = load_rgba(source_abs)
+        source_path = source_abs
+        _use_packed_png(out, ROLE_SOURCE, source_abs, roles)
+        img1 = load_image(source_abs) if need(ROLE_SOURCE) else None
+        if not need(ROLE_INSTRUCTION):
+            img2 = None
         # For Pose_Control: img2 should be the instruction image itself (not merged)
-        if task_name == "Pose_Control":
-            if layer_abs and os.path.exists(layer_abs):
-                img2 = load_rgba(layer_abs)
-                # optional: align size to source if needed
-                if img2.size != img1.size:
-                    img2 = img2.resize(img1.size, resample=Image.BICUBIC)
-            else:
-                # fallback: if instruction image missing, keep pipeline running
-                img2 = Image.new("RGBA", img1.size, (0, 0, 0, 0))
-                print(f"[WARN] Missing instruction image for Pose_Control: {layer_abs}")
+        elif task_name == "Pose_Control":
+            img2 = pose_instruction_image(layer_abs, image_size(source_abs))
         else:
             img2 = merge_source_and_layer(source_abs, layer_abs)
 
-    if os.path.exists(gen_image_abs):
-        img3 = load_rgba(gen_image_abs)
-    else:
-        # keep pipeline running; still call GPT with blank image
-        img3 = Image.new("RGBA", img1.size, (0, 0, 0, 0))
+    images = {ROLE_SOURCE: img1, ROLE_INSTRUCTION: img2}
+    for role in roles:
+        if role in out:
+            continue
+        if role == ROLE_GENERATED:
+            out[role] = _generated_png(gen_image_abs, source_path)
+        else:
+            out[role] = pil_to_png_bytes(images[role])
+    return {r: out[r] for r in roles}, None
 
-    base_prompt = read_text(prompt_txt_path).strip()
-    base_prompt = maybe_modify_visual_coherence_prompt(task_name, metric_name or "", base_prompt)
-    user_prompt = base_prompt
-    if per_item_input_prompt:
-        # allow prompt template: replace {prompt}
-        user_prompt = user_prompt.replace("{prompt}", per_item_input_prompt)
 
-    client = make_client()
-    deployment = get_deployment_name()
+def pose_instruction_image(layer_abs: str, size: Tuple[int, int]) -> "Image.Image":
+    """Pose_Control instruction image, size-aligned to the source (blank if missing)."""
+    Image = lazy_module("PIL.Image")
+    if layer_abs and image_exists(layer_abs):
+        # optional: align size to source if needed (checked on the header, decoded reduced if much larger)
+        if image_size(layer_abs) == size:
+            return load_image(layer_abs)
+        img = load_image(layer_abs, target_size=size)
+        return img.resize(size, resample=Image.BICUBIC)
+    # fallback: if instruction image missing, keep pipeline running
+    print(f"[WARN] Missing instruction image for Pose_Control: {layer_abs}")
+    return Image.new("RGBA", size, (0, 0, 0, 0))
 
-    if metric_name in USE_LAST_TWO_IMAGES_METRICS:
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": user_prompt},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img2)},"detail": "high"},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img3)},"detail": "high"},
-                ],
-            }
+
+def _use_packed_png(out: Dict[str, bytes], role: str, path: str, roles: Tuple[str, ...]) -> None:
+    """Send a packed image file as is when its bytes are already the PNG that would be encoded."""
+    if role in roles and role not in out:
+        raw = packed_png(path)
+        if raw is not None:
+            out[role] = raw
+
+
+def _generated_png(gen_image_abs: str, source_path: str) -> bytes:
+    if image_exists(gen_image_abs):
+        raw = packed_png(gen_image_abs)
+        return raw if raw is not None else pil_to_png_bytes(load_image(gen_image_abs))
+    # keep pipeline running; still call GPT with blank image (size read from the header only)
+    return pil_to_png_bytes(lazy_module("PIL.Image").new("RGBA", image_size(source_path), (0, 0, 0, 0)))
+
+
+def evaluate_one(
+    task_name: str,
+    sample_id: str,
+    prompt_txt_path: str,
+    gen_image_abs: str,
+    per_item_input_prompt: Optional[str] = None,
+    metric_name: Optional[str] = None,
+    metric_spec: Optional[Any] = None,   # MetricSpec，提供 parse_fn
+    message_layout: str = "inline",
+    image_payloads: Optional[Dict[str, bytes]] = None,
+) -> Dict[str, Any]:
+    """
+    Calls GPT once per metric per sample, with retries.
+    Will keep retrying API calls until `metric_spec.parse_fn(text)` succeeds (no error).
+
+    message_layout:
+      - "inline": one user message with the filled prompt followed by the images.
+      - "prefix_cache": static rubric as a leading system message, per-sample text
+        and images in the user message (see prompts.split_for_prefix_cache).
+    image_payloads: PNG bytes per role, e.g. from an ImagePrepService; prepared
+    in-process when omitted.
+    Every API attempt is recorded in out["api_calls"] with latency and token usage;
+    out["model"] is the model (deployment) that produced the returned answer.
+    With an endpoint pool ($VIBE_JUDGE_ENDPOINTS, see pipeline.endpoints) each
+    attempt is routed by the pool, failed endpoints are left out of rotation
+    instead of sleeping, and out["endpoint"] names the one that answered.
+    With $VIBE_HEDGE_MAX_RATE set, late requests are hedged (see pipeline.hedging).
+    With $VIBE_STREAM_VERDICTS set, responses are streamed and closed once the
+    verdict JSON parses (see pipeline.streaming).
+    """
+    roles = image_roles_for_metric(metric_name)
+    if image_payloads is None or any(r not in image_payloads for r in roles):
+        image_payloads, err = prepare_judge_images(task_name, sample_id, gen_image_abs, roles)
+        if err is not None:
+            return {"eval_ok": False, "error": err}
+
+    # Templates are compiled once in build_metric_specs; fall back to loading here
+    # only when called without a spec.
+    template = getattr(metric_spec, "template", None)
+    if template is None:
+        template = load_template(prompt_txt_path, task_name=task_name, metric_name=metric_name or "")
+
+    openai = lazy_module("openai")
+    from openai import Stream
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+    pool = get_endpoint_pool()
+    if pool is None:
+        client = make_client()
+        deployment = get_deployment_name()
+        clients = [client]
+    else:
+        clients = [ep.client() for ep in pool.endpoints]
+
+    # When the client accepts a raw request body, data URLs are base64-encoded into
+    # reusable per-thread buffers and spliced into the JSON body as memoryviews, so
+    # no multi-MB str copies of the images are built.
+    raw_body = all(supports_raw_body(c) for c in clients)
+    if raw_body:
+        urls = [f"@@VIBE_IMAGE_{k}@@" for k in range(len(roles))]
+        url_views = [
+            encode_data_url_into(image_payloads[role], buf)
+            for role, buf in zip(roles, _data_url_buffers(len(roles)))
         ]
-    elif metric_name in USE_FIRST_AND_LAST_IMAGES_METRICS:
+    else:
+        urls = [png_bytes_to_data_url(image_payloads[role]) for role in roles]
+    image_parts = [
+        {"type": "image_url", "image_url": {"url": url}, "detail": "high"}
+        for url in urls
+    ]
+
+    if message_layout == "prefix_cache":
+        # Static rubric first (identical for every sample of this metric), then the
+        # per-sample text and images, so the server can reuse the cached prefix.
+        static_text, suffix_template = split_for_prefix_cache(template)
+        suffix_text = suffix_template.fill(prompt=per_item_input_prompt)
+        user_content = ([{"type": "text", "text": suffix_text}] if suffix_text else []) + image_parts
         messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": user_prompt},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img1)},"detail": "high"},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img3)},"detail": "high"},
-                ],
-            }
+            {"role": "system", "content": static_text},
+            {"role": "user", "content": user_content},
         ]
     else:
+        user_prompt = template.fill(prompt=per_item_input_prompt)
         messages = [
             {
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": user_prompt},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img1)},"detail": "high"},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img2)},"detail": "high"},
-                    {"type": "image_url", "image_url": {"url": pil_to_data_url(img3)},"detail": "high"},
-                ],
+                "content": [{"type": "text", "text": user_prompt}] + image_parts,
             }
         ]
 
+    hedger = get_hedger()
+    timeout_s = request_timeout()
+    stream_args: Dict[str, Any] = (
+        {"stream": True, "stream_options": {"include_usage": True}} if streaming_enabled() else {}
+    )
+    if raw_body and hedger is not None:
+        # an abandoned hedge can still be sending after this call returns, when the
+        # next call of this thread rewrites its buffers: give the race its own copy
+        url_views = [memoryview(bytes(v)) for v in url_views]
+
     parse_fn = getattr(metric_spec, "parse_fn", None)
 
     text = ""
@@ -174,18 +365,80 @@ def evaluate_one(
     metric_payload: Optional[Dict[str, Any]] = None
     metric_score: Optional[float] = None
 
+    api_calls: List[Dict[str, Any]] = []
+    answered_by: Optional[str] = None
+    answered_model: Optional[str] = None
+
+    def _send() -> Tuple[str, str, Dict[str, Any]]:
+        """One request: (response text, text to parse, its api_calls entry). Safe to run from several threads."""
+        endpoint = reservation = None
+        if pool is None:
+            c, dep = client, deployment
+        else:
+            endpoint, reservation = pool.acquire()
+            c, dep = endpoint.client(), endpoint.model
+        if timeout_s is not None:
+            c = c.with_options(timeout=timeout_s)
+        t0 = time.perf_counter()
+        try:
+            if raw_body:
+                body = {"model": dep, "messages": messages, **stream_args}
+                body_chunks, body_len = assemble_json_body(body, urls, url_views)
+                raw_options = {"headers": {"Content-Type": "application/json", "Content-Length": str(body_len)}}
+                resp = c.post("/chat/completions", cast_to=ChatCompletion, content=body_chunks, options=raw_options,
+                              stream=bool(stream_args), stream_cls=Stream[ChatCompletionChunk])
+            else:
+                resp = c.chat.completions.create(model=dep, messages=messages, **stream_args)
+            if stream_args:
+                text, parse_text, call = read_verdict_stream(resp, parse_fn, metric_name or "", t0)
+            else:
+                text = parse_text = resp.choices[0].message.content or ""
+                call = {"latency_s": round(time.perf_counter() - t0, 3),
+                        "usage": usage_to_dict(getattr(resp, "usage", None))}
+        except BaseException as e:
+            if endpoint is not None:
+                pool.release(endpoint, reservation, error=e)
+            raise
+        usage = call["usage"]
+        if endpoint is not None:
+            pool.release(endpoint, reservation, tokens=usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+            call["endpoint"] = endpoint.name
+        call["model"] = dep
+        return text, parse_text, call
+
+    def _parses(result: Tuple[str, str, Dict[str, Any]]) -> bool:
+        if parse_fn is None:
+            return True
+        payload, _, err = parse_fn(result[1])
+        return err is None and isinstance(payload, dict)
+
+    def _failed(e: BaseException, sleep_s: float) -> None:
+        # a pooled endpoint that failed is cooled down by the pool; retry elsewhere at once
+        if pool is not None and failure_kind(e) is not None:
+            return
+        if sleep_s:
+            time.sleep(sleep_s)
+
     success = False
     i = 0
     while not success:
         if i > 50:
             raise RuntimeError(f"API call failed after {i} retries")
         try:
-            resp = client.chat.completions.create(model=deployment, messages=messages)
-            text = resp.choices[0].message.content or ""
+            if hedger is not None:
+                (text, parse_text, call), race = hedger.race(metric_name or "", _send, _parses)
+                # the race record stays live: the original request's latency lands in it later
+                race.update({k: v for k, v in call.items() if k != "latency_s"})
+                call = race
+            else:
+                text, parse_text, call = _send()
+            answered_by = call.get("endpoint", answered_by)
+            answered_model = call.get("model", answered_model)
+            api_calls.append(call)
 
             if parse_fn is not None:
                 i += 1
-                payload, score, err = parse_fn(text)
+                payload, score, err = parse_fn(parse_text)
                 if err is None and isinstance(payload, dict):
                     parsed_ok = True
                     parse_error = None
@@ -203,32 +456,39 @@ def evaluate_one(
         except openai.RateLimitError as e:
             print(f"RateLimitError occurred: {e}")
             i += 1
-            if hasattr(e, "status_code") and e.status_code == 429:
-                time.sleep(5)
+            _failed(e, 5 if getattr(e, "status_code", None) == 429 else 0)
         except openai.PermissionDeniedError as e:
             i += 1
             print(f"PermissionDeniedError occurred: {e}")
-            time.sleep(60)
+            _failed(e, 60)
         except openai.BadRequestError as e:
             i += 1
             print(f"BadRequestError occurred: {e}")
-            if hasattr(e, "status_code") and e.status_code == 400:
-                time.sleep(5)
+            _failed(e, 5 if getattr(e, "status_code", None) == 400 else 0)
         except openai.InternalServerError as e:
             i += 1
             print(f"InternalServerError occurred: {e}")
-            time.sleep(60)
+            _failed(e, 60)
+        except openai.APITimeoutError as e:
+            # --request_timeout expired: retry at once
+            i += 1
+            print(f"APITimeoutError occurred: {e}")
         except openai.APIConnectionError as e:
             i += 1
             print(f"APIConnectionError occurred: {e}")
-            time.sleep(60)
+            _failed(e, 60)
 
     out: Dict[str, Any] = {
         "eval_ok": True,
         "gpt_text": text,
         "parsed_ok": parsed_ok,
         "parse_error": parse_error,
+        "api_calls": api_calls,
     }
+    if answered_by is not None:
+        out["endpoint"] = answered_by
+    if answered_model is not None:
+        out["model"] = answered_model
 
     if metric_spec is not None:
         out.update({
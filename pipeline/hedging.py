@@ -0,0 +1,126 @@
+"""Hedged judge requests: a second copy of a request that is running late.
+
+    run_eval ... --hedge_max_rate 0.05 [--request_timeout 120]
+
+Latencies of answered requests are tracked per metric. Once a metric has
+MIN_SAMPLES of them, a request still unanswered after their HEDGE_QUANTILE
+(p95) gets a duplicate, which the endpoint pool may route elsewhere. The first
+response that parses wins; the other is abandoned (its connection finishes in
+the background and its answer is discarded). Duplicates are capped at
+`max_rate` times the number of requests, so hedging costs at most that
+fraction of extra calls.
+
+Every race is recorded in its api_calls entry ("hedged", "hedge_won", and the
+original request's latency once it answers); CallStats reports the hedge rate
+and the p95 latency with and without hedging from those entries.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+HEDGE_RATE_ENV = "VIBE_HEDGE_MAX_RATE"
+REQUEST_TIMEOUT_ENV = "VIBE_REQUEST_TIMEOUT"
+
+HEDGE_QUANTILE = 0.95
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+# never hedge sooner than this, however fast the judge has been
+MIN_DELAY_S = 1.0
+
+
+class Hedger:
+    def __init__(self, max_rate: float, max_workers: int = 32):
+        if not 0 < max_rate <= 1:
+            raise ValueError(f"Hedge rate must be in (0, 1], got {max_rate}")
+        self.max_rate = max_rate
+        self.requests = 0
+        self.hedges = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def observe(self, key: str, latency_s: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(latency_s)
+
+    def delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging a request of `key`, or None while too few latencies are known."""
+        with self._lock:
+            lat = sorted(self._latencies.get(key, ()))
+        if len(lat) < MIN_SAMPLES:
+            return None
+        return max(MIN_DELAY_S, lat[min(len(lat) - 1, int(HEDGE_QUANTILE * len(lat)))])
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def race(self, key: str, send: Callable[[], Any], valid: Callable[[Any], bool]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Run send(), hedged if it is late. Returns (result, info): the first valid
+        result, else the last result or exception of the two. info holds
+        "latency_s" (time until the returned result) and, for a hedged race,
+        "hedged", "hedge_won" and (filled in when it answers) "primary_latency_s".
+        """
+        with self._lock:
+            self.requests += 1
+        info: Dict[str, Any] = {}
+        t0 = time.perf_counter()
+
+        def _primary_done(f: Future) -> None:
+            if f.exception() is None:
+                latency = time.perf_counter() - t0
+                self.observe(key, latency)
+                if info.get("hedged"):
+                    info["primary_latency_s"] = round(latency, 3)
+
+        primary = self._executor.submit(send)
+        racers = [primary]
+        delay = self.delay(key)
+        if delay is not None and not wait([primary], timeout=delay).done and self._take_hedge():
+            info.update(hedged=True, hedge_won=False)
+            racers.append(self._executor.submit(send))
+        primary.add_done_callback(_primary_done)
+
+        pending = set(racers)
+        fallback: Optional[Future] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # the original request wins ties
+            for f in sorted(done, key=racers.index):
+                if f.exception() is None and valid(f.result()):
+                    info["latency_s"] = round(time.perf_counter() - t0, 3)
+                    if f is not primary:
+                        info["hedge_won"] = True
+                    return f.result(), info
+                fallback = f
+        info["latency_s"] = round(time.perf_counter() - t0, 3)
+        return fallback.result(), info
+
+
+_hedgers: Dict[float, Hedger] = {}
+_hedgers_lock = threading.Lock()
+
+
+def get_hedger() -> Optional[Hedger]:
+    """The process-wide hedger configured by $VIBE_HEDGE_MAX_RATE, or None when hedging is off."""
+    rate = float(os.environ.get(HEDGE_RATE_ENV) or 0)
+    if rate <= 0:
+        return None
+    with _hedgers_lock:
+        if rate not in _hedgers:
+            _hedgers[rate] = Hedger(rate)
+        return _hedgers[rate]
+
+
+def request_timeout() -> Optional[float]:
+    """Per-request timeout in seconds from $VIBE_REQUEST_TIMEOUT (None: the client default)."""
+    value = float(os.environ.get(REQUEST_TIMEOUT_ENV) or 0)
+    return value if value > 0 else None
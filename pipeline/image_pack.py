@@ -0,0 +1,169 @@
+"""Read side of the packed image store built by `python -m pipeline.pack_images`.
+
+    export VIBE_IMAGE_PACKS=./packs            # or run_eval --image_packs ./packs
+
+A pack holds the image files of one task in a single file, unchanged (the
+original PNG/JPEG bytes, one after another), next to an index:
+
+    {dir}/{name}.vpack        concatenated image files
+    {dir}/{name}.vpack.index  {"format_version": 1, "task": ..., "kind": "dataset" | "generated",
+                               "entries": [{"id": ..., "role": "source" | "layer" | "target" | "generated",
+                                            "path": <absolute path it was packed from>,
+                                            "offset": ..., "length": ..., "size": [w, h], "mode": ...,
+                                            "format": "PNG", "sha256": ..., "plain": true}]}
+
+$VIBE_IMAGE_PACKS lists pack indexes, or directories holding them, separated
+by os.pathsep. Lookups are by the absolute path a reader would have opened, so
+pipeline.io_utils serves packed files to every caller (the judge pipeline and
+gpt.py alike) without the individual file ever being opened or stat'ed. Packs
+are memory-mapped; readers get memoryview slices of the mapping.
+
+The index is trusted: after the packed files change, rebuild the pack (or
+check it with `python -m pipeline.pack_images --verify`). "plain" marks PNGs
+in RGB/RGBA mode without colour-management chunks, whose bytes decode to the
+same pixels the pipeline would re-encode, so they are sent to the judge as is.
+"""
+
+import json
+import mmap
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+PACK_FORMAT_VERSION = 1
+IMAGE_PACKS_ENV = "VIBE_IMAGE_PACKS"
+PACK_SUFFIX = ".vpack"
+INDEX_SUFFIX = ".vpack.index"
+
+FILE_SOURCE = "source"
+FILE_LAYER = "layer"
+FILE_TARGET = "target"
+FILE_GENERATED = "generated"
+
+
+class PackSlice:
+    """Read-only, seekable file object over a memoryview (for PIL's Image.open)."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self._view) if n is None or n < 0 else min(len(self._view), self._pos + n)
+        out = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return out
+
+    def readinto(self, b: Any) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class ImagePack:
+    def __init__(self, index_path: str):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format_version") != PACK_FORMAT_VERSION:
+            raise ValueError(f"{index_path}: pack format {index.get('format_version')}, "
+                             f"expected {PACK_FORMAT_VERSION}; rebuild it with pipeline.pack_images")
+        self.index_path = index_path
+        self.pack_path = index_path[: -len(INDEX_SUFFIX)] + PACK_SUFFIX
+        self.task = index.get("task")
+        self.kind = index.get("kind")
+        self.entries: List[Dict[str, Any]] = index.get("entries", [])
+        self.by_path = {e["path"]: e for e in self.entries}
+        self.by_key = {(str(e["id"]), e["role"]): e for e in self.entries}
+        self._mm: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _map(self) -> memoryview:
+        if self._mm is None:
+            with self._lock:
+                if self._mm is None:
+                    with open(self.pack_path, "rb") as f:
+                        self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mm)
+
+    def view(self, entry: Dict[str, Any]) -> memoryview:
+        """The packed file bytes of `entry` (no copy; valid while the pack is open)."""
+        return self._map()[entry["offset"]:entry["offset"] + entry["length"]]
+
+
+def index_paths(spec: str) -> List[str]:
+    out: List[str] = []
+    for part in spec.split(os.pathsep):
+        if not part:
+            continue
+        if os.path.isdir(part):
+            out.extend(os.path.join(part, fn) for fn in sorted(os.listdir(part)) if fn.endswith(INDEX_SUFFIX))
+        elif os.path.exists(part):
+            out.append(part)
+        else:
+            print(f"[WARN] Image pack not found: {part}")
+    return out
+
+
+class ImagePacks:
+    """Every pack named by one $VIBE_IMAGE_PACKS value; later packs win on duplicate paths."""
+
+    def __init__(self, spec: str):
+        self.packs = [ImagePack(p) for p in index_paths(spec)]
+        self._by_path: Dict[str, Tuple[ImagePack, Dict[str, Any]]] = {}
+        for pack in self.packs:
+            for path, entry in pack.by_path.items():
+                self._by_path[path] = (pack, entry)
+
+    def lookup(self, path: str) -> Optional[Tuple[ImagePack, Dict[str, Any]]]:
+        if not path:
+            return None
+        return self._by_path.get(os.path.abspath(path))
+
+
+_packs: Dict[str, ImagePacks] = {}
+_packs_lock = threading.Lock()
+
+
+def get_image_packs() -> Optional[ImagePacks]:
+    """The packs named by $VIBE_IMAGE_PACKS (loaded once per process), or None."""
+    spec = os.environ.get(IMAGE_PACKS_ENV)
+    if not spec:
+        return None
+    packs = _packs.get(spec)
+    if packs is not None:
+        return packs
+    with _packs_lock:
+        if spec not in _packs:
+            _packs[spec] = ImagePacks(spec)
+        return _packs[spec]
+
+
+def packed_entry(path: str) -> Optional[Dict[str, Any]]:
+    packs = get_image_packs()
+    hit = packs.lookup(path) if packs is not None else None
+    return hit[1] if hit is not None else None
+
+
+def packed_view(path: str) -> Optional[memoryview]:
+    """The packed bytes of the file at `path`, or None when no pack holds it."""
+    packs = get_image_packs()
+    hit = packs.lookup(path) if packs is not None else None
+    return hit[0].view(hit[1]) if hit is not None else None
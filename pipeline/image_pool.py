@@ -0,0 +1,110 @@
+"""Process pool for judge-image preparation (decode, composite, PNG encode).
+
+PNG compression holds the GIL, so with workers > 0 the work runs in separate
+processes and the encoded bytes come back through one shared-memory block per
+request instead of being pickled through the result pipe. workers == 0 runs
+everything in the calling process with the same interface.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from .evaluator import prepare_judge_images
+
+
+@dataclass(frozen=True)
+class ImagePrepRequest:
+    task_name: str
+    sample_id: str
+    gen_image_abs: str
+    roles: Tuple[str, ...]   # union of image_roles_for_metric() over the metrics to run
+
+
+@dataclass
+class PreparedImages:
+    payloads: Optional[Dict[str, bytes]]
+    error: Optional[str] = None
+
+
+# (shm_name, [(role, offset, length), ...], error)
+_WorkerResult = Tuple[Optional[str], List[Tuple[str, int, int]], Optional[str]]
+
+
+def _prepare_in_worker(req: ImagePrepRequest) -> _WorkerResult:
+    payloads, err = prepare_judge_images(req.task_name, req.sample_id, req.gen_image_abs, req.roles)
+    if err is not None or not payloads:
+        return None, [], err
+
+    total = sum(len(b) for b in payloads.values())
+    shm = shared_memory.SharedMemory(create=True, size=max(1, total))
+    # The parent owns (and unlinks) the block; stop this process's tracker from
+    # reclaiming it when the worker exits.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    layout: List[Tuple[str, int, int]] = []
+    off = 0
+    for role, data in payloads.items():
+        shm.buf[off:off + len(data)] = data
+        layout.append((role, off, len(data)))
+        off += len(data)
+    name = shm.name
+    shm.close()
+    return name, layout, None
+
+
+def _collect(result: _WorkerResult) -> PreparedImages:
+    name, layout, err = result
+    if name is None:
+        return PreparedImages(payloads=None, error=err)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        payloads = {role: bytes(shm.buf[off:off + n]) for role, off, n in layout}
+    finally:
+        shm.close()
+        shm.unlink()
+    return PreparedImages(payloads=payloads)
+
+
+class ImagePrepService:
+    def __init__(self, workers: int = 0):
+        self.workers = max(0, int(workers))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.workers > 0:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, req: ImagePrepRequest) -> "Future[PreparedImages]":
+        if self._pool is None:
+            fut: "Future[PreparedImages]" = Future()
+            try:
+                payloads, err = prepare_judge_images(req.task_name, req.sample_id, req.gen_image_abs, req.roles)
+                fut.set_result(PreparedImages(payloads=payloads, error=err))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+
+        out: "Future[PreparedImages]" = Future()
+        inner = self._pool.submit(_prepare_in_worker, req)
+
+        def _done(f):
+            try:
+                out.set_result(_collect(f.result()))
+            except Exception as e:
+                out.set_exception(e)
+
+        inner.add_done_callback(_done)
+        return out
+
+    def prepare(self, req: ImagePrepRequest) -> PreparedImages:
+        return self.submit(req).result()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self) -> "ImagePrepService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,10 +1,16 @@
 import base64
+import binascii
 import io
 import json
 import os
-from typing import Any
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Union
 
-from PIL import Image
+from .image_pack import PackSlice, packed_entry, packed_view
+from .lazy import lazy_module
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 def read_json(path: str) -> Any:
     with open(path, "r", encoding="utf-8") as f:
@@ -19,22 +25,175 @@ def read_text(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-def load_rgba(path: str) -> Image.Image:
-    return Image.open(path).convert("RGBA")
-
-def merge_source_and_layer(source_path: str, layer_path: str) -> Image.Image:
-    src = load_rgba(source_path)
-    if layer_path and os.path.exists(layer_path):
-        layer = load_rgba(layer_path)
-        if layer.size != src.size:
-            layer = layer.resize(src.size, resample=Image.BICUBIC)
-        out = src.copy()
-        out.alpha_composite(layer)
-        return out
-    return src
-
-def pil_to_data_url(img: Image.Image, fmt: str = "PNG") -> str:
+@lru_cache(maxsize=4096)
+def _image_header(path: str, mtime_ns: int, file_size: int) -> Tuple[Tuple[int, int], str, Optional[str]]:
+    # Image.open only parses the header; pixels are decoded on load()
+    with lazy_module("PIL.Image").open(path) as im:
+        has_alpha = im.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in im.info
+        return im.size, ("RGBA" if has_alpha else im.mode), im.format
+
+def image_header(path: str) -> Tuple[Tuple[int, int], str, Optional[str]]:
+    """(size, mode, format) without decoding pixels. `mode` is "RGBA" for any image with alpha."""
+    entry = packed_entry(path)
+    if entry is not None:
+        return tuple(entry["size"]), entry["mode"], entry["format"]
+    st = os.stat(path)
+    return _image_header(path, st.st_mtime_ns, st.st_size)
+
+def image_size(path: str) -> Tuple[int, int]:
+    return image_header(path)[0]
+
+def image_exists(path: str) -> bool:
+    """os.path.exists for image files, answered from the image packs ($VIBE_IMAGE_PACKS) when they hold it."""
+    return bool(path) and (packed_entry(path) is not None or os.path.exists(path))
+
+def open_image(path: str) -> "Image.Image":
+    """Image.open, reading from the memory-mapped image pack when it holds `path`."""
+    view = packed_view(path)
+    return lazy_module("PIL.Image").open(PackSlice(view) if view is not None else path)
+
+def packed_png(path: str) -> Optional[memoryview]:
+    """
+    The packed bytes of `path` when they can be sent as the PNG the pipeline would
+    encode (a "plain" RGB/RGBA PNG, see pipeline.image_pack), else None.
+    """
+    entry = packed_entry(path)
+    if entry is None or not entry.get("plain"):
+        return None
+    return packed_view(path)
+
+# modes whose pixels reduce() can average directly
+_REDUCE_MODES = ("L", "LA", "RGB", "RGBA")
+
+def load_image(path: str, target_size: Optional[Tuple[int, int]] = None, need_alpha: bool = False) -> "Image.Image":
+    """
+    Decode an image as RGB, or RGBA when it has an alpha channel or `need_alpha`.
+    With `target_size` (the size the caller will resize to), JPEGs are decoded
+    at a reduced DCT scale via draft() and other formats are reduce()d by an
+    integer factor first; the result is never smaller than `target_size`.
+    """
+    im = open_image(path)
+    if target_size is not None and im.format == "JPEG":
+        im.draft("RGB", target_size)
+    has_alpha = im.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in im.info
+    mode = "RGBA" if (need_alpha or has_alpha) else "RGB"
+    if target_size is not None:
+        factor = min(im.size[0] // max(1, target_size[0]), im.size[1] // max(1, target_size[1]))
+        if factor >= 2:
+            # reduce() averages pixel values: palette indices, 1-bit and 16/32-bit modes are converted first
+            if im.mode not in _REDUCE_MODES:
+                im = im.convert(mode)
+            im = im.reduce(factor)
+    return im if im.mode == mode else im.convert(mode)
+
+def load_rgba(path: str) -> "Image.Image":
+    return load_image(path, need_alpha=True)
+
+def merge_source_and_layer(source_path: str, layer_path: str) -> "Image.Image":
+    if layer_path and image_exists(layer_path):
+        src = load_rgba(source_path)
+        # size check from headers; the layer is decoded reduced when it is much larger
+        layer_size = image_size(layer_path)
+        if layer_size != src.size:
+            layer = load_image(layer_path, target_size=src.size, need_alpha=True)
+            layer = layer.resize(src.size, resample=lazy_module("PIL.Image").BICUBIC)
+        else:
+            layer = load_rgba(layer_path)
+        src.alpha_composite(layer)
+        return src
+    # nothing to composite: keep the source without an added alpha channel
+    return load_image(source_path)
+
+def pil_to_png_bytes(img: "Image.Image", fmt: str = "PNG") -> bytes:
     buf = io.BytesIO()
     img.save(buf, format=fmt)
-    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
+    return buf.getvalue()
+
+def png_bytes_to_data_url(data: bytes, fmt: str = "PNG") -> str:
+    b64 = base64.b64encode(data).decode("utf-8")
     return f"data:image/{fmt.lower()};base64,{b64}"
+
+def pil_to_data_url(img: "Image.Image", fmt: str = "PNG") -> str:
+    return png_bytes_to_data_url(pil_to_png_bytes(img, fmt), fmt)
+
+
+class GrowableBuffer:
+    """
+    Write-only file-like object over a bytearray that keeps its capacity across
+    reset() calls, so repeated encodes reuse one allocation.
+    Views returned by view() are valid until the next reset()/write().
+    """
+
+    def __init__(self, capacity: int = 0):
+        self._buf = bytearray(capacity)
+        self._n = 0
+
+    def reset(self) -> None:
+        self._n = 0
+
+    def reserve(self, size: int) -> None:
+        if size <= len(self._buf):
+            return
+        grow = max(size, 2 * len(self._buf)) - len(self._buf)
+        try:
+            self._buf.extend(bytes(grow))
+        except BufferError:
+            # an old view is still exported (e.g. a request body still in flight): move on to a new buffer
+            new = bytearray(len(self._buf) + grow)
+            new[:self._n] = self._buf[:self._n]
+            self._buf = new
+
+    def write(self, data: Union[bytes, bytearray, memoryview]) -> int:
+        n = memoryview(data).nbytes
+        end = self._n + n
+        self.reserve(end)
+        self._buf[self._n:end] = data
+        self._n = end
+        return n
+
+    def tell(self) -> int:
+        return self._n
+
+    def flush(self) -> None:
+        pass
+
+    def view(self) -> memoryview:
+        return memoryview(self._buf)[:self._n]
+
+
+# 48 KiB of input per b2a_base64 call; a multiple of 3 so no padding is emitted mid-stream.
+_B64_CHUNK = 3 * 16 * 1024
+
+
+def b64encode_into(src: Union[bytes, memoryview], out: GrowableBuffer) -> None:
+    mv = memoryview(src)
+    out.reserve(out.tell() + 4 * ((mv.nbytes + 2) // 3))
+    for i in range(0, mv.nbytes, _B64_CHUNK):
+        out.write(binascii.b2a_base64(mv[i:i + _B64_CHUNK], newline=False))
+
+
+def encode_data_url_into(data: Union[bytes, memoryview], out: GrowableBuffer, fmt: str = "PNG") -> memoryview:
+    """Write `data:image/<fmt>;base64,<...>` into `out` (reset first) and return a view of it."""
+    out.reset()
+    out.write(f"data:image/{fmt.lower()};base64,".encode("ascii"))
+    b64encode_into(data, out)
+    return out.view()
+
+
+def assemble_json_body(obj: Any, placeholders: List[str], views: List[memoryview]) -> Tuple[List[Any], int]:
+    """
+    Serialise `obj` where each placeholder string stands in for the matching
+    view, returning body chunks (JSON text interleaved with the views) and the
+    total length. Views must not need JSON escaping (base64 data URLs don't).
+    """
+    text = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    chunks: List[Any] = []
+    pos = 0
+    for ph, view in zip(placeholders, views):
+        token = json.dumps(ph).encode("utf-8")[1:-1]
+        at = text.index(token, pos)
+        chunks.append(text[pos:at])
+        chunks.append(view)
+        pos = at + len(token)
+    chunks.append(text[pos:])
+    return chunks, sum(memoryview(c).nbytes for c in chunks)
@@ -0,0 +1,261 @@
+"""SQLite job queue for elastic evaluation workers on one host.
+
+    run_eval ... --queue Q.db --queue_action enqueue   # plan every run file, insert its jobs
+    run_eval ... --queue Q.db --queue_action work      # any number of times, at any time
+    run_eval ... --queue Q.db --queue_action merge     # write run files + summaries
+
+A job is one planned (task, model, id, metric, repeat) pair. Workers lease the
+jobs of one item group at a time (Visual_Coherence travels with its item's
+Instruction_Adherence, as in pipeline.shards; the whole item when pruning) for
+`lease_s` seconds; every outcome is committed as soon as it is known and
+extends the lease of the rest of the group. A lease that expires (worker killed or stuck) makes its unfinished
+jobs leasable again; a late commit from the old owner is rejected, so each job
+ends with exactly one outcome. The merge replays the outcomes in plan order,
+like `--merge_shards`.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .planner import IA_METRIC, VC_METRIC
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run_json TEXT UNIQUE NOT NULL,
+    input_json TEXT NOT NULL,
+    gen_prefix TEXT NOT NULL,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    repeat INTEGER NOT NULL,
+    rerun INTEGER NOT NULL,
+    prune INTEGER NOT NULL,
+    metrics TEXT NOT NULL,
+    metric_set TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    sample_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    plan_kind TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    kind TEXT,
+    value TEXT,
+    PRIMARY KEY (run_id, sample_id, metric)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, run_id, seq);
+"""
+
+
+def model_of(result_json_path: str) -> str:
+    """Model directory in the {results_root}/{model}/{level}/{task}/ layout."""
+    d = os.path.dirname(os.path.abspath(result_json_path))
+    return os.path.basename(os.path.dirname(os.path.dirname(d))) or "?"
+
+
+def group_of(metric_name: str, metric_names: List[str], whole_item: bool = False) -> str:
+    if whole_item:
+        return "*"
+    if metric_name == VC_METRIC and IA_METRIC in metric_names:
+        return IA_METRIC
+    return metric_name
+
+
+@dataclass
+class QueueRun:
+    run_id: int
+    run_json: str
+    input_json: str
+    gen_prefix: str
+    task: str
+    repeat: int
+    rerun: bool
+    prune: bool
+    metrics: List[str]                       # evaluation order chosen at enqueue time
+
+
+@dataclass
+class Lease:
+    run: QueueRun
+    sample_id: str
+    grp: str
+    todo: List[Tuple[str, str]]              # (metric, plan kind) still to run, in plan order
+    done: List[Tuple[str, str, Any]]         # (metric, outcome kind, value) already committed
+    requeued: bool                           # taken over from an expired lease
+
+
+class LeaseLost(Exception):
+    """The lease expired and another worker took the job over."""
+
+
+class JobQueue:
+    _RUN_COLS = "run_id, run_json, input_json, gen_prefix, task, repeat, rerun, prune, metrics"
+
+    def __init__(self, path: str, timeout_s: float = 60.0):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=timeout_s, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _run_row(self, row: Tuple) -> QueueRun:
+        return QueueRun(row[0], row[1], row[2], row[3], row[4], row[5], bool(row[6]), bool(row[7]), row[8].split(","))
+
+    def get_run(self, run_json: str) -> Optional[QueueRun]:
+        row = self.db.execute(
+            f"SELECT {self._RUN_COLS} FROM runs WHERE run_json=?", (os.path.abspath(run_json),)
+        ).fetchone()
+        return self._run_row(row) if row else None
+
+    def enqueue_run(
+        self,
+        run_json: str,
+        input_json: str,
+        gen_prefix: str,
+        task_name: str,
+        repeat: int,
+        rerun: bool,
+        metric_names: List[str],
+        pairs: List[Tuple[str, str, str]],
+        prune: bool = False,
+    ) -> int:
+        """
+        Insert one run's planned (sample_id, metric, plan kind) pairs, with
+        metric_names in evaluation order. Returns the number of jobs added
+        (0 if the run is already queued with the same settings).
+        """
+        have = self.get_run(run_json)
+        if have is not None:
+            if (have.input_json, have.rerun, have.prune, have.metrics) != (
+                os.path.abspath(input_json), rerun, prune, list(metric_names)
+            ):
+                raise ValueError(f"{run_json} is already queued with different settings; use a new queue file.")
+            return 0
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = self.db.execute(
+                "INSERT INTO runs (run_json, input_json, gen_prefix, task, model, repeat, rerun, prune, metrics, metric_set) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(run_json), os.path.abspath(input_json), os.path.abspath(gen_prefix),
+                 task_name, model_of(run_json), repeat, int(rerun), int(prune),
+                 ",".join(metric_names), ",".join(sorted(metric_names))),
+            )
+            run_id = cur.lastrowid
+            self.db.executemany(
+                "INSERT INTO jobs (run_id, seq, sample_id, metric, grp, plan_kind) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, seq, sid, m, group_of(m, metric_names, prune), kind)
+                 for seq, (sid, m, kind) in enumerate(pairs)],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return len(pairs)
+
+    def lease(self, owner: str, task_name: str, metric_names: List[str], lease_s: float) -> Optional[Lease]:
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT j.run_id, j.sample_id, j.grp, j.state FROM jobs j JOIN runs r ON r.run_id = j.run_id "
+                "WHERE r.task=? AND r.metric_set=? AND (j.state=? OR (j.state=? AND j.lease_expires < ?)) "
+                "ORDER BY j.run_id, j.seq LIMIT 1",
+                (task_name, ",".join(sorted(metric_names)), STATE_PENDING, STATE_LEASED, now),
+            ).fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            run_id, sample_id, grp, state = row
+            self.db.execute(
+                "UPDATE jobs SET state=?, owner=?, lease_expires=?, attempts=attempts+1 "
+                "WHERE run_id=? AND sample_id=? AND grp=? AND state!=?",
+                (STATE_LEASED, owner, now + lease_s, run_id, sample_id, grp, STATE_DONE),
+            )
+            rows = self.db.execute(
+                "SELECT metric, plan_kind, state, kind, value FROM jobs "
+                "WHERE run_id=? AND sample_id=? AND grp=? ORDER BY seq",
+                (run_id, sample_id, grp),
+            ).fetchall()
+            run = self._run_row(self.db.execute(
+                f"SELECT {self._RUN_COLS} FROM runs WHERE run_id=?", (run_id,)
+            ).fetchone())
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return Lease(
+            run=run,
+            sample_id=sample_id,
+            grp=grp,
+            todo=[(m, pk) for m, pk, st, _, _ in rows if st != STATE_DONE],
+            done=[(m, k, json.loads(v)) for m, _, st, k, v in rows if st == STATE_DONE],
+            requeued=state == STATE_LEASED,
+        )
+
+    def commit(self, lease: Lease, owner: str, metric_name: str, kind: str, value: Any, lease_s: float) -> None:
+        """Record one outcome and extend the lease on the rest of the group; raises LeaseLost."""
+        key = (lease.run.run_id, lease.sample_id)
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = self.db.execute(
+                "UPDATE jobs SET state=?, kind=?, value=?, owner=NULL, lease_expires=NULL "
+                "WHERE run_id=? AND sample_id=? AND metric=? AND state=? AND owner=?",
+                (STATE_DONE, kind, json.dumps(value, ensure_ascii=False), *key, metric_name, STATE_LEASED, owner),
+            )
+            if cur.rowcount != 1:
+                self.db.execute("ROLLBACK")
+                raise LeaseLost(f"{lease.run.run_json} {lease.sample_id} {metric_name}")
+            self.db.execute(
+                "UPDATE jobs SET lease_expires=? WHERE run_id=? AND sample_id=? AND grp=? AND state=? AND owner=?",
+                (time.time() + lease_s, *key, lease.grp, STATE_LEASED, owner),
+            )
+            self.db.execute("COMMIT")
+        except LeaseLost:
+            raise
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def counts(self, task_name: Optional[str] = None) -> Dict[str, int]:
+        sql = "SELECT j.state, COUNT(*) FROM jobs j JOIN runs r ON r.run_id = j.run_id"
+        args: Tuple = ()
+        if task_name is not None:
+            sql += " WHERE r.task=?"
+            args = (task_name,)
+        out = {STATE_PENDING: 0, STATE_LEASED: 0, STATE_DONE: 0}
+        out.update(dict(self.db.execute(sql + " GROUP BY j.state", args).fetchall()))
+        return out
+
+    def outcomes(self, run_id: int) -> Tuple[Dict[Tuple[str, str], Dict[str, Any]], int]:
+        """({(sample_id, metric): {"kind", "value"}} for finished jobs, number of unfinished jobs)."""
+        done: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        unfinished = 0
+        for sid, m, st, k, v in self.db.execute(
+            "SELECT sample_id, metric, state, kind, value FROM jobs WHERE run_id=? ORDER BY seq", (run_id,)
+        ):
+            if st == STATE_DONE:
+                done[(sid, m)] = {"kind": k, "value": json.loads(v)}
+            else:
+                unfinished += 1
+        return done, unfinished
+
+    def planned_keys(self, run_id: int) -> List[Tuple[str, str]]:
+        return [tuple(r) for r in self.db.execute(
+            "SELECT sample_id, metric FROM jobs WHERE run_id=? ORDER BY seq", (run_id,)
+        )]
@@ -0,0 +1,51 @@
+"""Heavy dependencies imported on first use, with the time each import took.
+
+openai, PIL and tqdm are not imported when the pipeline modules load: a run that
+never calls the judge (--plan_only, --merge_shards, re-summarising) or never
+decodes an image does not pay for them. Modules fetch them with
+lazy_module("openai") inside the functions that need them; the first call
+imports and times the module, later calls are a dict lookup.
+
+run_eval prints the timings as a [STARTUP] line at the end of a run.
+"""
+
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Dict
+
+_import_times: Dict[str, float] = {}
+# fully imported modules; sys.modules also holds modules another thread is still initialising
+_loaded: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def lazy_module(name: str) -> Any:
+    """The module `name`, imported (and timed) on the first call."""
+    module = _loaded.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        fresh = name not in sys.modules
+        t0 = time.perf_counter()
+        # waits for an import in progress elsewhere
+        module = importlib.import_module(name)
+        if fresh:
+            _import_times[name] = time.perf_counter() - t0
+        _loaded[name] = module
+    return module
+
+
+def import_times() -> Dict[str, float]:
+    """Seconds spent importing each deferred module so far, in import order."""
+    with _lock:
+        return dict(_import_times)
+
+
+def startup_report(module_import_s: float) -> str:
+    deferred = import_times()
+    parts = [f"{name} {secs:.2f}s" for name, secs in deferred.items()]
+    return (f"[STARTUP] pipeline modules imported in {module_import_s:.2f}s; deferred imports: "
+            + (", ".join(parts) if parts else "none")
+            + f" ({sum(deferred.values()):.2f}s)")
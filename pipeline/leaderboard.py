@@ -0,0 +1,454 @@
+"""Cross-model leaderboard built from evaluated result files.
+
+Expected layout (same as eval.sh):
+
+    {results_root}/{model}/{level}/{task}/{task}_results_{i}.json
+
+Adaptive runs (run_eval --adaptive_budget) are read from {task}_results_1.json
+plus the partial passes {task}_results_pass_{k}.json; their rows are flagged
+`adaptive` and their task score is the mean over items of each item's mean over
+its passes, as in the adaptive {task}_summary.json.
+
+Every (model, level, task, item, metric, repeat, score) observation is stored
+column-wise, one file per model, as Parquet when pyarrow is installed and as a
+NumPy .npz archive otherwise. A manifest records the size/mtime of every source
+file so that `build` only re-ingests models whose result files changed.
+"""
+
+import argparse
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional
+    pa = None
+    pq = None
+
+from .discovery import ADAPTIVE_PASS
+from .io_utils import read_json, write_json
+
+STORE_FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+OVERALL = "overall"
+
+STRING_COLUMNS = ["level", "task", "item", "metric"]
+
+
+@dataclass
+class ScoreTable:
+    """Columnar score storage: string columns are integer codes into `vocab`."""
+    columns: Dict[str, np.ndarray]
+    vocab: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return int(self.columns["score"].shape[0])
+
+    def codes_of(self, col: str, value: str) -> int:
+        hits = np.flatnonzero(self.vocab[col] == value)
+        return int(hits[0]) if hits.size else -1
+
+    def select(self, mask: np.ndarray) -> "ScoreTable":
+        return ScoreTable({k: v[mask] for k, v in self.columns.items()}, self.vocab)
+
+
+# ------------------------------------------------------------------ ingest
+
+def _is_adaptive_pass(path: str) -> bool:
+    return re.search(rf"_results_{ADAPTIVE_PASS}_\d+\.json$", os.path.basename(path)) is not None
+
+
+def _repeat_files(task_dir: str, task_name: str) -> List[Tuple[int, str]]:
+    pat = re.compile(rf"^{re.escape(task_name)}_results_({ADAPTIVE_PASS}_)?(\d+)\.json$")
+    repeats: List[Tuple[int, str]] = []
+    passes: List[Tuple[int, str]] = []
+    for fn in os.listdir(task_dir):
+        m = pat.match(fn)
+        if m:
+            (passes if m.group(1) else repeats).append((int(m.group(2)), os.path.join(task_dir, fn)))
+    # an adaptive run is its first pass plus the partial passes
+    out = [r for r in repeats if r[0] == 1] + passes if passes else repeats
+    if not out:
+        base = os.path.join(task_dir, f"{task_name}_results.json")
+        if os.path.isfile(base):
+            out.append((1, base))
+    return sorted(out)
+
+
+def discover_model_files(model_dir: str) -> List[Tuple[str, str, int, str]]:
+    """Return (level, task, repeat, path) for every result file of one model."""
+    out: List[Tuple[str, str, int, str]] = []
+    for level in sorted(os.listdir(model_dir)):
+        level_dir = os.path.join(model_dir, level)
+        if not os.path.isdir(level_dir):
+            continue
+        for task in sorted(os.listdir(level_dir)):
+            task_dir = os.path.join(level_dir, task)
+            if not os.path.isdir(task_dir):
+                continue
+            for rep, path in _repeat_files(task_dir, task):
+                out.append((level, task, rep, path))
+    return out
+
+
+def iter_item_scores(item: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """Yield (metric, score) pairs the same way run_eval's summaries collect them."""
+    if "score" in item:
+        try:
+            yield OVERALL, float(item["score"])
+        except (TypeError, ValueError):
+            pass
+    for k, v in item.items():
+        if k == "score" or not isinstance(v, dict) or "score" not in v:
+            continue
+        try:
+            yield k, float(v["score"])
+        except (TypeError, ValueError):
+            pass
+        # sub-metrics count even when the top-level score does not parse, as in collect_score_columns
+        for sk, sv in v.items():
+            if sk != "score" and isinstance(sv, dict) and "score" in sv:
+                try:
+                    yield f"{k}/{sk}", float(sv["score"])
+                except (TypeError, ValueError):
+                    pass
+
+
+def _encode(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    vocab, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return codes.astype(np.int32), vocab
+
+
+def ingest_model(model_dir: str) -> ScoreTable:
+    rows: Dict[str, List[Any]] = {c: [] for c in STRING_COLUMNS + ["repeat", "adaptive", "score"]}
+    files = discover_model_files(model_dir)
+    adaptive_tasks = {(level, task) for level, task, _, path in files if _is_adaptive_pass(path)}
+    for level, task, rep, path in files:
+        adaptive = (level, task) in adaptive_tasks
+        data = read_json(path)
+        if not isinstance(data, list):
+            print(f"[WARN] Skipping non-list result file: {path}")
+            continue
+        for item in data:
+            if not isinstance(item, dict) or item.get("status", "success") != "success":
+                continue
+            sample_id = str(item.get("id"))
+            for metric, score in iter_item_scores(item):
+                rows["level"].append(level)
+                rows["task"].append(task)
+                rows["item"].append(sample_id)
+                rows["metric"].append(metric)
+                rows["repeat"].append(rep)
+                rows["adaptive"].append(adaptive)
+                rows["score"].append(score)
+
+    columns: Dict[str, np.ndarray] = {}
+    vocab: Dict[str, np.ndarray] = {}
+    for c in STRING_COLUMNS:
+        columns[c], vocab[c] = _encode(rows[c])
+    columns["repeat"] = np.asarray(rows["repeat"], dtype=np.int16)
+    columns["adaptive"] = np.asarray(rows["adaptive"], dtype=np.int8)
+    columns["score"] = np.asarray(rows["score"], dtype=np.float64)
+    return ScoreTable(columns, vocab)
+
+
+# ------------------------------------------------------------------ storage
+
+def _model_file(store_dir: str, model: str) -> str:
+    ext = ".parquet" if pq is not None else ".npz"
+    return os.path.join(store_dir, f"{model}{ext}")
+
+
+def save_table(path: str, table: ScoreTable) -> None:
+    if path.endswith(".parquet"):
+        arrays = {c: table.vocab[c][table.columns[c]] for c in STRING_COLUMNS}
+        arrays["repeat"] = table.columns["repeat"]
+        arrays["adaptive"] = table.columns["adaptive"]
+        arrays["score"] = table.columns["score"]
+        pq.write_table(pa.table(arrays), path)
+        return
+    payload = {f"col_{k}": v for k, v in table.columns.items()}
+    payload.update({f"vocab_{k}": v for k, v in table.vocab.items()})
+    np.savez(path, **payload)
+
+
+def load_table(path: str) -> ScoreTable:
+    if path.endswith(".parquet"):
+        t = pq.read_table(path)
+        columns: Dict[str, np.ndarray] = {}
+        vocab: Dict[str, np.ndarray] = {}
+        for c in STRING_COLUMNS:
+            columns[c], vocab[c] = _encode(t.column(c).to_pylist())
+        columns["repeat"] = t.column("repeat").to_numpy().astype(np.int16)
+        columns["adaptive"] = t.column("adaptive").to_numpy().astype(np.int8)
+        columns["score"] = t.column("score").to_numpy().astype(np.float64)
+        return ScoreTable(columns, vocab)
+    with np.load(path, allow_pickle=False) as z:
+        columns = {k[4:]: z[k] for k in z.files if k.startswith("col_")}
+        vocab = {k[6:]: z[k] for k in z.files if k.startswith("vocab_")}
+    return ScoreTable(columns, vocab)
+
+
+def _fingerprint(files: List[Tuple[str, str, int, str]], root: str) -> Dict[str, List[int]]:
+    fp: Dict[str, List[int]] = {}
+    for _, _, _, path in files:
+        st = os.stat(path)
+        fp[os.path.relpath(path, root)] = [st.st_size, st.st_mtime_ns]
+    return fp
+
+
+def build_store(results_root: str, store_dir: str, models: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Ingest (or refresh) the column store. Returns {model: "added"|"updated"|"unchanged"|"removed"}.
+    Only models whose result-file fingerprint changed are re-read.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    manifest: Dict[str, Any] = {"format_version": STORE_FORMAT_VERSION, "models": {}}
+    if os.path.exists(manifest_path):
+        old = read_json(manifest_path)
+        if old.get("format_version") == STORE_FORMAT_VERSION:
+            manifest = old
+
+    present = sorted(
+        d for d in os.listdir(results_root)
+        if os.path.isdir(os.path.join(results_root, d)) and (models is None or d in models)
+    )
+    status: Dict[str, str] = {}
+
+    for model in present:
+        model_dir = os.path.join(results_root, model)
+        files = discover_model_files(model_dir)
+        fp = _fingerprint(files, model_dir)
+        entry = manifest["models"].get(model)
+        out_path = _model_file(store_dir, model)
+        if entry and entry.get("sources") == fp and os.path.exists(os.path.join(store_dir, entry["file"])):
+            status[model] = "unchanged"
+            continue
+
+        table = ingest_model(model_dir)
+        if entry and entry.get("file") and entry["file"] != os.path.basename(out_path):
+            stale = os.path.join(store_dir, entry["file"])
+            if os.path.exists(stale):
+                os.remove(stale)
+        save_table(out_path, table)
+        manifest["models"][model] = {"file": os.path.basename(out_path), "sources": fp, "rows": len(table)}
+        status[model] = "updated" if entry else "added"
+
+    if models is None:
+        for model in list(manifest["models"].keys()):
+            if model not in present:
+                stale = os.path.join(store_dir, manifest["models"][model]["file"])
+                if os.path.exists(stale):
+                    os.remove(stale)
+                del manifest["models"][model]
+                status[model] = "removed"
+
+    write_json(manifest_path, manifest)
+    return status
+
+
+def load_store(store_dir: str) -> ScoreTable:
+    """Concatenate all per-model tables into one table with a `model` column."""
+    manifest = read_json(os.path.join(store_dir, MANIFEST_NAME))
+    model_names = sorted(manifest["models"].keys())
+    parts = [load_table(os.path.join(store_dir, manifest["models"][m]["file"])) for m in model_names]
+
+    vocab: Dict[str, np.ndarray] = {"model": np.asarray(model_names, dtype=str)}
+    for c in STRING_COLUMNS:
+        vocab[c] = np.unique(np.concatenate([p.vocab[c] for p in parts])) if parts else np.asarray([], dtype=str)
+
+    columns: Dict[str, List[np.ndarray]] = {c: [] for c in ["model"] + STRING_COLUMNS + ["repeat", "adaptive", "score"]}
+    for mi, p in enumerate(parts):
+        columns["model"].append(np.full(len(p), mi, dtype=np.int32))
+        for c in STRING_COLUMNS:
+            remap = np.searchsorted(vocab[c], p.vocab[c]).astype(np.int32)
+            columns[c].append(remap[p.columns[c]] if len(p) else p.columns[c])
+        columns["repeat"].append(p.columns["repeat"])
+        columns["adaptive"].append(p.columns["adaptive"])
+        columns["score"].append(p.columns["score"])
+
+    merged = {
+        k: (np.concatenate(v) if v else np.asarray([], dtype=np.float64 if k == "score" else np.int32))
+        for k, v in columns.items()
+    }
+    return ScoreTable(merged, vocab)
+
+
+# ------------------------------------------------------------------ queries
+
+def _group_mean(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    uniq, inv = np.unique(keys, axis=0, return_inverse=True)
+    inv = inv.reshape(-1)
+    sums = np.bincount(inv, weights=values)
+    counts = np.bincount(inv)
+    return uniq, sums / counts
+
+
+def task_scores(table: ScoreTable, metric: str = OVERALL) -> Dict[Tuple[str, str, str], float]:
+    """
+    {(model, level, task): score} in percent. Per repeat the item mean is taken,
+    then repeats are averaged, which matches the `mean` in `{task}_summary.json`.
+    Adaptive tasks, whose later passes judge only some items, are averaged per
+    item over its passes and then over items, as pipeline.adaptive does.
+    """
+    code = table.codes_of("metric", metric)
+    t = table.select(table.columns["metric"] == code)
+    if len(t) == 0:
+        return {}
+    c = t.columns
+    adaptive = c["adaptive"].astype(np.int32)
+    inner = np.where(adaptive > 0, c["item"], c["repeat"].astype(np.int32))
+    inner_keys, inner_means = _group_mean(
+        np.stack([c["model"], c["level"], c["task"], adaptive, inner], axis=1), c["score"]
+    )
+    task_keys, task_means = _group_mean(inner_keys[:, :3], inner_means)
+    out: Dict[Tuple[str, str, str], float] = {}
+    for (m, lv, tk), v in zip(task_keys, task_means):
+        out[(str(t.vocab["model"][m]), str(t.vocab["level"][lv]), str(t.vocab["task"][tk]))] = round(float(v) * 100.0 + 1e-12, 2)
+    return out
+
+
+def rankings(table: ScoreTable, by: str = "task", metric: str = OVERALL) -> Dict[str, List[Tuple[str, float]]]:
+    """
+    by="task":  {task: [(model, score), ...]} sorted best-first.
+    by="level": {level: ...} where a level score is the unweighted mean of its task scores.
+    by="all":   {"all": ...} mean over every task.
+    """
+    scores = task_scores(table, metric)
+    groups: Dict[str, Dict[str, List[float]]] = {}
+    for (model, level, task), v in scores.items():
+        g = {"task": task, "level": level, "all": "all"}[by]
+        groups.setdefault(g, {}).setdefault(model, []).append(v)
+    out: Dict[str, List[Tuple[str, float]]] = {}
+    for g, per_model in sorted(groups.items()):
+        ranked = [(m, round(sum(vs) / len(vs) + 1e-12, 2)) for m, vs in per_model.items()]
+        ranked.sort(key=lambda x: (-x[1], x[0]))
+        out[g] = ranked
+    return out
+
+
+def _item_means(table: ScoreTable, model: str, metric: str) -> Dict[Tuple[int, int], float]:
+    mask = (table.columns["model"] == table.codes_of("model", model)) & \
+           (table.columns["metric"] == table.codes_of("metric", metric))
+    c = table.select(mask).columns
+    if c["score"].size == 0:
+        return {}
+    keys, means = _group_mean(np.stack([c["task"], c["item"]], axis=1), c["score"])
+    return {(int(k[0]), int(k[1])): float(v) for k, v in zip(keys, means)}
+
+
+def paired_bootstrap(
+    table: ScoreTable,
+    model_a: str,
+    model_b: str,
+    metric: str = OVERALL,
+    task: Optional[str] = None,
+    level: Optional[str] = None,
+    n_boot: int = 10000,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Paired bootstrap over items shared by both models (repeats averaged per item).
+    Items are resampled within each task and the statistic is the mean of per-task
+    mean differences, so tasks keep equal weight as in `rankings`.
+    """
+    if level is not None:
+        t = table.select(table.columns["level"] == table.codes_of("level", level))
+    else:
+        t = table
+    a = _item_means(t, model_a, metric)
+    b = _item_means(t, model_b, metric)
+    common = sorted(set(a) & set(b))
+    if task is not None:
+        tcode = t.codes_of("task", task)
+        common = [k for k in common if k[0] == tcode]
+    if not common:
+        return {"n_items": 0, "diff": None, "ci95": None, "p_value": None}
+
+    task_codes = np.asarray([k[0] for k in common])
+    diffs = np.asarray([a[k] - b[k] for k in common]) * 100.0
+    rng = np.random.default_rng(seed)
+
+    strata = [diffs[task_codes == tc] for tc in np.unique(task_codes)]
+    observed = float(np.mean([s.mean() for s in strata]))
+    boot = np.zeros(n_boot)
+    for s in strata:
+        idx = rng.integers(0, s.size, size=(n_boot, s.size))
+        boot += s[idx].mean(axis=1)
+    boot /= len(strata)
+
+    p = 2.0 * min(float(np.mean(boot <= 0.0)), float(np.mean(boot >= 0.0)))
+    lo, hi = np.percentile(boot, [2.5, 97.5])
+    return {
+        "n_items": len(common),
+        "diff": round(observed + 1e-12, 2),
+        "ci95": [round(float(lo), 2), round(float(hi), 2)],
+        "p_value": round(min(1.0, p), 4),
+    }
+
+
+# ------------------------------------------------------------------ CLI
+
+def _print_rankings(ranks: Dict[str, List[Tuple[str, float]]]) -> None:
+    for g, ranked in ranks.items():
+        print(f"== {g} ==")
+        for pos, (model, score) in enumerate(ranked, 1):
+            print(f"  {pos:>2}. {model:<40} {score:6.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build and query the cross-model leaderboard.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="Ingest/refresh the column store from a results root.")
+    b.add_argument("--results_root", required=True, help="Root laid out as model/level/task.")
+    b.add_argument("--store", required=True, help="Directory for the column store.")
+    b.add_argument("--model", action="append", default=None, help="Only refresh these models (repeatable).")
+
+    r = sub.add_parser("rank", help="Print rankings.")
+    r.add_argument("--store", required=True)
+    r.add_argument("--by", choices=["task", "level", "all"], default="task")
+    r.add_argument("--metric", default=OVERALL, help="Metric column, e.g. overall or Instruction_Adherence.")
+    r.add_argument("--out", default=None, help="Optional JSON output path.")
+
+    c = sub.add_parser("compare", help="Paired bootstrap significance between two models.")
+    c.add_argument("--store", required=True)
+    c.add_argument("--model_a", required=True)
+    c.add_argument("--model_b", required=True)
+    c.add_argument("--metric", default=OVERALL)
+    c.add_argument("--task", default=None)
+    c.add_argument("--level", default=None)
+    c.add_argument("--n_boot", type=int, default=10000)
+    c.add_argument("--seed", type=int, default=0)
+
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        status = build_store(args.results_root, args.store, models=args.model)
+        for model, st in sorted(status.items()):
+            print(f"{model}: {st}")
+        return
+
+    table = load_store(args.store)
+    if args.cmd == "rank":
+        ranks = rankings(table, by=args.by, metric=args.metric)
+        _print_rankings(ranks)
+        if args.out:
+            write_json(args.out, {g: [{"model": m, "score": s} for m, s in v] for g, v in ranks.items()})
+    elif args.cmd == "compare":
+        res = paired_bootstrap(
+            table, args.model_a, args.model_b, metric=args.metric,
+            task=args.task, level=args.level, n_boot=args.n_boot, seed=args.seed,
+        )
+        print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
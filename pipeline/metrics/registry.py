@@ -1,6 +1,7 @@
 from typing import Any, Dict, List, Optional, Tuple
 
 from ..parsing import loads_json_object
+from ..prompts import load_template
 from .spec import MetricSpec
 
 IA_KEYS = [
@@ -63,6 +64,19 @@ PAPER_FOLDING_KEYS = [
     "Visual_Cleanliness"
 ]
 
+# metrics whose payload holds a {"reason", "score"} object per sub-metric key
+# (the summaries report those as "Metric/key")
+SUBMETRIC_KEYS = {
+    "Instruction_Adherence": IA_KEYS,
+    "BII_CIC_CP": BII_CIC_CP_KEYS,
+    "Visual_Coherence": VC_KEYS,
+    "Light_Direction_Consistency": LDC_KEYS,
+    "Wind_Contextual_Preservation": WCP_KEYS,
+    "Orientation_Alignment": OA_KEYS,
+    "Reorientation_Contextual_Preservation": RCP_KEYS,
+    "Billiards": BILLIARDS_KEYS,
+}
+
 def parse_billiards(text: str) -> Tuple[Optional[Dict[str, Any]], Optional[float], Optional[str]]:
     try:
         obj = loads_json_object(text)
@@ -405,31 +419,64 @@ def parse_single_metric_wrapped(metric_name: str, text: str) -> Tuple[Optional[D
     payload = {"reason": str(reason), "score": score_i}
     return payload, float(score_i), None
 
-def build_metric_specs(metric_prompts: Dict[str, str]) -> List[MetricSpec]:
+# Version of each metric's parser, stamped into judged payloads. Bump a metric's
+# entry when its parse function changes what it accepts or how it scores, so
+# resumed runs re-judge the scores the old parser produced.
+PARSER_VERSIONS = {
+    "Instruction_Adherence": "1",
+    "Pose_Consistency": "1",
+    "BII_CIC_CP": "1",
+    "Visual_Coherence": "1",
+    "Light_Direction_Consistency": "1",
+    "Wind_Contextual_Preservation": "1",
+    "Orientation_Alignment": "1",
+    "Reorientation_Contextual_Preservation": "1",
+    "Billiards": "1",
+}
+# parse_single_metric_wrapped, used by every other metric
+WRAPPED_PARSER_VERSION = "1"
+
+def build_metric_specs(
+    metric_prompts: Dict[str, str],
+    task_name: str = "",
+    judge_models: Tuple[str, ...] = (),
+    check_provenance: bool = True,
+) -> List[MetricSpec]:
+    """
+    Build one MetricSpec per metric. Each prompt file is read, adjusted for the
+    task and compiled once here; unknown placeholders raise ValueError.
+    judge_models / check_provenance control which stamped scores count as done
+    (see MetricSpec.stale_fields).
+    """
     specs: List[MetricSpec] = []
     for name, prompt_path in metric_prompts.items():
         if name == "Instruction_Adherence":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_instruction_adherence))
+            parse_fn = parse_instruction_adherence
         elif name == "Pose_Consistency":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_pose_consistency))
+            parse_fn = parse_pose_consistency
         elif name == "BII_CIC_CP":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_BII_CIC_CP))
+            parse_fn = parse_BII_CIC_CP
         elif name == "Visual_Coherence":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_visual_coherence))
+            parse_fn = parse_visual_coherence
         elif name == "Light_Direction_Consistency":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_light_direction_consistency))
+            parse_fn = parse_light_direction_consistency
         elif name == "Wind_Contextual_Preservation":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_wind_contextual_preservation))
+            parse_fn = parse_wind_contextual_preservation
         elif name == "Orientation_Alignment":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_orientation_alignment))
+            parse_fn = parse_orientation_alignment
         elif name == "Reorientation_Contextual_Preservation":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_reorientation_contextual_preservation))
+            parse_fn = parse_reorientation_contextual_preservation
         elif name == "Billiards":
-            specs.append(MetricSpec(name=name, prompt_txt_path=prompt_path, parse_fn=parse_billiards))
+            parse_fn = parse_billiards
         else:
-            specs.append(MetricSpec(
-                name=name,
-                prompt_txt_path=prompt_path,
-                parse_fn=lambda text, _n=name: parse_single_metric_wrapped(_n, text),
-            ))
+            parse_fn = lambda text, _n=name: parse_single_metric_wrapped(_n, text)
+        specs.append(MetricSpec(
+            name=name,
+            prompt_txt_path=prompt_path,
+            parse_fn=parse_fn,
+            template=load_template(prompt_path, task_name=task_name, metric_name=name),
+            parser_version=PARSER_VERSIONS.get(name, WRAPPED_PARSER_VERSION),
+            judge_models=tuple(judge_models),
+            check_provenance=check_provenance,
+        ))
     return specs
@@ -1,16 +1,59 @@
+import hashlib
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Optional, Tuple
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..prompts import PromptTemplate
 
 ParseFn = Callable[[str], Tuple[Optional[Dict[str, Any]], Optional[float], Optional[str]]]
 
+# payload key of the stamp recording what produced a judged score
+PROVENANCE_KEY = "_provenance"
+
 @dataclass
 class MetricSpec:
     name: str
     prompt_txt_path: str
     parse_fn: ParseFn
+    template: Optional[PromptTemplate] = None
+    parser_version: str = "1"
+    # models that may answer this run's judge calls (empty: the model is not checked)
+    judge_models: Tuple[str, ...] = ()
+    # False keeps scores whose stamp does not match instead of re-judging them
+    check_provenance: bool = True
+
+    @cached_property
+    def prompt_hash(self) -> Optional[str]:
+        """Hash of the prompt as sent (after per-task edits), or None without a template."""
+        if self.template is None:
+            return None
+        return "sha256:" + hashlib.sha256(self.template.text.encode("utf-8")).hexdigest()[:16]
+
+    def stamp(self, model: Optional[str]) -> Dict[str, Any]:
+        return {"prompt": self.prompt_hash, "model": model, "parser": self.parser_version}
+
+    def stale_fields(self, payload: Any) -> List[str]:
+        """
+        Which of "prompt" / "model" / "parser" differ between a scored payload's
+        stamp and this run. Unstamped payloads (older runs, local decisions) are
+        never stale.
+        """
+        if not self.check_provenance or not isinstance(payload, dict) or "score" not in payload:
+            return []
+        stamp = payload.get(PROVENANCE_KEY)
+        if not isinstance(stamp, dict):
+            return []
+        out = []
+        if self.prompt_hash is not None and stamp.get("prompt") != self.prompt_hash:
+            out.append("prompt")
+        if self.judge_models and stamp.get("model") not in self.judge_models:
+            out.append("model")
+        if stamp.get("parser") != self.parser_version:
+            out.append("parser")
+        return out
 
     def is_already_done(self, item: Dict[str, Any]) -> bool:
         if self.name not in item:
             return False
         v = item.get(self.name)
-        return isinstance(v, dict) and ("score" in v)
+        return isinstance(v, dict) and ("score" in v) and not self.stale_fields(v)
@@ -0,0 +1,228 @@
+"""Local stand-in for the judge's /chat/completions endpoint, for testing runs end to end.
+
+    python -m pipeline.mock_server --port 8765 [--latency_ms 200]
+    export OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock
+
+Every response is a JSON verdict that the registry parsers accept for any
+metric: one {"reason", "score", "needs_modification"} entry per known key (the
+*_KEYS lists plus any capitalised key quoted in the prompt), and MATCH/MISMATCH
+values under Pose_Consistency. Scores are derived from a hash of the request
+body, so the same request gets the same verdict from any process or host, which
+is what makes sharded / multi-worker runs comparable to a single-process run.
+`--flip_rate F` flips each score with probability F per request instead, to
+imitate an unstable judge when testing repeats. `--error_rate F` answers a
+fraction F of requests with `--error_status` (429 with Retry-After, or a 5xx),
+to exercise endpoint failover; run several servers on different ports to
+stand in for a pool of endpoints. `--tail_rate F --tail_ms T` delays a fraction
+F of requests by T ms more, for a latency tail to hedge against. Requests with
+"stream": true are answered as server-sent events of `--chunk_chars` characters
+every `--chunk_ms` ms; `--trailing_chars N` adds N characters of commentary
+after the JSON verdict, as chatty judges do. The verdict does not depend on the
+stream settings of the request.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import registry
+
+_KEY_RE = re.compile(r'"([A-Z][A-Za-z0-9_\-]*(?: [A-Z][A-Za-z0-9_\-]*)*)"\s*:')
+_KNOWN_KEYS: List[str] = sorted({
+    k for name, v in vars(registry).items()
+    if name.endswith("_KEYS") and isinstance(v, list) for k in v
+})
+
+
+def _request_text(body: Dict[str, Any]) -> str:
+    parts: List[str] = []
+    for msg in body.get("messages", []):
+        content = msg.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(c.get("text", "") for c in content if isinstance(c, dict))
+    return "\n".join(parts)
+
+
+def verdict_for(raw_body: bytes, p_one: float = 0.75, flip_rate: float = 0.0) -> Dict[str, Any]:
+    body = json.loads(raw_body)
+    text = _request_text(body)
+    if "stream" in body or "stream_options" in body:
+        # hash what a non-streamed request would have sent
+        body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        raw_body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    seed = hashlib.sha256(raw_body).digest()
+
+    def _bit(i: int) -> int:
+        b = hashlib.sha256(seed + i.to_bytes(4, "little")).digest()
+        bit = int(int.from_bytes(b[:4], "little") / 2 ** 32 < p_one)
+        return bit ^ (flip_rate > 0 and random.random() < flip_rate)
+
+    keys = list(dict.fromkeys(_KNOWN_KEYS + _KEY_RE.findall(text)))
+    out: Dict[str, Any] = {}
+    for i, k in enumerate(keys):
+        s = _bit(i)
+        out[k] = {"reason": "mock verdict", "score": s, "needs_modification": not s}
+    if "Pose_Consistency" in text:
+        out["Pose_Consistency"] = {
+            k: ("MATCH" if _bit(1000 + i) else "MISMATCH") for i, k in enumerate(registry.POSE_KEYS)
+        }
+    return out
+
+
+def _completion(model: str, content: str, prompt_tokens: int) -> bytes:
+    return json.dumps({
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 200,
+            "total_tokens": prompt_tokens + 200,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "VibeMock/1.0"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n)
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        if self.server.tail_rate and random.random() < self.server.tail_rate:
+            time.sleep(self.server.tail_s)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            with self.server.lock:
+                self.server.errors += 1
+            self.send_response(self.server.error_status)
+            if self.server.error_status == 429:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            verdict = verdict_for(raw, flip_rate=self.server.flip_rate)
+            model = json.loads(raw).get("model", "mock")
+        except (ValueError, AttributeError) as e:
+            self.send_error(400, str(e))
+            return
+        with self.server.lock:
+            self.server.requests += 1
+        content = "Mock assessment.\n```json\n" + json.dumps(verdict, ensure_ascii=False) + "\n```"
+        if self.server.trailing_chars:
+            content += "\n" + ("Further notes on the edit. " * (self.server.trailing_chars // 27 + 1))[:self.server.trailing_chars]
+        if json.loads(raw).get("stream"):
+            self._stream(model, content, prompt_tokens=len(raw) // 4)
+            return
+        out = _completion(model, content, prompt_tokens=len(raw) // 4)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def _stream(self, model: str, content: str, prompt_tokens: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def _event(delta: Dict[str, Any], finish: Optional[str] = None, usage: Optional[Dict] = None) -> None:
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            if usage:
+                chunk["usage"] = usage
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            _event({"role": "assistant", "content": ""})
+            step = max(1, self.server.chunk_chars)
+            for k in range(0, len(content), step):
+                if self.server.chunk_s:
+                    time.sleep(self.server.chunk_s)
+                _event({"content": content[k:k + step]})
+            _event({}, finish="stop")
+            _event({}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": 200,
+                              "total_tokens": prompt_tokens + 200, "prompt_tokens_details": {"cached_tokens": 0}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client closed the stream early
+            pass
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, latency_s: float = 0.0,
+                      flip_rate: float = 0.0, error_rate: float = 0.0,
+                      error_status: int = 429, tail_rate: float = 0.0,
+                      tail_s: float = 0.0, trailing_chars: int = 0, chunk_chars: int = 16,
+                      chunk_s: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve in a daemon thread; returns (server, base_url for OPENAI_BASE_URL)."""
+    srv = ThreadingHTTPServer((host, port), _Handler)
+    srv.latency_s = latency_s
+    srv.flip_rate = flip_rate
+    srv.error_rate = error_rate
+    srv.error_status = error_status
+    srv.tail_rate = tail_rate
+    srv.tail_s = tail_s
+    srv.trailing_chars = trailing_chars
+    srv.chunk_chars = chunk_chars
+    srv.chunk_s = chunk_s
+    srv.requests = 0
+    srv.errors = 0
+    srv.lock = threading.Lock()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://{host}:{srv.server_port}/v1"
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Deterministic mock judge endpoint.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency_ms", type=float, default=0.0, help="Artificial delay per request.")
+    ap.add_argument("--flip_rate", type=float, default=0.0,
+                    help="Flip each score with this probability per request (non-deterministic judge).")
+    ap.add_argument("--error_rate", type=float, default=0.0,
+                    help="Answer this fraction of requests with --error_status instead of a verdict.")
+    ap.add_argument("--error_status", type=int, default=429, help="HTTP status for --error_rate (429 or 5xx).")
+    ap.add_argument("--tail_rate", type=float, default=0.0, help="Fraction of requests delayed by --tail_ms more.")
+    ap.add_argument("--tail_ms", type=float, default=0.0)
+    ap.add_argument("--trailing_chars", type=int, default=0, help="Commentary appended after the JSON verdict.")
+    ap.add_argument("--chunk_chars", type=int, default=16, help="Characters per streamed chunk.")
+    ap.add_argument("--chunk_ms", type=float, default=0.0, help="Delay before each streamed chunk.")
+    args = ap.parse_args(argv)
+
+    srv, url = start_mock_server(args.host, args.port, args.latency_ms / 1000.0, args.flip_rate,
+                                 args.error_rate, args.error_status, args.tail_rate, args.tail_ms / 1000.0,
+                                 args.trailing_chars, args.chunk_chars, args.chunk_ms / 1000.0)
+    print(f"[MOCK] serving {url} (export OPENAI_BASE_URL={url} OPENAI_API_KEY=mock)", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Build packed image stores (see pipeline.image_pack) from the existing file layout.
+
+    # dataset files: source, visual-instruction layer and target of every sample, one pack per task
+    python -m pipeline.pack_images --out_dir ./packs [--task Addition ...]
+
+    # generated images of one model's run (default --out_dir: next to the result json)
+    python -m pipeline.pack_images --task Addition --result_json <run.json> --gen_prefix <dir>
+
+    # compare packs with the files they were built from
+    python -m pipeline.pack_images --verify ./packs
+
+Point readers at the packs with `export VIBE_IMAGE_PACKS=./packs:<results dir>`
+(or `--image_packs` on run_eval and gpt.py). Packs are rewritten as a whole;
+rebuild after the packed files change.
+"""
+
+import argparse
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .assets import file_sha256
+from .config import TASK_CONFIG
+from .evaluator import resolve_input_and_target_paths, resolve_source_and_layer_paths
+from .image_pack import (
+    FILE_GENERATED,
+    FILE_LAYER,
+    FILE_SOURCE,
+    FILE_TARGET,
+    INDEX_SUFFIX,
+    PACK_FORMAT_VERSION,
+    PACK_SUFFIX,
+    ImagePack,
+    index_paths,
+)
+from .io_utils import read_json, write_json
+from .lazy import lazy_module
+
+# files read ahead of the pack writer
+READ_AHEAD = 64
+# PNG ancillary chunks that change how the pixels are displayed; the pipeline's re-encode drops them
+_DISPLAY_CHUNKS = ("icc_profile", "gamma", "srgb", "chromaticity", "transparency")
+
+# (sample id, file role, absolute path)
+_File = Tuple[str, str, str]
+
+
+def describe_image(data: bytes) -> Dict[str, Any]:
+    """size / mode / format / plain of an encoded image, from its header."""
+    with lazy_module("PIL.Image").open(io.BytesIO(data)) as im:
+        has_alpha = im.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in im.info
+        plain = (
+            im.format == "PNG"
+            and im.mode in ("RGB", "RGBA")
+            and data[24] == 8   # IHDR bit depth
+            and not any(k in im.info for k in _DISPLAY_CHUNKS)
+        )
+        return {
+            "size": list(im.size),
+            "mode": "RGBA" if has_alpha else im.mode,
+            "format": im.format,
+            "plain": plain,
+        }
+
+
+def dataset_files(task_name: str) -> List[_File]:
+    files: List[_File] = []
+    for ann in read_json(TASK_CONFIG[task_name]["json_path"]):
+        sid = str(ann.get("id"))
+        source_abs, layer_abs = resolve_source_and_layer_paths(task_name, ann)
+        files.append((sid, FILE_SOURCE, source_abs))
+        if layer_abs:
+            files.append((sid, FILE_LAYER, layer_abs))
+        if ann["file_paths"].get("target"):
+            files.append((sid, FILE_TARGET, resolve_input_and_target_paths(task_name, ann)[1]))
+    return files
+
+
+def generated_files(result_json: str, gen_prefix: str) -> List[_File]:
+    from .run_eval import resolve_gen_abs
+
+    files: List[_File] = []
+    for it in read_json(result_json):
+        if it.get("status") == "success" and it.get("saved_image_path"):
+            files.append((str(it.get("id")), FILE_GENERATED, resolve_gen_abs(gen_prefix, str(it["saved_image_path"]))))
+    return files
+
+
+def write_pack(out_dir: str, name: str, task_name: str, kind: str, files: List[_File], workers: int) -> Dict[str, int]:
+    """Write {name}.vpack and its index; each distinct file is stored once."""
+    pack_path = os.path.join(out_dir, name + PACK_SUFFIX)
+    index_path = os.path.join(out_dir, name + INDEX_SUFFIX)
+    os.makedirs(out_dir, exist_ok=True)
+
+    def _read(f: _File) -> Tuple[_File, Optional[bytes]]:
+        path = os.path.abspath(f[2])
+        try:
+            with open(path, "rb") as fh:
+                return (f[0], f[1], path), fh.read()
+        except OSError:
+            return (f[0], f[1], path), None
+
+    entries: List[Dict[str, Any]] = []
+    stored: Dict[str, Dict[str, Any]] = {}
+    counts = {"packed": 0, "missing": 0, "unreadable": 0}
+    offset = 0
+    with open(pack_path + ".tmp", "wb") as out, ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for start in range(0, len(files), READ_AHEAD):
+            for (sid, role, path), data in ex.map(_read, files[start:start + READ_AHEAD]):
+                if path in stored:
+                    entries.append({**stored[path], "id": sid, "role": role})
+                    continue
+                if data is None:
+                    counts["missing"] += 1
+                    continue
+                try:
+                    info = describe_image(data)
+                except Exception:
+                    counts["unreadable"] += 1
+                    continue
+                entry = {"id": sid, "role": role, "path": path, "offset": offset, "length": len(data),
+                         **info, "sha256": hashlib.sha256(data).hexdigest()}
+                out.write(data)
+                offset += len(data)
+                stored[path] = entry
+                entries.append(entry)
+                counts["packed"] += 1
+    os.replace(pack_path + ".tmp", pack_path)
+    write_json(index_path + ".tmp", {"format_version": PACK_FORMAT_VERSION, "task": task_name, "kind": kind,
+                                     "entries": entries})
+    os.replace(index_path + ".tmp", index_path)
+    counts["bytes"] = offset
+    return counts
+
+
+def verify_pack(index_path: str) -> Dict[str, int]:
+    """Check the packed bytes against the index and the index against the files on disk."""
+    pack = ImagePack(index_path)
+    counts = {"ok": 0, "corrupt": 0, "stale": 0, "no_original": 0}
+    for entry in pack.entries:
+        if hashlib.sha256(pack.view(entry)).hexdigest() != entry["sha256"]:
+            counts["corrupt"] += 1
+        elif not os.path.isfile(entry["path"]):
+            counts["no_original"] += 1
+        elif os.path.getsize(entry["path"]) != entry["length"] or file_sha256(entry["path"]) != entry["sha256"]:
+            counts["stale"] += 1
+        else:
+            counts["ok"] += 1
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pack image files into one memory-mappable file per task.")
+    ap.add_argument("--out_dir", default=None,
+                    help="Directory for the packs (default with --result_json: the result json's directory).")
+    ap.add_argument("--task", action="append", default=None, help="Task name (repeatable). Default: all configured tasks.")
+    ap.add_argument("--result_json", default=None, help="Pack the generated images of this run instead of the dataset.")
+    ap.add_argument("--gen_prefix", default=None, help="Prefix directory of the generated images (with --result_json).")
+    ap.add_argument("--workers", type=int, default=8, help="Threads reading files.")
+    ap.add_argument("--verify", default=None, metavar="PACKS",
+                    help="Verify pack indexes (files or directories, os.pathsep-separated) and exit.")
+    args = ap.parse_args()
+
+    if args.verify:
+        for index_path in index_paths(args.verify):
+            print(f"[VERIFY] {index_path}: {verify_pack(index_path)}")
+        return
+
+    if args.result_json:
+        if not args.gen_prefix or not args.task or len(args.task) != 1:
+            raise ValueError("--result_json needs --gen_prefix and exactly one --task")
+        task_name = args.task[0]
+        out_dir = args.out_dir or os.path.dirname(os.path.abspath(args.result_json))
+        name = f"{task_name}_generated"
+        counts = write_pack(out_dir, name, task_name, "generated",
+                            generated_files(args.result_json, args.gen_prefix), args.workers)
+        print(f"[PACK] {task_name} generated: {counts}")
+        print(f"[DONE] {os.path.join(out_dir, name + PACK_SUFFIX)}")
+        return
+
+    if not args.out_dir:
+        raise ValueError("--out_dir is required when packing the dataset")
+    for task_name in (args.task or list(TASK_CONFIG.keys())):
+        if task_name not in TASK_CONFIG:
+            raise ValueError(f"Unknown task: {task_name}")
+        if not os.path.exists(TASK_CONFIG[task_name]["json_path"]):
+            print(f"[WARN] annotation json not found for {task_name}, skipped")
+            continue
+        counts = write_pack(args.out_dir, task_name, task_name, "dataset", dataset_files(task_name), args.workers)
+        print(f"[PACK] {task_name}: {counts}")
+    print(f"[DONE] Image packs: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
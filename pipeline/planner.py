@@ -0,0 +1,232 @@
+"""Resume planning: one scan of a result json -> the (item, metric) work still to do.
+
+process_one_result_json only visits the pairs in the plan; everything else is
+already scored and is picked up by the summary scan afterwards.
+
+Pair kinds:
+    call         the metric is missing (or rerun is set): one judge call
+    gate         Visual_Coherence resolved locally because Instruction_Adherence is 0
+    conditional  Visual_Coherence after an Instruction_Adherence call in the same
+                 pass: gated if that call returns 0, otherwise a call (or already done)
+    prune        (prune=True) a kept metric of the item is already 0, so its overall
+                 score is 0 whatever this metric says: recorded as skipped, no call
+
+A scored pair whose provenance stamp (prompt hash, judge model, parser version;
+see MetricSpec.stale_fields) no longer matches the run is planned again; its
+PendingWork.stale lists what changed and ResumePlan.report lists those pairs
+before any call is made.
+
+With `schedule_metric_specs`, metrics are evaluated in decreasing order of
+P(score == 0) per estimated prompt token, so with pruning the metrics most
+likely to pin an item at 0 are paid for first.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .evaluator import image_roles_for_metric
+
+IA_METRIC = "Instruction_Adherence"
+VC_METRIC = "Visual_Coherence"
+VC_GATED_PAYLOAD = {
+    "reason": "Skipped because Instruction_Adherence.score == 0",
+    "score": 0,
+}
+
+KIND_CALL = "call"
+KIND_GATE = "gate"
+KIND_CONDITIONAL = "conditional"
+KIND_PRUNE = "prune"
+# resolved without a judge call
+LOCAL_KINDS = (KIND_GATE, KIND_PRUNE)
+
+# What happened to one planned pair; apply_outcome replays it onto an item.
+OUT_PAYLOAD = "payload"   # value: the metric payload stored under item[metric]
+OUT_GATE = "gate"         # Visual_Coherence gated to 0
+OUT_ERROR = "error"       # value: error string appended to item["_eval_errors"]
+OUT_SKIP = "skip"         # already done, nothing changed
+OUT_PRUNE = "prune"       # value: the metric whose 0 pins the overall score; stores pruned_payload
+
+# Rough per-call token counts for the estimate (high-detail ~1024px image, typical rationale).
+EST_IMAGE_TOKENS = 765
+EST_COMPLETION_TOKENS = 600
+
+
+@dataclass(frozen=True)
+class PendingWork:
+    idx: int
+    metric: str
+    kind: str = KIND_CALL
+    # for a scored pair planned again: which of its stamp's prompt / model / parser changed
+    stale: Tuple[str, ...] = ()
+
+
+@dataclass
+class ResumePlan:
+    n_items: int
+    pending: List[PendingWork] = field(default_factory=list)
+    n_done: int = 0
+
+    def by_item(self) -> "OrderedDict[int, List[PendingWork]]":
+        out: "OrderedDict[int, List[PendingWork]]" = OrderedDict()
+        for w in self.pending:
+            out.setdefault(w.idx, []).append(w)
+        return out
+
+    def count(self, kind: str) -> int:
+        return sum(1 for w in self.pending if w.kind == kind)
+
+    def stale_counts(self) -> Dict[str, Dict[str, int]]:
+        """metric -> changed stamp field(s) -> number of stale pairs planned again."""
+        out: Dict[str, Dict[str, int]] = {}
+        for w in self.pending:
+            if w.stale:
+                per = out.setdefault(w.metric, {})
+                key = "+".join(w.stale)
+                per[key] = per.get(key, 0) + 1
+        return out
+
+    def estimate(
+        self,
+        metric_specs: List[Any],
+        price_input_per_m: Optional[float] = None,
+        price_output_per_m: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Upper-bound call/token estimate (conditional pairs counted as calls)."""
+        prompt_per_metric = {spec.name: est_prompt_tokens(spec) for spec in metric_specs}
+
+        calls = [w for w in self.pending if w.kind not in LOCAL_KINDS]
+        prompt_tokens = sum(prompt_per_metric.get(w.metric, 0) for w in calls)
+        completion_tokens = EST_COMPLETION_TOKENS * len(calls)
+        cost = None
+        if price_input_per_m is not None and price_output_per_m is not None:
+            cost = round(prompt_tokens / 1e6 * price_input_per_m + completion_tokens / 1e6 * price_output_per_m, 2)
+        return {
+            "calls_max": len(calls),
+            "calls_certain": self.count(KIND_CALL),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": cost,
+        }
+
+    def report(self, label: str, metric_specs: List[Any], price_input_per_m=None, price_output_per_m=None) -> None:
+        est = self.estimate(metric_specs, price_input_per_m, price_output_per_m)
+        cost = f" est_cost=${est['cost_usd']}" if est["cost_usd"] is not None else ""
+        pruned = f" pruned={self.count(KIND_PRUNE)}" if self.count(KIND_PRUNE) else ""
+        print(
+            f"[PLAN] {label}: items={self.n_items} done_pairs={self.n_done} "
+            f"calls={est['calls_certain']} conditional={self.count(KIND_CONDITIONAL)} gated={self.count(KIND_GATE)}"
+            f"{pruned} est_prompt_tokens={est['prompt_tokens']} est_completion_tokens={est['completion_tokens']}{cost}"
+        )
+        stale = self.stale_counts()
+        if stale:
+            parts = [
+                f"{metric} {sum(per.values())} ({', '.join(f'{k}: {n}' for k, n in sorted(per.items()))})"
+                for metric, per in stale.items()
+            ]
+            print(f"[PROVENANCE] {label}: {sum(sum(per.values()) for per in stale.values())} scored pairs "
+                  f"no longer match the prompt / judge model / parser and are re-judged: {'; '.join(parts)}")
+
+
+def est_prompt_tokens(spec: Any) -> int:
+    text = spec.template.text if spec.template is not None else ""
+    return len(text) // 4 + EST_IMAGE_TOKENS * len(image_roles_for_metric(spec.name))
+
+
+def _metric_score(item: Any, metric_name: str) -> Optional[float]:
+    v = item.get(metric_name)
+    if not isinstance(v, dict) or "score" not in v:
+        return None
+    try:
+        return float(v["score"])
+    except Exception:
+        return None
+
+
+def pruned_payload(zero_metric: str) -> Dict[str, Any]:
+    # no "score": left out of the metric's mean, and evaluated on a later full-fidelity resume
+    return {"reason": f"Skipped because {zero_metric}.score == 0 (overall score is already 0)", "skipped": True}
+
+
+def apply_outcome(item: Any, metric_name: str, kind: str, value: Any = None) -> None:
+    if kind == OUT_PAYLOAD:
+        item[metric_name] = value
+    elif kind == OUT_GATE:
+        item[VC_METRIC] = dict(VC_GATED_PAYLOAD)
+    elif kind == OUT_ERROR:
+        item.setdefault("_eval_errors", [])
+        item["_eval_errors"].append(value)
+    elif kind == OUT_PRUNE:
+        item[metric_name] = pruned_payload(value)
+
+
+def plan_resume(data: List[Any], metric_specs: List[Any], rerun: bool, prune: bool = False) -> ResumePlan:
+    """
+    Pairs whose outcome differs from "already done, keep as is", in item order
+    and, within an item, in metric_specs order (the order they are executed in).
+    """
+    plan = ResumePlan(n_items=len(data))
+    for idx, item in enumerate(data):
+        if item.get("status") != "success":
+            continue
+        ia_called = False
+        pinned = False
+        todo: List[PendingWork] = []
+        for spec in metric_specs:
+            mname = spec.name
+            if mname == VC_METRIC:
+                if ia_called:
+                    stale = () if rerun else tuple(spec.stale_fields(item.get(mname)))
+                    todo.append(PendingWork(idx, mname, KIND_CONDITIONAL, stale))
+                    continue
+                if _metric_score(item, IA_METRIC) == 0:
+                    if item.get(mname) != VC_GATED_PAYLOAD:
+                        todo.append(PendingWork(idx, mname, KIND_GATE))
+                    else:
+                        plan.n_done += 1
+                        pinned = True
+                    continue
+            if rerun or not spec.is_already_done(item):
+                stale = () if rerun else tuple(spec.stale_fields(item.get(mname)))
+                todo.append(PendingWork(idx, mname, KIND_CALL, stale))
+                if mname == IA_METRIC:
+                    ia_called = True
+            else:
+                plan.n_done += 1
+                pinned = pinned or _metric_score(item, mname) == 0
+        if prune and pinned:
+            todo = [PendingWork(idx, w.metric, KIND_PRUNE, w.stale) if w.kind != KIND_GATE else w for w in todo]
+        plan.pending.extend(todo)
+    return plan
+
+
+def schedule_metric_specs(data: List[Any], metric_specs: List[Any]) -> List[Any]:
+    """
+    metric_specs reordered by decreasing P(score == 0) / estimated prompt tokens.
+    P is estimated from the scores already present in `data` (Laplace-smoothed,
+    0.5 without any); Visual_Coherence stays after Instruction_Adherence.
+    Deterministic for a given file, so every shard / worker gets the same order.
+    """
+    zeros = {spec.name: 0 for spec in metric_specs}
+    seen = {spec.name: 0 for spec in metric_specs}
+    for item in data:
+        if item.get("status") != "success":
+            continue
+        for spec in metric_specs:
+            s = _metric_score(item, spec.name)
+            if s is not None:
+                seen[spec.name] += 1
+                zeros[spec.name] += s == 0
+    rank = {
+        spec.name: (zeros[spec.name] + 1) / (seen[spec.name] + 2) / max(1, est_prompt_tokens(spec))
+        for spec in metric_specs
+    }
+    pos = {spec.name: i for i, spec in enumerate(metric_specs)}
+    ordered = sorted(metric_specs, key=lambda spec: (-rank[spec.name], pos[spec.name]))
+
+    names = [spec.name for spec in ordered]
+    if IA_METRIC in names and VC_METRIC in names and names.index(VC_METRIC) < names.index(IA_METRIC):
+        vc = ordered.pop(names.index(VC_METRIC))
+        ordered.insert([spec.name for spec in ordered].index(IA_METRIC) + 1, vc)
+    return ordered
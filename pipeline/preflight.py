@@ -0,0 +1,283 @@
+"""Preflight: check every file a run will read before the first judge call.
+
+    # dataset: every annotation entry of the tasks, its source, layer and target image
+    python -m pipeline.preflight --task Addition [--task Removal ...]
+
+    # one model's run files: the entries they reference, the generated images and the calls they imply
+    python -m pipeline.preflight --task Addition --result_json <run.json> --gen_prefix <dir> \
+        [--prompt Instruction_Adherence=prompt/Instruction_Adherence.txt ...] [--repeat 3] [--repeat_resume]
+
+`run_eval --preflight report|require` runs the same checks over its own task
+and result files first; `require` stops before any judge call when the check
+finds an error.
+
+Paths are resolved exactly as the judge pipeline resolves them
+(resolve_source_and_layer_paths / resolve_input_and_target_paths /
+gen_path_candidates) and every image is stat'ed and its header read in a
+thread pool; packed images ($VIBE_IMAGE_PACKS) are checked in their pack.
+
+Errors would fail the sample or the run: a missing annotation json (check
+BASE_DIR in pipeline/config.py), a sample id that is not in the annotation
+json, a missing or unreadable source, target or generated image, an
+unreadable layer, an unfilled prompt slot. Warnings are judged anyway: a
+missing layer (judged on the source alone) and a generated image found only
+through the `imgs/` fallback.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import TASK_CONFIG
+from .evaluator import (
+    INPUT_TARGET_TASKS,
+    gen_path_candidates,
+    resolve_input_and_target_paths,
+    resolve_source_and_layer_paths,
+)
+from .io_utils import image_exists, image_header, read_json
+from .planner import plan_resume, schedule_metric_specs
+from .prompts import check_slot_values
+
+# threads stat'ing and header-checking files
+PREFLIGHT_WORKERS = 32
+# example paths / ids kept per issue
+MAX_EXAMPLES = 5
+
+ERROR = "error"
+WARNING = "warning"
+
+# file checks: (severity when missing, severity when unreadable)
+_SEVERITY = {
+    "source": (ERROR, ERROR),
+    "target": (ERROR, ERROR),
+    "layer": (WARNING, ERROR),
+    "generated": (ERROR, ERROR),
+}
+
+
+@dataclass
+class PreflightReport:
+    # (severity, issue) -> number of occurrences; examples keeps the first few of each
+    issues: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    examples: Dict[Tuple[str, str], List[str]] = field(default_factory=dict)
+    files_checked: int = 0
+    items_checked: int = 0
+    calls_certain: int = 0
+    calls_max: int = 0
+    elapsed_s: float = 0.0
+
+    def add(self, severity: str, issue: str, example: str) -> None:
+        key = (severity, issue)
+        self.issues[key] = self.issues.get(key, 0) + 1
+        ex = self.examples.setdefault(key, [])
+        if len(ex) < MAX_EXAMPLES:
+            ex.append(example)
+
+    def count(self, severity: str) -> int:
+        return sum(n for (sev, _), n in self.issues.items() if sev == severity)
+
+    @property
+    def ok(self) -> bool:
+        return self.count(ERROR) == 0
+
+    def print(self, label: str, with_calls: bool = True) -> None:
+        calls = f" judge_calls={self.calls_certain} (up to {self.calls_max})" if with_calls else ""
+        print(
+            f"[PREFLIGHT] {label}: items={self.items_checked} files={self.files_checked}{calls} "
+            f"errors={self.count(ERROR)} warnings={self.count(WARNING)} in {self.elapsed_s:.1f}s"
+        )
+        for (severity, issue), n in sorted(self.issues.items()):
+            tag = "[ERROR]" if severity == ERROR else "[WARN]"
+            ex = self.examples[(severity, issue)]
+            more = " ..." if n > len(ex) else ""
+            print(f"  {tag} {issue}: {n} ({', '.join(ex)}{more})")
+
+
+def _check_image(path: str) -> Optional[str]:
+    """None when the image exists and its header reads, else "missing" / "unreadable"."""
+    if not image_exists(path):
+        return "missing"
+    try:
+        image_header(path)
+    except Exception:
+        return "unreadable"
+    return None
+
+
+def _resolve_generated(gen_prefix: str, saved_image_path: str) -> Tuple[str, bool, Optional[str]]:
+    """(path, found only through the imgs/ fallback, problem) as resolve_gen_abs would resolve it."""
+    p1, p2 = gen_path_candidates(gen_prefix, saved_image_path)
+    for path, fallback in ((p1, False), (p2, True)):
+        if image_exists(path):
+            return path, fallback, _check_image(path)
+    return p1, False, "missing"
+
+
+def _dataset_files(task_name: str, ann_item: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(role, path) of the dataset images the judge reads for one annotation entry."""
+    if task_name in INPUT_TARGET_TASKS:
+        input_abs, target_abs = resolve_input_and_target_paths(task_name, ann_item)
+        return [("source", input_abs), ("target", target_abs)]
+    source_abs, layer_abs = resolve_source_and_layer_paths(task_name, ann_item)
+    return [("source", source_abs)] + ([("layer", layer_abs)] if layer_abs else [])
+
+
+def _load_annotations(task_name: str, report: PreflightReport) -> Optional[Dict[str, Dict[str, Any]]]:
+    if task_name not in TASK_CONFIG:
+        report.add(ERROR, "unknown task (not in TASK_CONFIG)", task_name)
+        return None
+    json_path = TASK_CONFIG[task_name]["json_path"]
+    if not os.path.exists(json_path):
+        report.add(ERROR, "annotation json not found (check BASE_DIR in pipeline/config.py)", json_path)
+        return None
+    index: Dict[str, Dict[str, Any]] = {}
+    for ann in read_json(json_path):
+        sid = str(ann.get("id"))
+        if sid in index:
+            report.add(ERROR, f"{task_name}: duplicate annotation id", sid)
+        index[sid] = ann
+    return index
+
+
+def _run_file(
+    result_json: str,
+    metric_specs: List[Any],
+    repeat: int,
+    resume: bool,
+    prune: bool,
+    report: PreflightReport,
+) -> Optional[List[Dict[str, Any]]]:
+    """Load one result json, check its prompt slots and add the calls of its `repeat` runs to the projection."""
+    data = read_json(result_json)
+    if not isinstance(data, list):
+        report.add(ERROR, "result json is not a list", result_json)
+        return None
+    if metric_specs:
+        for problem in check_slot_values({spec.name: spec.template for spec in metric_specs}, data):
+            report.add(ERROR, "unfilled prompt slot", f"{os.path.basename(result_json)}: {problem}")
+    root, ext = os.path.splitext(result_json)
+    for i in range(1, max(1, repeat) + 1):
+        # the file run i starts from, as in run_eval
+        run_json = f"{root}_{i}{ext}"
+        plan_data = read_json(run_json) if resume and os.path.exists(run_json) else data
+        specs = schedule_metric_specs(plan_data, metric_specs) if prune else metric_specs
+        est = plan_resume(plan_data, specs, rerun=not resume, prune=prune).estimate(specs)
+        report.calls_certain += est["calls_certain"]
+        report.calls_max += est["calls_max"]
+    return data
+
+
+def run_preflight(
+    task_names: List[str],
+    result_files: Optional[Dict[str, List[str]]] = None,
+    gen_prefix: Optional[str] = None,
+    metric_specs: Optional[List[Any]] = None,
+    repeat: int = 1,
+    resume: bool = False,
+    prune: bool = False,
+    workers: int = PREFLIGHT_WORKERS,
+) -> PreflightReport:
+    """
+    Check the tasks' dataset images and the result files ({task: [result json, ...]})
+    with their generated images under gen_prefix. With result files, only the
+    annotation entries they reference (status "success") are checked; without,
+    every entry. Projected judge calls need metric_specs.
+    """
+    t0 = time.perf_counter()
+    report = PreflightReport()
+    result_files = result_files or {}
+    files: Dict[str, str] = {}              # path -> role, each file checked once
+    generated: List[Tuple[str, str]] = []   # (label, saved_image_path)
+
+    for task_name in task_names:
+        annotations = _load_annotations(task_name, report)
+        if annotations is None:
+            continue
+        wanted: Optional[List[str]] = None
+        for result_json in result_files.get(task_name, []):
+            data = _run_file(result_json, metric_specs or [], repeat, resume, prune, report)
+            if data is None:
+                continue
+            wanted = wanted if wanted is not None else []
+            for it in data:
+                if not isinstance(it, dict) or it.get("status") != "success":
+                    continue
+                sid = str(it.get("id"))
+                label = f"{os.path.basename(result_json)}:{sid}"
+                report.items_checked += 1
+                if sid not in annotations:
+                    report.add(ERROR, f"{task_name}: sample id not in the annotation json", label)
+                    continue
+                wanted.append(sid)
+                if not it.get("saved_image_path"):
+                    report.add(ERROR, "success item without saved_image_path", label)
+                else:
+                    generated.append((label, str(it["saved_image_path"])))
+        if wanted is None:
+            wanted = list(annotations)
+            report.items_checked += len(wanted)
+        for sid in dict.fromkeys(wanted):
+            try:
+                for role, path in _dataset_files(task_name, annotations[sid]):
+                    files.setdefault(path, role)
+            except KeyError as e:
+                report.add(ERROR, f"{task_name}: annotation entry without file_paths {e}", sid)
+
+    if generated and not gen_prefix:
+        raise ValueError("Checking generated images needs gen_prefix")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for (path, role), problem in zip(files.items(), ex.map(_check_image, files)):
+            if problem is not None:
+                report.add(_SEVERITY[role][problem == "unreadable"], f"{problem} {role} image", path)
+        resolved = ex.map(lambda g: _resolve_generated(gen_prefix, g[1]), generated)
+        for (label, _), (path, fallback, problem) in zip(generated, resolved):
+            if problem is not None:
+                report.add(ERROR, f"{problem} generated image", f"{label} -> {path}")
+            elif fallback:
+                report.add(WARNING, "generated image found only under imgs/ (saved_image_path lacks the prefix)", label)
+    report.files_checked = len(files) + len(generated)
+    report.elapsed_s = time.perf_counter() - t0
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Check dataset and generated images before a judge run.")
+    ap.add_argument("--task", action="append", default=None, help="Task name (repeatable). Default: all configured tasks.")
+    ap.add_argument("--result_json", action="append", default=[],
+                    help="Result json of the (single) --task to check, with its generated images (repeatable).")
+    ap.add_argument("--gen_prefix", default=None, help="Prefix directory of the generated images (with --result_json).")
+    ap.add_argument("--prompt", action="append", default=[],
+                    help="MetricName=/path/to/prompt.txt (repeatable), as for run_eval; enables the call projection.")
+    ap.add_argument("--repeat", type=int, default=1, help="As run_eval --repeat, for the call projection.")
+    ap.add_argument("--repeat_resume", action="store_true", help="As run_eval --repeat_resume, for the call projection.")
+    ap.add_argument("--workers", type=int, default=PREFLIGHT_WORKERS, help="Threads checking files.")
+    args = ap.parse_args()
+
+    task_names = args.task or list(TASK_CONFIG.keys())
+    result_files: Dict[str, List[str]] = {}
+    metric_specs: List[Any] = []
+    if args.result_json:
+        if not args.gen_prefix or not args.task or len(args.task) != 1:
+            raise ValueError("--result_json needs --gen_prefix and exactly one --task")
+        result_files[task_names[0]] = args.result_json
+    if args.prompt:
+        from .metrics.registry import build_metric_specs
+        from .run_eval import _parse_prompts
+
+        metric_specs = build_metric_specs(_parse_prompts(args.prompt), task_name=task_names[0])
+
+    report = run_preflight(task_names, result_files, args.gen_prefix, metric_specs, args.repeat,
+                           args.repeat_resume, workers=args.workers)
+    report.print(", ".join(task_names) if len(task_names) <= 3 else f"{len(task_names)} tasks",
+                 with_calls=bool(metric_specs))
+    if not report.ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
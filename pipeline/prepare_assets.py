@@ -0,0 +1,172 @@
+"""Materialise model-independent derived images once per dataset.
+
+    python -m pipeline.prepare_assets --cache_dir ./asset_cache [--task Addition ...] [--consumer judge|generate|all]
+
+Judge side (pipeline.evaluator): the RGBA source and the instruction image
+(source + layer composite, the size-aligned Pose_Control instruction, or the
+Billiards target), PNG-encoded exactly as they are sent to the judge.
+Generation side (gpt.py): the merged/resized RGB inputs of images.edit.
+
+Point consumers at the cache with `export VIBE_ASSET_CACHE=./asset_cache`
+(or `--asset_cache` on run_eval). Re-running only rebuilds entries whose
+input files changed.
+"""
+
+import argparse
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from .assets import (
+    ASSET_FORMAT_VERSION,
+    JUDGE_INSTRUCTION,
+    JUDGE_SOURCE,
+    MANIFEST_NAME,
+    AssetCache,
+    safe_name,
+    stat_inputs,
+)
+from .config import TASK_CONFIG
+from .io_utils import read_json, write_json
+from .evaluator import (
+    ROLE_INSTRUCTION,
+    ROLE_SOURCE,
+    judge_asset_inputs,
+    prepare_judge_images,
+)
+
+# (sample_id, asset_role, input_paths, producer) -> producer() returns png bytes
+_Job = Tuple[str, str, List[str], Any]
+
+
+def _judge_jobs(task_name: str) -> List[_Job]:
+    jobs: List[_Job] = []
+    for ann in read_json(TASK_CONFIG[task_name]["json_path"]):
+        sid = str(ann.get("id"))
+        inputs = judge_asset_inputs(task_name, ann)
+
+        def _make(role: str, _sid: str = sid):
+            def _produce() -> Optional[bytes]:
+                payloads, err = prepare_judge_images(task_name, _sid, "", roles=(role,), use_asset_cache=False)
+                if err is not None:
+                    print(f"[WARN] {task_name}/{_sid}: {err}")
+                    return None
+                return payloads[role]
+            return _produce
+
+        jobs.append((sid, JUDGE_SOURCE, inputs[ROLE_SOURCE], _make(ROLE_SOURCE)))
+        jobs.append((sid, JUDGE_INSTRUCTION, inputs[ROLE_INSTRUCTION], _make(ROLE_INSTRUCTION)))
+    return jobs
+
+
+def _generation_jobs(task_name: str) -> List[_Job]:
+    import gpt  # generation script at the repository root
+
+    cfg = gpt.TASK_CONFIG[task_name]
+    base_task_dir = os.path.dirname(cfg["json_path"])
+    jobs: List[_Job] = []
+    for ann in read_json(cfg["json_path"]):
+        sid = str(ann.get("id"))
+        source = os.path.join(cfg["image_root"], ann["file_paths"]["source"])
+        instr_rel = ann["file_paths"].get("visual_instruction", "")
+        instr = os.path.join(base_task_dir, instr_rel) if instr_rel and instr_rel.strip() != "" else None
+        built: Dict[str, Any] = {}
+
+        def _make(role: str, _src: str = source, _instr: Optional[str] = instr, _built: Dict[str, Any] = built):
+            def _produce() -> Optional[bytes]:
+                if "out" not in _built:
+                    _built["out"] = {r: d for r, _, d in (gpt.build_generation_images(task_name, _src, _instr) or [])}
+                return _built["out"].get(role)
+            return _produce
+
+        for role, inputs in gpt.generation_asset_inputs(task_name, source, instr).items():
+            jobs.append((sid, role, inputs, _make(role)))
+    return jobs
+
+
+def build_task_assets(cache: AssetCache, task_name: str, jobs: List[_Job], force: bool, workers: int) -> Dict[str, int]:
+    task_dir = cache.task_dir(task_name)
+    manifest_path = os.path.join(task_dir, MANIFEST_NAME)
+    manifest: Dict[str, Any] = {"format_version": ASSET_FORMAT_VERSION, "task": task_name, "entries": {}}
+    if os.path.exists(manifest_path):
+        old = read_json(manifest_path)
+        if old.get("format_version") == ASSET_FORMAT_VERSION:
+            manifest = old
+    entries = manifest["entries"]
+
+    def _run(job: _Job) -> Tuple[str, str, Optional[Dict[str, Any]], str]:
+        sid, role, inputs, produce = job
+        current = stat_inputs(inputs)
+        if current is None:
+            return sid, role, None, "missing_input"
+        old = entries.get(sid, {}).get(role)
+        if not force and old and os.path.exists(os.path.join(task_dir, old["file"])):
+            rec = old.get("inputs", {})
+            if set(rec) == set(current) and all(
+                rec[p].get("size") == c["size"] and rec[p].get("mtime_ns") == c["mtime_ns"] for p, c in current.items()
+            ):
+                return sid, role, old, "unchanged"
+        data = produce()
+        if data is None:
+            return sid, role, None, "failed"
+        rel = os.path.join(role, f"{safe_name(sid)}.png")
+        out_path = os.path.join(task_dir, rel)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp = out_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, out_path)
+        entry = {"file": rel, "sha256": hashlib.sha256(data).hexdigest(), "inputs": stat_inputs(inputs, with_hash=True)}
+        return sid, role, entry, "built"
+
+    counts: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for sid, role, entry, status in tqdm(ex.map(_run, jobs), total=len(jobs), desc=task_name):
+            counts[status] = counts.get(status, 0) + 1
+            if entry is not None:
+                entries.setdefault(sid, {})[role] = entry
+            elif sid in entries:
+                entries[sid].pop(role, None)
+
+    write_json(manifest_path, manifest)
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Precompute derived images shared by every model/run.")
+    ap.add_argument("--cache_dir", required=True, help="Asset cache root (versioned sub-directory is created).")
+    ap.add_argument("--task", action="append", default=None, help="Task name (repeatable). Default: all configured tasks.")
+    ap.add_argument("--consumer", choices=["judge", "generate", "all"], default="all")
+    ap.add_argument("--workers", type=int, default=4, help="Threads used for decode/encode.")
+    ap.add_argument("--force", action="store_true", help="Rebuild entries even if their inputs are unchanged.")
+    args = ap.parse_args()
+
+    cache = AssetCache(args.cache_dir)
+    consumers = ["judge", "generate"] if args.consumer == "all" else [args.consumer]
+
+    for consumer in consumers:
+        if consumer == "judge":
+            configured = TASK_CONFIG
+            make_jobs = _judge_jobs
+        else:
+            import gpt
+            configured = gpt.TASK_CONFIG
+            make_jobs = _generation_jobs
+
+        for task_name in (args.task or list(configured.keys())):
+            if task_name not in configured:
+                continue
+            if not os.path.exists(configured[task_name]["json_path"]):
+                print(f"[WARN] {consumer}: annotation json not found for {task_name}, skipped")
+                continue
+            counts = build_task_assets(cache, task_name, make_jobs(task_name), args.force, args.workers)
+            print(f"[{consumer}] {task_name}: {counts}")
+
+    print(f"[DONE] Asset cache: {cache.root}")
+
+
+if __name__ == "__main__":
+    main()
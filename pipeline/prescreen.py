@@ -0,0 +1,128 @@
+"""Local pre-screen of generated images, run before any judge call.
+
+A generation that is missing, unreadable, fully transparent, a single flat
+colour, or a byte-for-byte copy of the source image gets every planned metric
+decided locally (`prescreen_payload`) instead of being sent to the judge.
+Decisions are stored in the payloads under "prescreen" and listed in the run
+summary under "_prescreen".
+
+Scores: 0 for every metric, except that an unchanged copy of the source
+trivially preserves its context, so the preservation metrics get 1. Metrics
+with sub-metrics (SUBMETRIC_KEYS) get the same score for every sub-metric.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import TASK_CONFIG
+from .evaluator import ROLE_SOURCE, find_annotation_item, judge_asset_inputs
+from .image_pack import packed_entry
+from .io_utils import load_image
+from .lazy import lazy_module
+from .metrics.registry import SUBMETRIC_KEYS
+
+PRESCREEN_KEY = "prescreen"
+SUMMARY_KEY = "_prescreen"
+
+MISSING = "missing generation"
+UNREADABLE = "unreadable generation"
+BLANK = "blank generation (fully transparent)"
+SINGLE_COLOUR = "single-colour generation"
+IDENTICAL = "generation identical to source"
+
+PRESERVATION_METRICS = [
+    "Contextual_Preservation",
+    "Wind_Contextual_Preservation",
+    "Reorientation_Contextual_Preservation",
+]
+
+# checks run on a reduced decode; a flat image has every channel within this range
+SCREEN_SIZE = (256, 256)
+FLAT_TOLERANCE = 2
+
+
+def _sha256(path: str) -> str:
+    entry = packed_entry(path)
+    if entry is not None:
+        return entry["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_size(path: str) -> Optional[int]:
+    """Size of an image file (packed or on disk), None if it does not exist."""
+    entry = packed_entry(path) if path else None
+    if entry is not None:
+        return entry["length"]
+    return os.path.getsize(path) if path and os.path.isfile(path) else None
+
+
+def source_path_for(task_name: str, sample_id: str) -> Optional[str]:
+    if task_name not in TASK_CONFIG:
+        return None
+    ann_item = find_annotation_item(task_name, sample_id)
+    if ann_item is None:
+        return None
+    return judge_asset_inputs(task_name, ann_item)[ROLE_SOURCE][0]
+
+
+def screen_generation(gen_abs: str, source_abs: Optional[str] = None) -> Optional[str]:
+    """Reason the generation cannot be a valid edit, or None if it should be judged."""
+    size = _file_size(gen_abs)
+    if size is None:
+        return MISSING
+    if size == 0:
+        return UNREADABLE
+    if source_abs and _file_size(source_abs) == size:
+        if _sha256(gen_abs) == _sha256(source_abs):
+            return IDENTICAL
+    # only decode failures mean unreadable; anything else is a bug and propagates
+    try:
+        im = load_image(gen_abs, target_size=SCREEN_SIZE)
+    except (lazy_module("PIL").UnidentifiedImageError, OSError, SyntaxError):
+        return UNREADABLE
+    if im.mode not in ("RGB", "RGBA"):
+        im = im.convert("RGB")
+    px = np.asarray(im)
+    if px.size == 0:
+        return UNREADABLE
+    px = px.reshape(-1, px.shape[-1] if px.ndim == 3 else 1)
+    if px.shape[1] == 4:
+        if not px[:, 3].any():
+            return BLANK
+        px = px[px[:, 3] > 0, :3]
+    if int((px.max(axis=0).astype(np.int16) - px.min(axis=0)).max()) <= FLAT_TOLERANCE:
+        return SINGLE_COLOUR
+    return None
+
+
+def prescreen_payload(metric_name: str, reason: str) -> Dict[str, Any]:
+    """Locally decided payload; sub-metrics get the same score, so their summary columns count the item too."""
+    score = 1 if reason == IDENTICAL and metric_name in PRESERVATION_METRICS else 0
+    payload: Dict[str, Any] = {k: {"reason": f"Pre-screen: {reason}", "score": score}
+                               for k in SUBMETRIC_KEYS.get(metric_name, ())}
+    payload.update({"reason": f"Pre-screen: {reason}", "score": score, PRESCREEN_KEY: reason})
+    return payload
+
+
+def prescreen_report(items: List[Any], metric_names: List[str]) -> Optional[Dict[str, Any]]:
+    """The summary's "_prescreen" block: which items were decided locally and why (None if none)."""
+    decided: Dict[str, str] = {}
+    for it in items:
+        for m in metric_names:
+            v = it.get(m)
+            if isinstance(v, dict) and PRESCREEN_KEY in v:
+                decided[str(it.get("id"))] = v[PRESCREEN_KEY]
+                break
+    if not decided:
+        return None
+    counts: Dict[str, int] = {}
+    for reason in decided.values():
+        counts[reason] = counts.get(reason, 0) + 1
+    return {"n_items": len(decided), "reasons": dict(sorted(counts.items())), "items": decided}
@@ -0,0 +1,307 @@
+"""Pixel-level check of the preservation metrics, outside the instruction region.
+
+    python -m pipeline.preservation --result_json R.json --task_name Addition --gen_prefix G [--thresholds T.json]
+
+Contextual_Preservation (and its Wind_ / Reorientation_ variants) asks whether
+anything outside the edit target changed. The visual-instruction layer marks
+the target through its alpha channel, so the bounding box of the marks (plus a
+margin) is treated as the edit region and everything else is compared:
+
+    align    the generation is resized to the source (same aspect ratio only)
+             and shifted by up to max_shift analysis pixels to best match
+    mad      mean absolute difference outside the region, in [0, 1]
+    ssim     SSIM of 8x8 luminance blocks lying fully outside the region;
+             "changed" is the fraction of those blocks below block_ssim
+
+run_eval --preservation_check stats stores these under "pixel_stats" in the
+metric payload; with `decide`, unambiguous items get the metric locally (1 for
+an untouched context, 0 for a clearly changed one) and the rest go to the judge.
+Only DECIDE_METRICS of DECIDE_TASKS are decided: those edits stay inside the
+marked region, while the lighting, wind and reorientation rubrics allow
+scene-wide changes, and their preservation metrics are means of sub-metrics.
+Everywhere else `decide` records the statistics only.
+The CLI compares those decisions with earlier judge scores to calibrate the
+thresholds (a JSON file of PreservationThresholds fields).
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .evaluator import find_annotation_item, resolve_source_and_layer_paths
+from .io_utils import image_exists, load_image, read_json, write_json
+from .lazy import lazy_module
+from .prescreen import PRESCREEN_KEY, PRESERVATION_METRICS
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+STATS_KEY = "pixel_stats"
+DECIDED_KEY = "pixel_decided"
+
+# tasks whose edit stays inside the marked region (Level-1 deictic, draft instantiation)
+DECIDE_TASKS = ("Addition", "Removal", "Replacement", "Translation", "2-Tasks", "3-Tasks", "Draft_Instantiation")
+# single-judgement metrics; the Wind_ / Reorientation_ variants are means of sub-metrics
+DECIDE_METRICS = ("Contextual_Preservation",)
+
+ANALYSIS_SIDE = 256
+BLOCK = 8
+# SSIM stabilisers for 8-bit luminance
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+@dataclass
+class PreservationThresholds:
+    margin: float = 0.05          # added around the marks' bounding box, fraction of the long side
+    max_shift: int = 4            # alignment search range, analysis pixels
+    max_aspect_diff: float = 0.02 # larger differences mean a crop / reframe: no decision
+    block_ssim: float = 0.5       # a block below this SSIM counts as changed
+    min_outside: float = 0.2      # fraction of the image that must lie outside the region to decide
+    keep_mad: float = 0.02        # score 1 needs mad <= keep_mad ...
+    keep_changed: float = 0.0     # ... and at most this fraction of changed blocks
+    change_changed: float = 0.15  # score 0 from this fraction of changed blocks
+
+
+def load_thresholds(path: Optional[str]) -> PreservationThresholds:
+    if not path:
+        return PreservationThresholds()
+    raw = read_json(path)
+    known = {f.name for f in fields(PreservationThresholds)}
+    unknown = sorted(set(raw) - known)
+    if unknown:
+        raise ValueError(f"Unknown preservation threshold(s) in {path}: {unknown}; expected {sorted(known)}")
+    return PreservationThresholds(**raw)
+
+
+def _analysis_size(size: Tuple[int, int]) -> Tuple[int, int]:
+    w, h = size
+    scale = ANALYSIS_SIDE / max(w, h)
+    return max(BLOCK, round(w * scale)), max(BLOCK, round(h * scale))
+
+
+def _luma(img: "Image.Image", size: Tuple[int, int]) -> np.ndarray:
+    return np.asarray(img.convert("L").resize(size, resample=lazy_module("PIL.Image").BILINEAR), dtype=np.float32)
+
+
+def instruction_region(layer_abs: str, size: Tuple[int, int], margin: float) -> Optional[np.ndarray]:
+    """Boolean edit-region mask at `size`, or None without any instruction marks."""
+    if not layer_abs or not image_exists(layer_abs):
+        return None
+    layer = load_image(layer_abs, target_size=size, need_alpha=True).resize(size, resample=lazy_module("PIL.Image").BILINEAR)
+    alpha = np.asarray(layer)[..., 3] > 0
+    if not alpha.any():
+        return None
+    ys, xs = np.nonzero(alpha)
+    pad = int(np.ceil(margin * max(size)))
+    region = np.zeros(alpha.shape, dtype=bool)
+    region[max(0, ys.min() - pad):ys.max() + pad + 1, max(0, xs.min() - pad):xs.max() + pad + 1] = True
+    return region
+
+
+def _best_shift(src: np.ndarray, gen: np.ndarray, outside: np.ndarray, max_shift: int) -> Tuple[int, int]:
+    """(dy, dx) moving `gen` onto `src` with the lowest mean difference outside the region."""
+    h, w = src.shape
+    best = (np.inf, 0, 0)
+    for dy in range(-max_shift, max_shift + 1):
+        for dx in range(-max_shift, max_shift + 1):
+            s = (slice(max(0, dy), h + min(0, dy)), slice(max(0, dx), w + min(0, dx)))
+            g = (slice(max(0, -dy), h + min(0, -dy)), slice(max(0, -dx), w + min(0, -dx)))
+            m = outside[s]
+            if not m.any():
+                continue
+            err = float(np.abs(src[s] - gen[g])[m].mean())
+            if err < best[0]:
+                best = (err, dy, dx)
+    return best[1], best[2]
+
+
+def _block_ssim(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """SSIM of each non-overlapping BLOCK x BLOCK tile (edges cropped)."""
+    hb, wb = a.shape[0] // BLOCK, a.shape[1] // BLOCK
+    a = a[:hb * BLOCK, :wb * BLOCK].reshape(hb, BLOCK, wb, BLOCK)
+    b = b[:hb * BLOCK, :wb * BLOCK].reshape(hb, BLOCK, wb, BLOCK)
+    mu_a, mu_b = a.mean(axis=(1, 3)), b.mean(axis=(1, 3))
+    var_a, var_b = a.var(axis=(1, 3)), b.var(axis=(1, 3))
+    cov = (a * b).mean(axis=(1, 3)) - mu_a * mu_b
+    return ((2 * mu_a * mu_b + _C1) * (2 * cov + _C2)) / ((mu_a ** 2 + mu_b ** 2 + _C1) * (var_a + var_b + _C2))
+
+
+def preservation_stats(
+    source_abs: str,
+    layer_abs: str,
+    gen_abs: str,
+    thresholds: Optional[PreservationThresholds] = None,
+) -> Dict[str, Any]:
+    """Change statistics outside the instruction region ("aligned": False when they cannot be computed)."""
+    t = thresholds or PreservationThresholds()
+    if not image_exists(gen_abs) or not image_exists(source_abs):
+        return {"aligned": False, "note": "missing image"}
+    src_img = load_image(source_abs)
+    gen_img = load_image(gen_abs)
+    (sw, sh), (gw, gh) = src_img.size, gen_img.size
+    if abs((gw / gh) / (sw / sh) - 1.0) > t.max_aspect_diff:
+        return {"aligned": False, "note": f"aspect ratio {gw}x{gh} vs source {sw}x{sh} (cropped or reframed)"}
+
+    size = _analysis_size(src_img.size)
+    region = instruction_region(layer_abs, size, t.margin)
+    if region is None:
+        return {"aligned": False, "note": "no instruction marks"}
+    src, gen = _luma(src_img, size), _luma(gen_img, size)
+    src_rgb = np.asarray(src_img.convert("RGB").resize(size, resample=lazy_module("PIL.Image").BILINEAR), dtype=np.float32)
+    gen_rgb = np.asarray(gen_img.convert("RGB").resize(size, resample=lazy_module("PIL.Image").BILINEAR), dtype=np.float32)
+
+    outside = ~region
+    dy, dx = _best_shift(src, gen, outside, t.max_shift)
+    h, w = src.shape
+    s = (slice(max(0, dy), h + min(0, dy)), slice(max(0, dx), w + min(0, dx)))
+    g = (slice(max(0, -dy), h + min(0, -dy)), slice(max(0, -dx), w + min(0, -dx)))
+    src, gen, outside = src[s], gen[g], outside[s]
+    src_rgb, gen_rgb = src_rgb[s], gen_rgb[g]
+
+    stats: Dict[str, Any] = {
+        "aligned": True,
+        "shift": [dx, dy],
+        "outside": round(float(outside.mean()), 4),
+        "mad": round(float(np.abs(src_rgb - gen_rgb)[outside].mean() / 255.0), 4) if outside.any() else None,
+    }
+    hb, wb = src.shape[0] // BLOCK, src.shape[1] // BLOCK
+    block_out = outside[:hb * BLOCK, :wb * BLOCK].reshape(hb, BLOCK, wb, BLOCK).all(axis=(1, 3))
+    ssim = _block_ssim(src, gen)[block_out]
+    stats["n_blocks"] = int(ssim.size)
+    if ssim.size:
+        stats["ssim_mean"] = round(float(ssim.mean()), 4)
+        stats["ssim_min"] = round(float(ssim.min()), 4)
+        stats["changed"] = round(float((ssim < t.block_ssim).mean()), 4)
+    return stats
+
+
+def can_decide(task_name: str, metric_name: str) -> bool:
+    return task_name in DECIDE_TASKS and metric_name in DECIDE_METRICS
+
+
+def decide(stats: Dict[str, Any], thresholds: PreservationThresholds) -> Optional[int]:
+    """Local score when the statistics are unambiguous, else None (send to the judge)."""
+    if not stats.get("aligned") or not stats.get("n_blocks") or stats["outside"] < thresholds.min_outside:
+        return None
+    if stats["changed"] >= thresholds.change_changed:
+        return 0
+    if stats["changed"] <= thresholds.keep_changed and stats["mad"] <= thresholds.keep_mad:
+        return 1
+    return None
+
+
+def stats_for_item(task_name: str, sample_id: str, gen_abs: str,
+                   thresholds: PreservationThresholds) -> Optional[Dict[str, Any]]:
+    ann_item = find_annotation_item(task_name, sample_id)
+    if ann_item is None:
+        return None
+    source_abs, layer_abs = resolve_source_and_layer_paths(task_name, ann_item)
+    return preservation_stats(source_abs, layer_abs, gen_abs, thresholds)
+
+
+def decided_payload(score: int, stats: Dict[str, Any]) -> Dict[str, Any]:
+    what = "unchanged" if score else "changed"
+    return {
+        "reason": f"Pixel check: context outside the instruction region {what} "
+                  f"({stats['changed']:.0%} of blocks below SSIM threshold, MAD {stats['mad']:.3f})",
+        "score": score,
+        STATS_KEY: stats,
+        DECIDED_KEY: True,
+    }
+
+
+def _judge_score(payload: Any) -> Optional[float]:
+    """A judge-given score (not one decided locally), fractional ones included."""
+    if not isinstance(payload, dict) or payload.get(DECIDED_KEY) or PRESCREEN_KEY in payload:
+        return None
+    try:
+        return float(payload.get("score"))
+    except (TypeError, ValueError):
+        return None
+
+
+def agreement_report(rows: List[Tuple[float, Dict[str, Any]]], thresholds: PreservationThresholds) -> Dict[str, Any]:
+    """
+    How the local decisions for (judge score, stats) rows compare with the judge.
+    Judge scores other than 0/1 (e.g. 0.5) get their own bucket and count as
+    disagreements when decided locally.
+    """
+    decisions = [(judge, decide(stats, thresholds)) for judge, stats in rows]
+    decided = [(j, d) for j, d in decisions if d is not None]
+    agree = sum(1 for j, d in decided if j == d)
+    judge_scores = sorted({0.0, 1.0} | {j for j, _ in rows})
+    out: Dict[str, Any] = {
+        "n": len(rows),
+        "decided": len(decided),
+        "coverage": round(len(decided) / len(rows), 4) if rows else None,
+        "agreement": round(agree / len(decided), 4) if decided else None,
+        # [local][judge] counts
+        "confusion": {str(d): {f"{j:g}": sum(1 for jj, dd in decided if (jj, dd) == (j, d)) for j in judge_scores}
+                      for d in (0, 1)},
+        "thresholds": asdict(thresholds),
+        "by_judge_score": {},
+    }
+    for j in judge_scores:
+        aligned = [s for jj, s in rows if jj == j and s.get("aligned") and s.get("n_blocks")]
+        entry: Dict[str, Any] = {"n": sum(1 for jj, _ in rows if jj == j), "aligned": len(aligned)}
+        for key in ("changed", "mad"):
+            if aligned:
+                q = np.quantile([s[key] for s in aligned], [0.1, 0.5, 0.9])
+                entry[key] = {"p10": round(float(q[0]), 4), "p50": round(float(q[1]), 4), "p90": round(float(q[2]), 4)}
+        out["by_judge_score"][f"{j:g}"] = entry
+    return out
+
+
+def main():
+    from .run_eval import resolve_gen_abs
+
+    ap = argparse.ArgumentParser(description="Agreement of the pixel preservation check with past judge scores.")
+    ap.add_argument("--result_json", action="append", required=True, help="Judged run file (repeatable).")
+    ap.add_argument("--task_name", required=True)
+    ap.add_argument("--gen_prefix", required=True, help="Prefix directory for generated images.")
+    ap.add_argument("--thresholds", default=None, help="JSON file of PreservationThresholds fields.")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--out", default=None, help="Optional JSON output path.")
+    args = ap.parse_args()
+
+    t = load_thresholds(args.thresholds)
+    metrics = [m for m in PRESERVATION_METRICS if can_decide(args.task_name, m)]
+    if not metrics:
+        print(f"[WARN] {args.task_name}: preservation is never decided locally for this task "
+              f"(see DECIDE_TASKS / DECIDE_METRICS), nothing to calibrate")
+        return
+    jobs: List[Tuple[str, float, str, str]] = []
+    for path in args.result_json:
+        for it in read_json(path):
+            for m in metrics:
+                judge = _judge_score(it.get(m))
+                if judge is not None:
+                    gen_abs = resolve_gen_abs(args.gen_prefix, str(it.get("saved_image_path")))
+                    jobs.append((m, judge, str(it.get("id")), gen_abs))
+
+    def _one(job: Tuple[str, float, str, str]) -> Optional[Dict[str, Any]]:
+        return stats_for_item(args.task_name, job[2], job[3], t)
+
+    with ThreadPoolExecutor(max(1, args.workers)) as ex:
+        all_stats = list(ex.map(_one, jobs))
+
+    report: Dict[str, Any] = {}
+    for m in metrics:
+        rows = [(job[1], s) for job, s in zip(jobs, all_stats) if job[0] == m and s is not None]
+        if rows:
+            report[m] = agreement_report(rows, t)
+            r = report[m]
+            print(f"[PIXEL] {args.task_name} {m}: {r['decided']}/{r['n']} decided locally, "
+                  f"agreement with judge {r['agreement']}")
+    if not report:
+        print(f"[WARN] No judge-scored preservation metrics in {args.result_json}")
+    if args.out:
+        write_json(args.out, report)
+
+
+if __name__ == "__main__":
+    main()
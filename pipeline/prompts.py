@@ -0,0 +1,133 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .io_utils import read_text
+
+# Tasks where we want to remove the residual-mark clause from Visual_Coherence prompt
+VC_PROMPT_CLAUSE_REMOVE_TASKS = [
+    "Addition",
+]
+
+VC_RESIDUAL_CLAUSE = "- residual visual instruction marks such as arrows, boxes, strokes, or masks that should not appear in the final image."
+
+# Substitution slots a prompt template may use.
+KNOWN_SLOTS = ("prompt",)
+
+# `{name}` placeholders. JSON examples in the prompts (`{\n  "Style_...": ...}`) never match.
+_SLOT_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+def maybe_modify_visual_coherence_prompt(task_name: str, metric_name: str, prompt: str) -> str:
+    if metric_name == "Visual_Coherence" and task_name in VC_PROMPT_CLAUSE_REMOVE_TASKS:
+        return prompt.replace(VC_RESIDUAL_CLAUSE, "")
+    return prompt
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A prompt file compiled once: literal chunks interleaved with slot names.
+    `parts` alternates literal, slot, literal, ... (always odd length).
+    """
+    source_path: str
+    parts: Tuple[str, ...]
+
+    @property
+    def slots(self) -> Tuple[str, ...]:
+        return self.parts[1::2]
+
+    @property
+    def text(self) -> str:
+        out: List[str] = []
+        for i, p in enumerate(self.parts):
+            out.append(p if i % 2 == 0 else "{" + p + "}")
+        return "".join(out)
+
+    def fill(self, **values: Optional[str]) -> str:
+        """
+        Substitute slots. A slot whose value is None/empty is left as the literal
+        `{name}`, matching the previous str.replace behaviour.
+        """
+        out: List[str] = []
+        for i, p in enumerate(self.parts):
+            if i % 2 == 0:
+                out.append(p)
+            else:
+                v = values.get(p)
+                out.append(v if v else "{" + p + "}")
+        return "".join(out)
+
+
+# Appended to the static rubric in the prefix-cache layout, where the slot
+# paragraphs are moved to the per-sample message.
+PREFIX_CACHE_NOTE = "The sample-specific text prompt (if any) and the images are given in the next message."
+
+
+@lru_cache(maxsize=None)
+def split_for_prefix_cache(template: PromptTemplate) -> Tuple[str, PromptTemplate]:
+    """
+    Split a template into (static_prefix, per_sample_suffix) for prompt-prefix caching.
+
+    Paragraphs (blank-line separated) that contain a slot, e.g. "TEXT PROMPT:\n- {prompt}",
+    move to the suffix in their original order; everything else stays in the prefix,
+    which is then byte-identical for every sample of the metric.
+    """
+    static: List[str] = []
+    dynamic: List[str] = []
+    for para in template.text.split("\n\n"):
+        if any(m.group(1) in KNOWN_SLOTS for m in _SLOT_RE.finditer(para)):
+            dynamic.append(para)
+        else:
+            static.append(para)
+    static.append(PREFIX_CACHE_NOTE)
+    suffix = compile_template("\n\n".join(dynamic), source_path=template.source_path)
+    return "\n\n".join(static), suffix
+
+
+def compile_template(text: str, source_path: str = "<string>") -> PromptTemplate:
+    parts: List[str] = []
+    pos = 0
+    unknown: List[str] = []
+    for m in _SLOT_RE.finditer(text):
+        name = m.group(1)
+        if name not in KNOWN_SLOTS:
+            unknown.append(name)
+            continue
+        parts.append(text[pos:m.start()])
+        parts.append(name)
+        pos = m.end()
+    parts.append(text[pos:])
+    if unknown:
+        raise ValueError(
+            f"Unknown placeholder(s) {sorted(set(unknown))} in prompt template {source_path}; "
+            f"known slots: {list(KNOWN_SLOTS)}"
+        )
+    return PromptTemplate(source_path=source_path, parts=tuple(parts))
+
+
+def load_template(prompt_txt_path: str, task_name: str = "", metric_name: str = "") -> PromptTemplate:
+    """Read, strip and apply per-task edits to a prompt file, then compile it."""
+    text = read_text(prompt_txt_path).strip()
+    text = maybe_modify_visual_coherence_prompt(task_name, metric_name, text)
+    return compile_template(text, source_path=prompt_txt_path)
+
+
+def check_slot_values(templates: Dict[str, PromptTemplate], items: List[Dict]) -> List[str]:
+    """
+    Return human-readable problems for items that would send a template with an
+    unfilled slot to the judge (e.g. `{prompt}` but no `input_prompt`).
+    """
+    problems: List[str] = []
+    for mname, tpl in templates.items():
+        if "prompt" not in tpl.slots:
+            continue
+        missing = [
+            str(it.get("id")) for it in items
+            if it.get("status") == "success" and not it.get("input_prompt")
+        ]
+        if missing:
+            head = ", ".join(missing[:5]) + (" ..." if len(missing) > 5 else "")
+            problems.append(f"{mname}: {len(missing)} item(s) without input_prompt for {{prompt}} ({head})")
+    return problems
@@ -0,0 +1,297 @@
+"""Compact in-memory view of a result json (a list of per-sample dicts).
+
+ItemRecord keeps the fields every stage reads in slots and everything else
+(metric payloads, `_eval_errors`, model-specific extras) in `fields`, with the
+original key order remembered, so `ItemRecord.from_dict(d).to_dict() == d`
+including key order and value types. The json files on disk are unchanged.
+
+ScoreColumns holds one float64 column per metric / sub-metric ("Metric/sub"),
+indexed by sample position, NaN where a sample has no score; summaries are
+computed over those columns instead of re-walking the dicts. Columns are
+array('d') buffers (filled by one C-level float conversion per column, cheap
+per-element writes when masking) exposed to NumPy without copying.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CORE_KEYS = ("id", "status", "saved_image_path", "input_prompt", "score")
+OVERALL = "score"
+_MISSING = object()
+_NAN = float("nan")
+
+
+def as_score(v: Any) -> Optional[float]:
+    """float(v), or None when it is not a number (same rule as the summaries always used)."""
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class ItemRecord:
+    __slots__ = ("id", "status", "saved_image_path", "input_prompt", "score", "fields", "_order")
+
+    def __init__(self):
+        for k in CORE_KEYS:
+            setattr(self, k, _MISSING)
+        self.fields: Dict[str, Any] = {}
+        self._order: tuple = ()
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ItemRecord":
+        rec = cls()
+        for k, v in d.items():
+            if k in CORE_KEYS:
+                setattr(rec, k, v)
+            else:
+                rec.fields[k] = v
+        rec._order = tuple(d.keys())
+        return rec
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in CORE_KEYS:
+            v = getattr(self, key)
+            return default if v is _MISSING else v
+        return self.fields.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key: str) -> Any:
+        v = self.get(key, _MISSING)
+        if v is _MISSING:
+            raise KeyError(key)
+        return v
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self:
+            self._order += (key,)
+        if key in CORE_KEYS:
+            setattr(self, key, value)
+        else:
+            self.fields[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for k in self._order:
+            v = self.get(k, _MISSING)
+            if v is not _MISSING:
+                out[k] = v
+        for k in CORE_KEYS:
+            v = getattr(self, k)
+            if k not in out and v is not _MISSING:
+                out[k] = v
+        for k, v in self.fields.items():
+            if k not in out:
+                out[k] = v
+        return out
+
+    @property
+    def is_success(self) -> bool:
+        return self.status == "success"
+
+    def metric_score(self, metric_name: str) -> Optional[float]:
+        v = self.fields.get(metric_name)
+        if not isinstance(v, dict) or "score" not in v:
+            return None
+        return as_score(v["score"])
+
+
+def records_from_json(data: List[Dict[str, Any]]) -> List[ItemRecord]:
+    return [ItemRecord.from_dict(d) for d in data]
+
+
+def records_to_json(records: Iterable[ItemRecord]) -> List[Dict[str, Any]]:
+    return [r.to_dict() for r in records]
+
+
+def _seq_mean(vals: np.ndarray) -> float:
+    # np.cumsum adds strictly left to right, so this equals sum(list) / len(list)
+    # bit for bit (np.sum / np.mean use pairwise summation and can differ in the
+    # last ulp, which is enough to flip a 2-decimal rounding).
+    return float(np.cumsum(vals)[-1]) / len(vals)
+
+
+class ScoreColumns:
+    __slots__ = ("n", "columns")
+
+    def __init__(self, n: int, metric_names: Iterable[str] = ()):
+        self.n = n
+        self.columns: Dict[str, array] = {}
+        for name in (OVERALL, *metric_names):
+            self.column(name)
+
+    def column(self, name: str) -> array:
+        col = self.columns.get(name)
+        if col is None:
+            col = array("d", [_NAN]) * self.n
+            self.columns[name] = col
+        return col
+
+    def as_numpy(self, name: str) -> np.ndarray:
+        col = self.columns.get(name)
+        if col is None or not self.n:
+            return np.full(self.n, np.nan, dtype=np.float64)
+        return np.frombuffer(col, dtype=np.float64)
+
+    def mask_metric(self, pos: int, metric_name: str) -> None:
+        """Drop one sample's score for a metric and all of its sub-metrics."""
+        prefix = metric_name + "/"
+        for name, col in self.columns.items():
+            if name == metric_name or name.startswith(prefix):
+                col[pos] = _NAN
+
+    def values(self, name: str) -> np.ndarray:
+        col = self.as_numpy(name)
+        return col[~np.isnan(col)]
+
+    def mean(self, name: str) -> Optional[float]:
+        vals = self.values(name)
+        return _seq_mean(vals) if len(vals) else None
+
+
+def _to_column(raw: List[Any]) -> array:
+    """array('d') of float() of every raw score, NaN where float() rejects it (as_score)."""
+    try:
+        return array("d", map(float, raw))
+    except (TypeError, ValueError):
+        return array("d", (_NAN if f is None else f for f in map(as_score, raw)))
+
+
+def collect_score_columns(
+    items: List[Any],
+    metric_names: List[str],
+) -> ScoreColumns:
+    """
+    One pass over the successful samples: the overall item score plus, for each
+    metric in `metric_names`, its top-level score and every sub-metric score
+    (a dict field that has a 'score'). `items` may be ItemRecords or raw dicts.
+
+    The pass only drops each raw score into a NaN-filled list per column; the
+    float conversion runs once per column afterwards, in C.
+    """
+    n = len(items)
+    overall = [_NAN] * n
+    # per metric: payload key ("score" for the metric itself) -> raw scores by position
+    found: List[Tuple[str, Dict[str, List[Any]]]] = [(m, {}) for m in metric_names]
+
+    for pos, it in enumerate(items):
+        if it.get("status") != "success":
+            continue
+        if isinstance(it, ItemRecord):
+            fields, score = it.fields, it.score
+        else:
+            fields, score = it, it.get("score", _MISSING)
+        if score is not _MISSING:
+            overall[pos] = score
+        for m, slots in found:
+            payload = fields.get(m)
+            if not isinstance(payload, dict):
+                continue
+            for k, v in payload.items():
+                if k != "score":
+                    if not isinstance(v, dict) or "score" not in v:
+                        continue
+                    v = v["score"]
+                raw = slots.get(k)
+                if raw is None:
+                    raw = slots[k] = [_NAN] * n
+                raw[pos] = v
+
+    cols = ScoreColumns(n)
+    cols.columns[OVERALL] = _to_column(overall)
+    del overall
+    for m, slots in found:
+        # convert and release one column at a time; metrics without any score keep a NaN column
+        cols.columns[m] = _to_column(slots.pop("score")) if "score" in slots else cols.column(m)
+        for k in list(slots):
+            cols.columns[f"{m}/{k}"] = _to_column(slots.pop(k))
+    return cols
+
+
+def summarize_columns(cols: ScoreColumns, metric_names: List[str]) -> Dict[str, Any]:
+    """
+    {task}_summary.json content: overall mean of item scores, then each metric /
+    sub-metric mean in sorted order, as percentages rounded to 2 decimals
+    (None for a metric in `metric_names` that no sample has a score for).
+    """
+    def _pct(name: str) -> Optional[float]:
+        mu = cols.mean(name)
+        return round(mu * 100.0 + 1e-12, 2) if mu is not None else None
+
+    summary: Dict[str, Any] = {OVERALL: _pct(OVERALL)}
+    # sub-metric keys only appear once some sample has that score
+    names = set(metric_names) | {k for k in cols.columns if k != OVERALL and len(cols.values(k))}
+    for name in sorted(names):
+        summary[name] = _pct(name)
+    return summary
+
+
+def metric_score_matrix(items: Sequence[Any], positions: Sequence[int]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Samples x metrics matrix for the overall score: one row per position, one
+    column per field that is a dict with a numeric 'score' in [0, 1] (the rule
+    run_eval.update_overall_score_geomean applies), NaN where absent.
+    """
+    index: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    vals: List[float] = []
+    for r, pos in enumerate(positions):
+        it = items[pos]
+        fields = it.fields if isinstance(it, ItemRecord) else it
+        for k, v in fields.items():
+            if k == OVERALL or not isinstance(v, dict) or "score" not in v:
+                continue
+            try:
+                s = float(v["score"])
+            except Exception:
+                continue
+            if 0.0 <= s <= 1.0:
+                rows.append(r)
+                cols.append(index.setdefault(k, len(index)))
+                vals.append(s)
+    mat = np.full((len(positions), len(index)), np.nan, dtype=np.float64)
+    if vals:
+        mat[rows, cols] = vals
+    return mat, list(index)
+
+
+def geomean_rows(mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row-wise overall score: 0.0 if any metric is 0, else round(exp(mean(log)) + 1e-12, 4);
+    NaN for rows without any score.
+
+    Returns (scores, exact). `exact` is False for rows whose unrounded value lies
+    within 1e-6 of a 4th-decimal rounding boundary: there, the ulp-level
+    differences between NumPy's log/exp/row sums and the scalar math.* path could
+    change the rounded result, so those rows must be recomputed by the caller.
+    """
+    valid = ~np.isnan(mat)
+    cnt = valid.sum(axis=1)
+    has_zero = (mat <= 0.0).any(axis=1)
+    pos = valid & (mat > 0.0)
+    logs = np.zeros_like(mat)
+    np.log(mat, out=logs, where=pos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gm = np.exp(logs.sum(axis=1) / cnt)
+    scaled = (gm + 1e-12) * 1e4
+    frac = scaled - np.floor(scaled)
+    exact = ~(np.abs(frac - 0.5) < 1e-6)
+
+    scores = np.rint(scaled) / 1e4
+    scores[has_zero] = 0.0
+    scores[cnt == 0] = np.nan
+    exact |= has_zero | (cnt == 0)
+    return scores, exact
@@ -1,16 +1,79 @@
 import argparse
+import copy
 import os
 import math
 import shutil
+import socket
 import json
-from typing import Any, Dict, List, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
-from tqdm import tqdm
+# [STARTUP] reports how long the imports below took; openai, PIL and tqdm are deferred (see pipeline.lazy)
+_IMPORT_T0 = time.perf_counter()
 
-from .io_utils import read_json, write_json
+import numpy as np
+
+from .adaptive import aggregate_adaptive, pilot_positions, plan_targets, predicted_variance, prior_columns, stack
+from .assets import ASSET_CACHE_ENV
+from .endpoints import ENDPOINTS_ENV, judge_models
+from .hedging import HEDGE_RATE_ENV, REQUEST_TIMEOUT_ENV
+from .streaming import STREAM_ENV
+from .image_pack import IMAGE_PACKS_ENV
+from .discovery import ADAPTIVE_PASS, DEFAULT_PATTERNS, discover_result_files, report_discovery, summary_names
+from .io_utils import image_exists, read_json, write_json
+from .lazy import lazy_module, startup_report
 from .scoring import compute_summary
-from .evaluator import evaluate_one
-from .metrics.registry import build_metric_specs
+from .evaluator import evaluate_one, gen_path_candidates, image_roles_for_metric
+from .image_pool import ImagePrepRequest, ImagePrepService
+from .prescreen import SUMMARY_KEY as PRESCREEN_SUMMARY_KEY
+from .prescreen import (
+    PRESERVATION_METRICS,
+    prescreen_payload,
+    prescreen_report,
+    screen_generation,
+    source_path_for,
+)
+from .preservation import STATS_KEY as PRESERVATION_STATS_KEY
+from .preservation import (
+    PreservationThresholds,
+    can_decide,
+    decide,
+    decided_payload,
+    load_thresholds,
+    stats_for_item,
+)
+from .metrics.spec import PROVENANCE_KEY
+from .prompts import check_slot_values
+from .jobqueue import STATE_LEASED, JobQueue, LeaseLost
+from .preflight import run_preflight
+from .planner import (
+    IA_METRIC,
+    KIND_GATE,
+    LOCAL_KINDS,
+    OUT_ERROR,
+    OUT_GATE,
+    OUT_PAYLOAD,
+    OUT_PRUNE,
+    OUT_SKIP,
+    VC_METRIC,
+    PendingWork,
+    apply_outcome,
+    plan_resume,
+    schedule_metric_specs,
+)
+from .records import (
+    collect_score_columns,
+    geomean_rows,
+    metric_score_matrix,
+    records_from_json,
+    records_to_json,
+    summarize_columns,
+)
+from .shards import JournalWriter, check_coverage, journal_path, parse_shard, read_journal, shard_of
+from .stats import CallStats
+
+_IMPORT_S = time.perf_counter() - _IMPORT_T0
 
 
 def resolve_gen_abs(gen_prefix: str, saved_image_path: str) -> str:
@@ -22,48 +85,17 @@ def resolve_gen_abs(gen_prefix: str, saved_image_path: str) -> str:
     2) gen_prefix / imgs / saved_image_path   (fallback for missing 'imgs/' prefix)
     3) return primary path anyway, but print warning if neither exists
     """
-    # primary path (expected)
-    p1 = os.path.normpath(os.path.join(gen_prefix, saved_image_path))
-    if os.path.exists(p1):
+    # primary path (expected), then the fallback for a missing 'imgs/' prefix
+    p1, p2 = gen_path_candidates(gen_prefix, saved_image_path)
+    if image_exists(p1):
         return p1
-
-    # fallback: missing 'imgs/' prefix
-    p2 = os.path.normpath(os.path.join(gen_prefix, "imgs", saved_image_path))
-    if os.path.exists(p2):
+    if image_exists(p2):
         return p2
 
     # neither exists: keep original behavior but warn
     print(f"[WARN] Generated image not found: {p1} (also tried {p2})")
     return p1
 
-def _collect_all_scores(payload: Any, metric_name: str, target_dict: Dict[str, List[float]]) -> None:
-    """
-    Collect all scores from a metric payload.
-    Includes the top-level 'score' and any nested 'score' fields in sub-dictionaries.
-    """
-    if not isinstance(payload, dict):
-        return
-    
-    # 1. Top-level score
-    if "score" in payload:
-        try:
-            s = float(payload["score"])
-            target_dict.setdefault(metric_name, []).append(s)
-        except (ValueError, TypeError):
-            pass
-            
-    # 2. Sub-metrics (e.g., Billiards/Context_Preservation)
-    for k, v in payload.items():
-        if k == "score":
-            continue
-        if isinstance(v, dict) and "score" in v:
-            try:
-                sub_score = float(v["score"])
-                sub_key = f"{metric_name}/{k}"
-                target_dict.setdefault(sub_key, []).append(sub_score)
-            except (ValueError, TypeError):
-                pass
-
 def get_metric_score(item: Dict[str, Any], metric_name: str) -> Optional[float]:
     v = item.get(metric_name)
     if not isinstance(v, dict):
@@ -105,6 +137,23 @@ def update_overall_score_geomean(item: Dict[str, Any]) -> None:
     gm = math.exp(sum(math.log(s) for s in scores) / len(scores))
     item["score"] = round(gm + 1e-12, 4)
 
+def apply_overall_scores_geomean(items: List[Any], positions: List[int]) -> None:
+    """
+    Same result as calling update_overall_score_geomean on each item at `positions`,
+    computed as one NumPy pass over a samples x metrics matrix. Rows close to a
+    rounding boundary fall back to the scalar function so the stored values match
+    it exactly.
+    """
+    if not positions:
+        return
+    mat, _ = metric_score_matrix(items, positions)
+    scores, exact = geomean_rows(mat)
+    for pos, s, ok in zip(positions, scores.tolist(), exact.tolist()):
+        if not ok:
+            update_overall_score_geomean(items[pos])
+        elif s == s:  # NaN: no metric score, leave the item untouched
+            items[pos]["score"] = s
+
 def _parse_prompts(kvs: List[str]) -> Dict[str, str]:
     out: Dict[str, str] = {}
     for kv in kvs:
@@ -122,6 +171,21 @@ def _add_suffix_json(path: str, idx: int) -> str:
     root, ext = os.path.splitext(path)
     return f"{root}_{idx}{ext}"
 
+def _adaptive_pass_json(path: str, k: int) -> str:
+    """
+    Run file of adaptive pass k: the full first pass is the usual {stem}_1.json, the
+    later passes judge only some items and are {stem}_pass_{k}.json (not repeats).
+    """
+    if k == 1:
+        return _add_suffix_json(path, 1)
+    root, ext = os.path.splitext(path)
+    return f"{root}_{ADAPTIVE_PASS}_{k}{ext}"
+
+def _summary_path(json_path: str, summary_name: str, idx: Optional[Union[int, str]] = None) -> str:
+    """{summary_name}_summary[_{idx}].json next to json_path (summary_name: see discovery.summary_names)."""
+    suffix = f"_{idx}" if idx is not None else ""
+    return os.path.join(os.path.dirname(json_path), f"{summary_name}_summary{suffix}.json")
+
 def aggregate_run_summaries(run_summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Input: list of summary_i.json dicts (already percentage values, e.g. 43.21)
@@ -130,7 +194,7 @@ def aggregate_run_summaries(run_summaries: List[Dict[str, Any]]) -> Dict[str, An
     """
     keys = set()
     for s in run_summaries:
-        keys.update(s.keys())
+        keys.update(k for k in s.keys() if not k.startswith("_"))
 
     out_mean: Dict[str, Any] = {}
     out_var: Dict[str, Any] = {}
@@ -157,61 +221,157 @@ def aggregate_run_summaries(run_summaries: List[Dict[str, Any]]) -> Dict[str, An
         out_mean[k] = round(mu + 1e-12, 2)
         out_var[k] = round(var + 1e-12, 4)
 
-    return {"n": n, "mean": out_mean, "var": out_var}
+    out = {"n": n, "mean": out_mean, "var": out_var}
+    screened: Dict[str, str] = {}
+    for s in run_summaries:
+        screened.update(s.get(PRESCREEN_SUMMARY_KEY, {}).get("items", {}))
+    if screened:
+        reasons: Dict[str, int] = {}
+        for reason in screened.values():
+            reasons[reason] = reasons.get(reason, 0) + 1
+        out[PRESCREEN_SUMMARY_KEY] = {"n_items": len(screened), "reasons": dict(sorted(reasons.items())), "items": screened}
+    return out
 
-def process_one_result_json(
-    result_json_path: str,
+def run_planned_work(
+    data: List[Any],
+    work: Dict[int, List[Any]],
     metric_specs: List[Any],
     gen_prefix: str,
     task_name: str,
     rerun: bool,
+    on_outcome: Callable[[int, str, str, Any], None],
+    message_layout: str = "inline",
+    image_service: Optional[ImagePrepService] = None,
+    call_stats: Optional[CallStats] = None,
+    show_progress: bool = True,
+    prune: bool = False,
+    prescreen: bool = False,
+    preservation_check: str = "off",
+    preservation_thresholds: Optional[PreservationThresholds] = None,
 ) -> None:
-    data = read_json(result_json_path)
-    if not isinstance(data, list):
-        raise ValueError(f"Result json must be a list: {result_json_path}")
+    """
+    Execute planned (item, metric) pairs in order, applying each outcome to the
+    item and then reporting it through on_outcome(idx, metric, kind, value).
+    With prune, once a metric of the item is 0 (kept, gated or just judged) its
+    remaining pairs are recorded as OUT_PRUNE instead of being judged.
+    With prescreen, items whose generation fails pipeline.prescreen get every
+    planned metric decided locally (as OUT_PAYLOAD) before any judge call.
+    preservation_check ("stats" / "decide") runs pipeline.preservation before
+    each preservation metric call; see that module.
+    Judged payloads are stamped with spec.stamp() under PROVENANCE_KEY.
+    """
+    order = list(work)
 
-    # Summary:
-    # - overall mean of per-sample item["score"]
-    # - mean of each metric's per-sample score
-    overall_scores: List[float] = []
-    metric_success_scores: Dict[str, List[float]] = {spec.name: [] for spec in metric_specs}
+    # With a worker pool, images for the next few items are prepared while the
+    # judge calls for the current item are in flight.
+    prefetched: Dict[int, Any] = {}
+    lookahead = 2 * image_service.workers if image_service is not None else 0
+
+    def _prefetch(idx: int) -> None:
+        if idx in prefetched or idx in screened:
+            return
+        todo = [w.metric for w in work[idx] if w.kind not in LOCAL_KINDS]
+        if not todo:
+            return
+        roles = tuple(dict.fromkeys(r for m in todo for r in image_roles_for_metric(m)))
+        prefetched[idx] = image_service.submit(
+            ImagePrepRequest(task_name, str(data[idx].get("id")), gen_abs_by_idx[idx], roles)
+        )
+
+    gen_abs_by_idx = {
+        idx: resolve_gen_abs(gen_prefix, str(data[idx].get("saved_image_path")))
+        for idx in order
+        if any(w.kind not in LOCAL_KINDS for w in work[idx])
+    }
+    spec_by_name = {spec.name: spec for spec in metric_specs}
+    thresholds = preservation_thresholds or PreservationThresholds()
+    n_checked = n_decided = 0
 
-    for item in tqdm(data, desc=f"{task_name}"):
-        if item.get("status") != "success":
+    screened: Dict[int, str] = {}
+    if prescreen:
+        for idx, gen_abs in gen_abs_by_idx.items():
+            reason = screen_generation(gen_abs, source_path_for(task_name, str(data[idx].get("id"))))
+            if reason is not None:
+                screened[idx] = reason
+        if screened:
+            n_calls = sum(1 for idx in screened for w in work[idx] if w.kind not in LOCAL_KINDS)
+            print(f"[PRESCREEN] {task_name}: {len(screened)} items decided locally, up to {n_calls} judge calls avoided")
+
+    for pos, idx in enumerate(lazy_module("tqdm").tqdm(order, desc=f"{task_name}") if show_progress else order):
+        item = data[idx]
+
+        if idx in screened:
+            for w in work[idx]:
+                # same gating as a judged item, so a resume finds nothing left to do
+                if w.kind == KIND_GATE or (w.metric == VC_METRIC and get_metric_score(item, IA_METRIC) == 0):
+                    apply_outcome(item, w.metric, OUT_GATE)
+                    on_outcome(idx, w.metric, OUT_GATE, None)
+                else:
+                    payload = prescreen_payload(w.metric, screened[idx])
+                    apply_outcome(item, w.metric, OUT_PAYLOAD, payload)
+                    on_outcome(idx, w.metric, OUT_PAYLOAD, payload)
             continue
 
+        image_payloads = None
+        if image_service is not None:
+            for j in order[pos:pos + lookahead + 1]:
+                _prefetch(j)
+            fut = prefetched.pop(idx, None)
+            if fut is not None:
+                image_payloads = fut.result().payloads
+
         sample_id = str(item.get("id"))
-        saved_image_path = str(item.get("saved_image_path"))
-        gen_abs = resolve_gen_abs(gen_prefix, saved_image_path)
+        gen_abs = gen_abs_by_idx.get(idx, "")
+
+        # metric whose score of 0 pins this item's overall score at 0
+        pinned = None
+        if prune:
+            planned = {w.metric for w in work[idx]}
+            pinned = next(
+                (m for m in spec_by_name if m not in planned and get_metric_score(item, m) == 0), None
+            )
 
-        for spec in metric_specs:
-            mname = spec.name
+        for w in work[idx]:
+            mname = w.metric
+            spec = spec_by_name[mname]
 
             # --- Visual_Coherence gating ---
-            if mname == "Visual_Coherence":
-                ia_score = get_metric_score(item, "Instruction_Adherence")
+            if mname == VC_METRIC:
+                ia_score = get_metric_score(item, IA_METRIC)
                 if ia_score == 0:
-                    item["Visual_Coherence"] = {
-                        "reason": "Skipped because Instruction_Adherence.score == 0",
-                        "score": 0,
-                    }
-                    # record metric score for summary
-                    _collect_all_scores(item[mname], mname, metric_success_scores)
-
-                    # update overall
-                    update_overall_score_geomean(item)
-                    write_json(result_json_path, data)
+                    apply_outcome(item, mname, OUT_GATE)
+                    on_outcome(idx, mname, OUT_GATE, None)
+                    pinned = pinned or mname
                     continue
 
+            if prune and pinned is not None:
+                apply_outcome(item, mname, OUT_PRUNE, pinned)
+                on_outcome(idx, mname, OUT_PRUNE, pinned)
+                continue
+
             # Resume / skip per metric unless rerun
             if (not rerun) and spec.is_already_done(item):
-                # collect existing metric score
-                _collect_all_scores(item[mname], mname, metric_success_scores)
-                # keep overall updated
-                update_overall_score_geomean(item)
-                write_json(result_json_path, data)
+                on_outcome(idx, mname, OUT_SKIP, None)
+                if prune and get_metric_score(item, mname) == 0:
+                    pinned = mname
                 continue
 
+            stats = None
+            if preservation_check != "off" and mname in PRESERVATION_METRICS:
+                stats = stats_for_item(task_name, sample_id, gen_abs, thresholds)
+                n_checked += 1
+                local = None
+                if stats is not None and preservation_check == "decide" and can_decide(task_name, mname):
+                    local = decide(stats, thresholds)
+                if local is not None:
+                    n_decided += 1
+                    payload = decided_payload(local, stats)
+                    apply_outcome(item, mname, OUT_PAYLOAD, payload)
+                    on_outcome(idx, mname, OUT_PAYLOAD, payload)
+                    if prune and local == 0:
+                        pinned = mname
+                    continue
+
             eval_out = evaluate_one(
                 task_name=task_name,
                 sample_id=sample_id,
@@ -220,12 +380,16 @@ def process_one_result_json(
                 per_item_input_prompt=item.get("input_prompt"),
                 metric_name=mname,
                 metric_spec=spec,
+                message_layout=message_layout,
+                image_payloads=image_payloads,
             )
+            if call_stats is not None:
+                call_stats.merge_eval_out(eval_out)
 
             if not eval_out.get("eval_ok"):
-                item.setdefault("_eval_errors", [])
-                item["_eval_errors"].append(eval_out.get("error", "unknown eval error"))
-                write_json(result_json_path, data)
+                err = eval_out.get("error", "unknown eval error")
+                apply_outcome(item, mname, OUT_ERROR, err)
+                on_outcome(idx, mname, OUT_ERROR, err)
                 continue
 
             payload = eval_out.get("metric_payload")
@@ -235,69 +399,669 @@ def process_one_result_json(
             if isinstance(payload, dict):
                 if "score" not in payload and score is not None:
                     payload["score"] = score
-                item[mname] = payload
-
-                # collect metric score for summary
-                _collect_all_scores(payload, mname, metric_success_scores)
             else:
-                item[mname] = {
+                payload = {
                     "error": parse_error or "missing payload",
                     "raw": eval_out.get("gpt_text", ""),
                 }
+            if stats is not None:
+                payload[PRESERVATION_STATS_KEY] = stats
+            if eval_out.get("endpoint"):
+                payload["_endpoint"] = eval_out["endpoint"]
+            payload[PROVENANCE_KEY] = spec.stamp(eval_out.get("model"))
+            apply_outcome(item, mname, OUT_PAYLOAD, payload)
+            on_outcome(idx, mname, OUT_PAYLOAD, payload)
+            if prune and get_metric_score(item, mname) == 0:
+                pinned = mname
 
-            # update overall
-            update_overall_score_geomean(item)
-            write_json(result_json_path, data)
+    if n_checked:
+        print(f"[PIXEL] {task_name}: {n_checked} preservation pairs checked, {n_decided} decided locally")
 
-        # collect overall for summary (after finishing metrics for this sample)
-        if "score" in item:
-            try:
-                overall_scores.append(float(item["score"]))
-            except Exception:
-                pass
 
-    write_json(result_json_path, data)
+def finalize_run(data: List[Any], metric_specs: List[Any], failed: List[Any]) -> Dict[str, Any]:
+    """
+    Overall scores and the summary after a pass. `failed` lists the (idx, metric)
+    pairs whose evaluation failed in this pass: they keep any old payload in the
+    file but are left out of this pass's summary, and an item whose metrics all
+    failed keeps its previous overall score.
+    """
+    n_failed: Dict[int, int] = {}
+    for idx, _ in failed:
+        n_failed[idx] = n_failed.get(idx, 0) + 1
+    apply_overall_scores_geomean(
+        data,
+        [i for i, it in enumerate(data) if it.get("status") == "success" and n_failed.get(i, 0) < len(metric_specs)],
+    )
+
+    # Summary:
+    # - overall mean of per-sample item["score"]
+    # - mean of each metric's per-sample score
+    metric_names = [spec.name for spec in metric_specs]
+    score_cols = collect_score_columns(data, metric_names)
+    for idx, mname in failed:
+        score_cols.mask_metric(idx, mname)
+    summary = summarize_columns(score_cols, metric_names)
+    screened = prescreen_report(data, metric_names)
+    if screened is not None:
+        summary[PRESCREEN_SUMMARY_KEY] = screened
+    return summary
+
+
+def _load_records(path: str) -> List[Any]:
+    raw = read_json(path)
+    if not isinstance(raw, list):
+        raise ValueError(f"Result json must be a list: {path}")
+    return records_from_json(raw)
+
+
+def _scheduled_plan(data: List[Any], metric_specs: List[Any], rerun: bool, schedule: str,
+                    prune: bool) -> Tuple[List[Any], Any]:
+    """(metric_specs in evaluation order, plan); every mode derives both from the run's input file."""
+    if schedule == "decisive":
+        metric_specs = schedule_metric_specs(data, metric_specs)
+    return metric_specs, plan_resume(data, metric_specs, rerun, prune=prune)
+
+
+def _report_schedule(label: str, metric_specs: List[Any], n_pruned: int) -> None:
+    print(f"[SCHEDULE] {label}: order={' > '.join(spec.name for spec in metric_specs)}; "
+          f"{n_pruned} judge calls avoided for items already at overall 0")
+
+
+def process_one_result_json(
+    result_json_path: str,
+    metric_specs: List[Any],
+    gen_prefix: str,
+    task_name: str,
+    rerun: bool,
+    message_layout: str = "inline",
+    image_service: Optional[ImagePrepService] = None,
+    price_input_per_m: Optional[float] = None,
+    price_output_per_m: Optional[float] = None,
+    schedule: str = "cli",
+    prune: bool = False,
+    only_items: Optional[Set[int]] = None,
+    prescreen: bool = False,
+    preservation_check: str = "off",
+    preservation_thresholds: Optional[PreservationThresholds] = None,
+    summary_name: Optional[str] = None,
+) -> None:
+    data = _load_records(result_json_path)
+
+    def _save() -> None:
+        write_json(result_json_path, records_to_json(data))
+
+    metric_specs, plan = _scheduled_plan(data, metric_specs, rerun, schedule, prune)
+    if only_items is not None:
+        plan.pending = [w for w in plan.pending if w.idx in only_items]
+    plan.report(os.path.basename(result_json_path), metric_specs, price_input_per_m, price_output_per_m)
+
+    call_stats = CallStats()
+    failed: List[Any] = []
+    n_pruned = 0
+
+    def _on_outcome(idx: int, mname: str, kind: str, value: Any) -> None:
+        nonlocal n_pruned
+        if kind == OUT_PAYLOAD:
+            # live checkpoint: keep this item's overall current in the file
+            update_overall_score_geomean(data[idx])
+            _save()
+        elif kind == OUT_ERROR:
+            failed.append((idx, mname))
+            _save()
+        elif kind == OUT_PRUNE:
+            n_pruned += 1
+
+    run_planned_work(
+        data, plan.by_item(), metric_specs, gen_prefix, task_name, rerun, _on_outcome,
+        message_layout=message_layout, image_service=image_service, call_stats=call_stats, prune=prune,
+        prescreen=prescreen, preservation_check=preservation_check,
+        preservation_thresholds=preservation_thresholds,
+    )
+    summary_obj = finalize_run(data, metric_specs, failed)
+
+    _save()
+    if schedule != "cli":
+        _report_schedule(os.path.basename(result_json_path), metric_specs, n_pruned)
+    if call_stats.calls:
+        call_stats.report(f"{task_name} ({os.path.basename(result_json_path)}, layout={message_layout})")
+
+    write_json(_summary_path(result_json_path, summary_name or task_name), summary_obj)
+
+
+def _owned_plan(data: List[Any], metric_specs: List[Any], rerun: bool, task_name: str, repeat_idx: int,
+                num_shards: int, schedule: str, prune: bool) -> Tuple[List[Any], Any, Dict[Tuple[str, str], int]]:
+    metric_specs, plan = _scheduled_plan(data, metric_specs, rerun, schedule, prune)
+    names = [spec.name for spec in metric_specs]
+    owners = {
+        (str(data[w.idx].get("id")), w.metric): shard_of(task_name, str(data[w.idx].get("id")), w.metric,
+                                                          repeat_idx, num_shards, names, whole_item=prune)
+        for w in plan.pending
+    }
+    return metric_specs, plan, owners
+
+
+def process_shard(
+    input_json_path: str,
+    run_json_path: str,
+    journal_dir: str,
+    shard: Tuple[int, int],
+    repeat_idx: int,
+    metric_specs: List[Any],
+    gen_prefix: str,
+    task_name: str,
+    rerun: bool,
+    message_layout: str = "inline",
+    image_service: Optional[ImagePrepService] = None,
+    price_input_per_m: Optional[float] = None,
+    price_output_per_m: Optional[float] = None,
+    schedule: str = "cli",
+    prune: bool = False,
+    prescreen: bool = False,
+    preservation_check: str = "off",
+    preservation_thresholds: Optional[PreservationThresholds] = None,
+) -> None:
+    """
+    Run this shard's part of the plan for one repeat, appending every outcome to
+    the shard journal. Pairs already in the journal are replayed, not re-run.
+    """
+    shard_idx, num_shards = shard
+    data = _load_records(input_json_path)
+    metric_specs, plan, owners = _owned_plan(data, metric_specs, rerun, task_name, repeat_idx, num_shards,
+                                             schedule, prune)
+    settings = {"num_shards": num_shards, "rerun": rerun, "schedule": schedule, "prune": prune}
+
+    path = journal_path(journal_dir, run_json_path, shard_idx, num_shards)
+    meta, done_records = read_journal(path)
+    if meta is not None and any(meta.get(k) != v for k, v in settings.items()):
+        raise ValueError(f"Journal {path} was written with different settings: {meta}")
+    done = {(str(r["id"]), r["metric"]): r for r in done_records}
+
+    mine = [w for w in plan.pending if owners[(str(data[w.idx].get("id")), w.metric)] == shard_idx]
+    todo = []
+    for w in mine:
+        rec = done.get((str(data[w.idx].get("id")), w.metric))
+        if rec is not None:
+            apply_outcome(data[w.idx], w.metric, rec["kind"], rec.get("value"))
+        else:
+            todo.append(w)
+    print(f"[SHARD {shard_idx}/{num_shards}] {os.path.basename(run_json_path)}: "
+          f"{len(mine)} of {len(plan.pending)} planned pairs, {len(mine) - len(todo)} already journaled")
+    sub_plan = type(plan)(n_items=plan.n_items, pending=todo, n_done=plan.n_done)
+    sub_plan.report(f"{os.path.basename(run_json_path)} shard {shard_idx}/{num_shards}",
+                    metric_specs, price_input_per_m, price_output_per_m)
+
+    writer = JournalWriter(path, {
+        "shard": shard_idx, "task": task_name, "repeat": repeat_idx,
+        "input": os.path.abspath(input_json_path), **settings,
+    })
+    call_stats = CallStats()
+    try:
+        run_planned_work(
+            data, sub_plan.by_item(), metric_specs, gen_prefix, task_name, rerun,
+            lambda idx, mname, kind, value: writer.record(str(data[idx].get("id")), mname, kind, value),
+            message_layout=message_layout, image_service=image_service, call_stats=call_stats, prune=prune,
+            prescreen=prescreen, preservation_check=preservation_check,
+            preservation_thresholds=preservation_thresholds,
+        )
+    finally:
+        writer.close()
+    if call_stats.calls:
+        call_stats.report(f"{task_name} ({os.path.basename(run_json_path)} shard {shard_idx}/{num_shards})")
+
+
+def merge_shard_journals(
+    input_json_path: str,
+    run_json_path: str,
+    journal_dir: str,
+    num_shards: int,
+    repeat_idx: int,
+    metric_specs: List[Any],
+    task_name: str,
+    rerun: bool,
+    schedule: str = "cli",
+    prune: bool = False,
+    summary_name: Optional[str] = None,
+) -> None:
+    """
+    Replay all shard journals of one repeat onto its input file, in plan order,
+    and write the canonical run file and {task}_summary.json next to it.
+    Raises ValueError unless the journals cover the plan exactly once.
+    """
+    data = _load_records(input_json_path)
+    metric_specs, plan, owners = _owned_plan(data, metric_specs, rerun, task_name, repeat_idx, num_shards,
+                                             schedule, prune)
+    settings = {"num_shards": num_shards, "rerun": rerun, "schedule": schedule, "prune": prune}
+
+    journals: Dict[int, List[Dict[str, Any]]] = {}
+    problems: List[str] = []
+    for k in range(num_shards):
+        path = journal_path(journal_dir, run_json_path, k, num_shards)
+        meta, records = read_journal(path)
+        if meta is None and not records:
+            if any(owner == k for owner in owners.values()):
+                problems.append(f"missing journal {path}")
+            continue
+        if meta is not None and any(meta.get(k) != v for k, v in settings.items()):
+            problems.append(f"journal {path} was written with different settings: {meta}")
+        journals[k] = records
+    problems.extend(check_coverage(owners, journals))
+    if problems:
+        raise ValueError(f"Cannot merge shards for {run_json_path}:\n  " + "\n  ".join(problems))
+
+    by_key = {(str(r["id"]), r["metric"]): r for records in journals.values() for r in records}
+    _replay_and_write(data, plan, by_key, metric_specs, run_json_path, summary_name or task_name)
+    print(f"[MERGE] {os.path.basename(run_json_path)}: {len(by_key)} journal records from {len(journals)} shards")
+    if schedule != "cli":
+        _report_schedule(os.path.basename(run_json_path), metric_specs,
+                         sum(1 for r in by_key.values() if r["kind"] == OUT_PRUNE))
+
+
+def _replay_and_write(
+    data: List[Any],
+    plan: Any,
+    by_key: Dict[Tuple[str, str], Dict[str, Any]],
+    metric_specs: List[Any],
+    run_json_path: str,
+    summary_name: str,
+) -> None:
+    """Apply recorded outcomes in plan order, then write the run file and {summary_name}_summary.json."""
+    failed: List[Any] = []
+    for w in plan.pending:
+        rec = by_key[(str(data[w.idx].get("id")), w.metric)]
+        apply_outcome(data[w.idx], w.metric, rec["kind"], rec.get("value"))
+        if rec["kind"] == OUT_PAYLOAD:
+            # as the single-process checkpoint does, so the file comes out identical
+            update_overall_score_geomean(data[w.idx])
+        elif rec["kind"] == OUT_ERROR:
+            failed.append((w.idx, w.metric))
+    summary_obj = finalize_run(data, metric_specs, failed)
+
+    write_json(run_json_path, records_to_json(data))
+    write_json(_summary_path(run_json_path, summary_name), summary_obj)
+
+
+def enqueue_run(
+    queue: JobQueue,
+    input_json_path: str,
+    run_json_path: str,
+    repeat_idx: int,
+    metric_specs: List[Any],
+    gen_prefix: str,
+    task_name: str,
+    rerun: bool,
+    schedule: str = "cli",
+    prune: bool = False,
+) -> None:
+    data = _load_records(input_json_path)
+    metric_specs, plan = _scheduled_plan(data, metric_specs, rerun, schedule, prune)
+    pairs = [(str(data[w.idx].get("id")), w.metric, w.kind) for w in plan.pending]
+    added = queue.enqueue_run(run_json_path, input_json_path, gen_prefix, task_name, repeat_idx, rerun,
+                              [spec.name for spec in metric_specs], pairs, prune=prune)
+    state = f"{added} jobs enqueued" if added else "already queued"
+    print(f"[QUEUE] {os.path.basename(run_json_path)}: {state} ({len(plan.pending)} planned pairs)")
+
+
+def run_queue_worker(
+    queue: JobQueue,
+    metric_specs: List[Any],
+    task_name: str,
+    worker_id: str,
+    lease_s: float,
+    message_layout: str = "inline",
+    image_service: Optional[ImagePrepService] = None,
+    poll_s: float = 5.0,
+    prescreen: bool = False,
+    preservation_check: str = "off",
+    preservation_thresholds: Optional[PreservationThresholds] = None,
+) -> None:
+    """
+    Lease and run job groups of `task_name` until none are pending and no other
+    worker holds a lease that could still expire back into the queue.
+    """
+    metric_names = [spec.name for spec in metric_specs]
+    spec_by_name = {spec.name: spec for spec in metric_specs}
+    inputs: Dict[int, Tuple[List[Any], Dict[str, int]]] = {}
+    call_stats = CallStats()
+    n_jobs = n_lost = 0
+
+    while True:
+        lease = queue.lease(worker_id, task_name, metric_names, lease_s)
+        if lease is None:
+            if not queue.counts(task_name)[STATE_LEASED]:
+                break
+            time.sleep(poll_s)
+            continue
+        run = lease.run
+        if lease.requeued:
+            print(f"[QUEUE] {worker_id}: re-leased expired jobs {lease.sample_id}/{lease.grp} "
+                  f"of {os.path.basename(run.run_json)}")
+        if run.run_id not in inputs:
+            raw = read_json(run.input_json)
+            inputs[run.run_id] = (raw, {str(d.get("id")): i for i, d in enumerate(raw)})
+        raw, pos_by_id = inputs[run.run_id]
+
+        # a fresh copy of the item plus this group's committed outcomes, so a
+        # re-leased Visual_Coherence still sees its Instruction_Adherence result
+        item = records_from_json([copy.deepcopy(raw[pos_by_id[lease.sample_id]])])[0]
+        for mname, kind, value in lease.done:
+            apply_outcome(item, mname, kind, value)
+
+        def _on_outcome(idx: int, mname: str, kind: str, value: Any) -> None:
+            queue.commit(lease, worker_id, mname, kind, value, lease_s)
+
+        try:
+            run_planned_work(
+                [item], {0: [PendingWork(0, m, pk) for m, pk in lease.todo]},
+                [spec_by_name[m] for m in run.metrics], run.gen_prefix, task_name, run.rerun, _on_outcome,
+                message_layout=message_layout, image_service=image_service, call_stats=call_stats,
+                show_progress=False, prune=run.prune, prescreen=prescreen,
+                preservation_check=preservation_check, preservation_thresholds=preservation_thresholds,
+            )
+            n_jobs += len(lease.todo)
+        except LeaseLost as e:
+            n_lost += 1
+            print(f"[WARN] {worker_id}: lease lost for {e}; its jobs belong to another worker now")
+
+    print(f"[QUEUE] {worker_id}: finished {n_jobs} jobs ({n_lost} leases lost)")
+    if call_stats.calls:
+        call_stats.report(f"{task_name} (queue worker {worker_id}, layout={message_layout})")
 
-    summary_path = os.path.join(os.path.dirname(result_json_path), f"{task_name}_summary.json")
-    summary_obj: Dict[str, Any] = {}
 
-    # overall mean
-    summary_obj["score"] = round(sum(overall_scores) / len(overall_scores) * 100.0 + 1e-12, 2) if overall_scores else None
+def merge_queue_run(
+    queue: JobQueue,
+    input_json_path: str,
+    run_json_path: str,
+    metric_specs: List[Any],
+    task_name: str,
+    rerun: bool,
+    summary_name: Optional[str] = None,
+) -> None:
+    """Replay a fully processed queued run; raises ValueError if it is not finished or its input changed."""
+    run = queue.get_run(run_json_path)
+    if run is None:
+        raise ValueError(f"{run_json_path} is not in queue {queue.path}; run --queue_action enqueue first.")
+    spec_by_name = {spec.name: spec for spec in metric_specs}
+    if sorted(spec_by_name) != sorted(run.metrics):
+        raise ValueError(f"{run_json_path} was queued with metrics {run.metrics}, not {sorted(spec_by_name)}.")
+    data = _load_records(input_json_path)
+    metric_specs = [spec_by_name[m] for m in run.metrics]
+    plan = plan_resume(data, metric_specs, rerun, prune=run.prune)
+    planned = [(str(data[w.idx].get("id")), w.metric) for w in plan.pending]
+    if planned != queue.planned_keys(run.run_id):
+        raise ValueError(f"Plan for {run_json_path} no longer matches the queued jobs (input file changed?)")
+    by_key, unfinished = queue.outcomes(run.run_id)
+    if unfinished:
+        raise ValueError(f"{unfinished} jobs of {run_json_path} are not finished yet; start more workers.")
+    _replay_and_write(data, plan, by_key, metric_specs, run_json_path, summary_name or task_name)
+    print(f"[MERGE] {os.path.basename(run_json_path)}: {len(by_key)} queued jobs")
+    if run.prune:
+        _report_schedule(os.path.basename(run_json_path), metric_specs,
+                         sum(1 for r in by_key.values() if r["kind"] == OUT_PRUNE))
 
-    # per-metric mean (including sub-metrics)
-    for mname in sorted(metric_success_scores.keys()):
-        vals = metric_success_scores[mname]
-        summary_obj[mname] = round(sum(vals) / len(vals) * 100.0 + 1e-12, 2) if vals else None
 
-    write_json(summary_path, summary_obj)
+def run_adaptive_repeats(
+    result_json_path: str,
+    base_data: List[Any],
+    metric_specs: List[Any],
+    task_name: str,
+    max_repeats: int,
+    budget: float,
+    pilot_frac: float,
+    prior_paths: List[str],
+    repeat_resume: bool,
+    summary_name: Optional[str] = None,
+    **run_kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Pass 1 over every item, then passes 2..max_repeats over the items chosen by
+    pipeline.adaptive within `budget` extra judge calls. Returns the aggregated summary.
+    """
+    names = [spec.name for spec in metric_specs]
+    base_records = records_from_json(base_data)
+    ids = [str(it.get("id")) for it in base_records]
+    cost = np.zeros(len(base_records))
+    for w in plan_resume(base_records, metric_specs, rerun=True).pending:
+        if w.kind not in LOCAL_KINDS:
+            cost[w.idx] += 1
+    prior = [prior_columns(_load_records(pp), ids, names) for pp in prior_paths]
+    cols: List[Any] = []
+    spent = 0.0
+
+    def _pass(k: int, only: Optional[Set[int]], fresh: bool = True) -> None:
+        run_json_path = _adaptive_pass_json(result_json_path, k)
+        if fresh and not (repeat_resume and os.path.exists(run_json_path)):
+            write_json(run_json_path, base_data)
+        process_one_result_json(
+            result_json_path=run_json_path, metric_specs=metric_specs, task_name=task_name,
+            rerun=not repeat_resume, only_items=only, summary_name=summary_name, **run_kwargs,
+        )
+        default_summary_path = _summary_path(run_json_path, summary_name or task_name)
+        if os.path.exists(default_summary_path):
+            pass_idx = k if k == 1 else f"{ADAPTIVE_PASS}_{k}"
+            shutil.move(default_summary_path, _summary_path(run_json_path, summary_name or task_name, pass_idx))
+        run_cols = collect_score_columns(_load_records(run_json_path), names)
+        if len(cols) < k:
+            cols.append(run_cols)
+        else:
+            cols[k - 1] = run_cols
+
+    def _passes_so_far() -> np.ndarray:
+        judged = np.zeros((len(cols), len(base_records)), dtype=bool)
+        for m in names:
+            judged |= ~np.isnan(stack(cols, m))
+        return judged.sum(axis=0)
+
+    def _variance() -> np.ndarray:
+        v = np.zeros(len(base_records))
+        for m in names:
+            v += np.nan_to_num(predicted_variance(stack(prior + cols, m), cols[0].as_numpy(m)))
+        return v
+
+    _pass(1, None)
+    for k in range(2, max_repeats + 1):
+        repeats = _passes_so_far()
+        piloted: Set[int] = set()
+        seen_twice = any((~np.isnan(stack(prior + cols, m))).sum(axis=0).max(initial=0) >= 2 for m in names)
+        if k == 2 and not seen_twice:
+            # nothing has been judged twice yet: estimate judge variance on a random pilot first
+            candidates = [i for i in range(len(base_records)) if cost[i] > 0 and repeats[i] > 0]
+            per_item = max(1.0, float(cost[candidates].mean())) if candidates else 1.0
+            piloted = set(pilot_positions(candidates, pilot_frac, f"{task_name}:{os.path.basename(result_json_path)}",
+                                          int((budget - spent) // per_item)))
+            if piloted:
+                spent += float(cost[list(piloted)].sum())
+                print(f"[ADAPTIVE] pass 2 pilot: {len(piloted)} items to estimate judge variance")
+                _pass(2, piloted)
+                repeats = _passes_so_far()
+
+        targets = plan_targets(_variance(), repeats, cost, max_repeats, budget - spent)
+        select = {int(i) for i in np.flatnonzero((targets >= k) & (repeats == k - 1))}
+        if not select:
+            if not piloted:
+                break
+            continue
+        spent += float(cost[list(select)].sum())
+        print(f"[ADAPTIVE] pass {k}: re-judging {len(select)} items "
+              f"({int(spent)} of {budget:g} extra calls planned so far)")
+        _pass(k, select, fresh=not piloted)
+
+    return aggregate_adaptive(cols, names, int(spent), budget)
 
 
-def main():
+def main(argv: Optional[List[str]] = None, report_startup: bool = True) -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--prompt", action="append", required=True, help="MetricName=/path/to/prompt.txt (repeatable).")
     ap.add_argument("--gen_prefix", required=True, help="Prefix directory for generated images.")
     ap.add_argument("--result_json", action="append", default=[], help="Path to a task result json. Can be repeated.")
     ap.add_argument("--results_root", default=None, help="Folder containing many task jsons.")
+    ap.add_argument("--results_pattern", action="append", default=[],
+                help="With --results_root: glob of the file names to consider (repeatable, default *.json). "
+                     "Summaries and repeat copies written by earlier runs are always skipped.")
+    ap.add_argument("--file_workers", type=int, default=1,
+                help="Result files evaluated concurrently (threads sharing the judge client, image workers "
+                     "and --endpoints rate limits).")
     ap.add_argument("--task_name", required=True, help="Task name for evaluation (must exist in TASK_CONFIG).")
     ap.add_argument("--repeat", type=int, default=1, help="Repeat evaluation N times and aggregate mean/variance.")
     ap.add_argument("--repeat_resume", action="store_true",
                 help="If set, each repeat run will resume from existing *_i.json instead of overwriting from the base file.")
-    args = ap.parse_args()
+    ap.add_argument("--message_layout", choices=["inline", "prefix_cache"], default="inline",
+                help="prefix_cache sends the static rubric as a leading system message so the "
+                     "server can reuse its prompt-prefix cache across samples.")
+    ap.add_argument("--image_workers", type=int, default=0,
+                help="Processes for image decode/composite/encode (0 = in the main process).")
+    ap.add_argument("--asset_cache", default=None,
+                help="Asset cache built by `python -m pipeline.prepare_assets` (same as $VIBE_ASSET_CACHE).")
+    ap.add_argument("--image_packs", default=None,
+                help="Packed image stores built by `python -m pipeline.pack_images` (same as $VIBE_IMAGE_PACKS).")
+    ap.add_argument("--endpoints", default=None,
+                help="JSON list of judge endpoints to balance requests over (same as $VIBE_JUDGE_ENDPOINTS; "
+                     "see pipeline/endpoints.py).")
+    ap.add_argument("--request_timeout", type=float, default=None,
+                help="Seconds before a judge request is abandoned and retried (default: the client's).")
+    ap.add_argument("--hedge_max_rate", type=float, default=0.0,
+                help="Send a duplicate of judge requests still unanswered after the observed p95 latency, "
+                     "first parseable answer wins; at most this fraction of extra requests (e.g. 0.05).")
+    ap.add_argument("--stream_verdicts", action="store_true",
+                help="Stream judge responses and stop reading as soon as the verdict JSON is complete and parses.")
+    ap.add_argument("--keep_stale", action="store_true",
+                help="On resume, keep scores judged with a different prompt, judge model or parser version "
+                     "instead of re-judging them (see [PROVENANCE] in the plan).")
+    ap.add_argument("--preflight", choices=["off", "report", "require"], default="off",
+                help="Check every dataset and generated image of the run (see pipeline/preflight.py) before "
+                     "the first judge call; require: stop when the check finds an error.")
+    ap.add_argument("--price_input_per_m", type=float, default=None,
+                help="USD per 1M prompt tokens, for the [PLAN] cost estimate.")
+    ap.add_argument("--price_output_per_m", type=float, default=None,
+                help="USD per 1M completion tokens, for the [PLAN] cost estimate.")
+    ap.add_argument("--plan_only", action="store_true",
+                help="Print the pending-work plan and estimate for each run file, then exit without calling the judge.")
+    ap.add_argument("--schedule", choices=["cli", "decisive"], default="cli",
+                help="cli: evaluate metrics in --prompt order. decisive: evaluate the metrics most likely "
+                     "to score 0 (per prompt token) first and skip the rest of an item once its overall "
+                     "score is pinned at 0; skipped metrics are recorded without a score.")
+    ap.add_argument("--full_fidelity", action="store_true",
+                help="With --schedule decisive, still evaluate every metric of zeroed items (order only).")
+    ap.add_argument("--prescreen", action="store_true",
+                help="Score generations that are missing, unreadable, blank, a single flat colour or an "
+                     "exact copy of the source locally instead of sending them to the judge.")
+    ap.add_argument("--preservation_check", choices=["off", "stats", "decide"], default="off",
+                help="stats: store pixel change statistics outside the instruction region in the preservation "
+                     "metric payloads. decide: also score unambiguous items locally instead of calling the judge "
+                     "(Contextual_Preservation of the Level-1 tasks and Draft_Instantiation only; stats elsewhere).")
+    ap.add_argument("--preservation_thresholds", default=None,
+                help="JSON file overriding pipeline.preservation.PreservationThresholds fields.")
+    ap.add_argument("--adaptive_budget", type=float, default=None,
+                help="Adaptive repeats: after one full pass, spend at most this many extra judge calls "
+                     "re-judging the items whose scores are least stable, up to --repeat passes per item.")
+    ap.add_argument("--adaptive_pilot", type=float, default=0.1,
+                help="Fraction of items re-judged first to estimate judge variance when no item has "
+                     "been judged twice yet (default 0.1, at least 5 items).")
+    ap.add_argument("--adaptive_prior", action="append", default=[],
+                help="Earlier run file of the same model and task (repeatable); its scores only inform "
+                     "which items are re-judged.")
+    ap.add_argument("--shard", default=None,
+                help="i/N: run only the (id, metric) pairs owned by shard i of N, appending to a journal "
+                     "instead of writing the run file. Combine with --merge_shards N afterwards.")
+    ap.add_argument("--merge_shards", type=int, default=0,
+                help="Merge the journals of N shards into the run files and summaries (no judge calls).")
+    ap.add_argument("--journal_dir", default=None,
+                help="Directory for shard journals (default: shards/ next to the result json).")
+    ap.add_argument("--queue", default=None,
+                help="SQLite job queue file shared by elastic workers on this host (see --queue_action).")
+    ap.add_argument("--queue_action", choices=["enqueue", "work", "merge"], default=None,
+                help="enqueue: plan the run files into --queue; work: lease and run jobs until the queue "
+                     "is drained; merge: write run files and summaries from the finished jobs.")
+    ap.add_argument("--lease_s", type=float, default=900.0,
+                help="Seconds a worker holds a job group before it is handed to another worker.")
+    ap.add_argument("--worker_id", default=None, help="Name of this queue worker (default: host-pid).")
+    args = ap.parse_args(argv)
+
+    prune = args.schedule == "decisive" and not args.full_fidelity
+    shard = parse_shard(args.shard) if args.shard else None
+    if shard is not None and args.merge_shards:
+        raise ValueError("--shard and --merge_shards are separate steps; pass only one of them.")
+    if bool(args.queue) != bool(args.queue_action):
+        raise ValueError("--queue and --queue_action go together.")
+    if args.queue and (shard is not None or args.merge_shards):
+        raise ValueError("--queue cannot be combined with --shard / --merge_shards.")
+    if args.file_workers > 1 and args.queue:
+        raise ValueError("--file_workers cannot be combined with --queue; start more queue workers instead.")
+    if args.adaptive_budget is not None and (args.queue or shard is not None or args.merge_shards or args.plan_only):
+        raise ValueError("--adaptive_budget runs in a single process; drop --queue / --shard / --merge_shards / --plan_only.")
+
+    if args.asset_cache:
+        # exported so image worker processes see it too
+        os.environ[ASSET_CACHE_ENV] = args.asset_cache
+    if args.image_packs:
+        os.environ[IMAGE_PACKS_ENV] = args.image_packs
+    if args.endpoints:
+        os.environ[ENDPOINTS_ENV] = args.endpoints
+    if args.request_timeout:
+        os.environ[REQUEST_TIMEOUT_ENV] = str(args.request_timeout)
+    if args.hedge_max_rate:
+        os.environ[HEDGE_RATE_ENV] = str(args.hedge_max_rate)
+    if args.stream_verdicts:
+        os.environ[STREAM_ENV] = "1"
+
+    preservation_thresholds = load_thresholds(args.preservation_thresholds)
 
     metric_prompts = _parse_prompts(args.prompt)
-    metric_specs = build_metric_specs(metric_prompts)
+    registry = lazy_module(f"{__package__}.metrics.registry")
+    metric_specs = registry.build_metric_specs(
+        metric_prompts, task_name=args.task_name, judge_models=judge_models(), check_provenance=not args.keep_stale
+    )
+    queue = JobQueue(args.queue) if args.queue else None
+
+    if args.queue_action == "work":
+        image_service = ImagePrepService(args.image_workers) if args.image_workers > 0 else None
+        run_queue_worker(
+            queue,
+            metric_specs,
+            task_name=args.task_name,
+            worker_id=args.worker_id or f"{socket.gethostname()}-{os.getpid()}",
+            lease_s=args.lease_s,
+            message_layout=args.message_layout,
+            image_service=image_service,
+            prescreen=args.prescreen,
+            preservation_check=args.preservation_check,
+            preservation_thresholds=preservation_thresholds,
+        )
+        if image_service is not None:
+            image_service.close()
+        queue.close()
+        if report_startup:
+            print(startup_report(_IMPORT_S))
+        return
 
     result_files: List[str] = []
     if args.result_json:
         result_files.extend(args.result_json)
     elif args.results_root:
-        for fn in os.listdir(args.results_root):
-            if fn.endswith(".json"):
-                result_files.append(os.path.join(args.results_root, fn))
+        found, skipped = discover_result_files(args.results_root, args.results_pattern or DEFAULT_PATTERNS)
+        report_discovery(args.results_root, found, skipped)
+        result_files.extend(found)
     else:
         raise ValueError("Provide --result_json (one or many) or --results_root")
 
-    for p in result_files:
+    if args.preflight != "off":
+        report = run_preflight(
+            [args.task_name], {args.task_name: result_files}, args.gen_prefix, metric_specs,
+            repeat=max(1, int(args.repeat)), resume=args.repeat_resume, prune=prune,
+        )
+        report.print(args.task_name)
+        if args.preflight == "require" and not report.ok:
+            raise ValueError(f"Preflight found {report.count('error')} error(s); fix them or run with --preflight report")
+
+    result_files = list(dict.fromkeys(result_files))
+    summary_names_by_file = summary_names(result_files, args.task_name)
+    renamed = [p for p in result_files if summary_names_by_file[p] != args.task_name]
+    if renamed:
+        print(f"[DISCOVER] {len(renamed)} result files share a directory with another; "
+              f"their summaries are written as <result file stem>_summary*.json")
+
+    image_service = ImagePrepService(args.image_workers) if args.image_workers > 0 else None
+
+    def _process_file(p: str) -> None:
         print(f"Processing result json: {p}")
 
         repeat_n = max(1, int(args.repeat))
@@ -305,13 +1069,97 @@ def main():
         with open(p, "r", encoding="utf-8") as f:
             base_data = json.load(f)
 
+        problems = check_slot_values({spec.name: spec.template for spec in metric_specs}, base_data)
+        if problems:
+            raise ValueError(f"Prompt template check failed for {p}:\n  " + "\n  ".join(problems))
+
         run_summaries: List[Dict[str, Any]] = []
+        summary_name = summary_names_by_file[p]
+
+        if args.adaptive_budget is not None:
+            agg = run_adaptive_repeats(
+                p, base_data, metric_specs, args.task_name, repeat_n, args.adaptive_budget, args.adaptive_pilot,
+                args.adaptive_prior, args.repeat_resume,
+                summary_name=summary_name,
+                gen_prefix=args.gen_prefix,
+                message_layout=args.message_layout,
+                image_service=image_service,
+                price_input_per_m=args.price_input_per_m,
+                price_output_per_m=args.price_output_per_m,
+                schedule=args.schedule,
+                prune=prune,
+                prescreen=args.prescreen,
+                preservation_check=args.preservation_check,
+                preservation_thresholds=preservation_thresholds,
+            )
+            final_summary_path = _summary_path(p, summary_name)
+            write_json(final_summary_path, agg)
+            print(f"[DONE] Wrote adaptive summary: {final_summary_path}")
+            return
 
         for i in range(1, repeat_n + 1):
             run_json_path = _add_suffix_json(p, i)  # source_i.json
-            run_summary_path = os.path.join(os.path.dirname(run_json_path), f"{args.task_name}_summary_{i}.json")
+            run_summary_path = _summary_path(run_json_path, summary_name, i)
 
-            if args.repeat_resume:
+            if args.plan_only:
+                resume = args.repeat_resume and os.path.exists(run_json_path)
+                plan_data = records_from_json(read_json(run_json_path)) if resume else base_data
+                run_specs, plan = _scheduled_plan(plan_data, metric_specs, not args.repeat_resume,
+                                                  args.schedule, prune)
+                plan.report(
+                    os.path.basename(run_json_path), run_specs, args.price_input_per_m, args.price_output_per_m
+                )
+                continue
+
+            if shard is not None or args.merge_shards or queue is not None:
+                # Shards, queued runs and their merges all plan from the same input:
+                # the existing run file when resuming, the base file otherwise.
+                input_json_path = run_json_path if args.repeat_resume and os.path.exists(run_json_path) else p
+                journal_dir = args.journal_dir or os.path.join(os.path.dirname(run_json_path), "shards")
+                if args.queue_action == "enqueue":
+                    enqueue_run(queue, input_json_path, run_json_path, i, metric_specs, args.gen_prefix,
+                                args.task_name, rerun=not args.repeat_resume, schedule=args.schedule, prune=prune)
+                    continue
+                if args.queue_action == "merge":
+                    merge_queue_run(queue, input_json_path, run_json_path, metric_specs, args.task_name,
+                                    rerun=not args.repeat_resume, summary_name=summary_name)
+                elif shard is not None:
+                    process_shard(
+                        input_json_path=input_json_path,
+                        run_json_path=run_json_path,
+                        journal_dir=journal_dir,
+                        shard=shard,
+                        repeat_idx=i,
+                        metric_specs=metric_specs,
+                        gen_prefix=args.gen_prefix,
+                        task_name=args.task_name,
+                        rerun=not args.repeat_resume,
+                        message_layout=args.message_layout,
+                        image_service=image_service,
+                        price_input_per_m=args.price_input_per_m,
+                        price_output_per_m=args.price_output_per_m,
+                        schedule=args.schedule,
+                        prune=prune,
+                        prescreen=args.prescreen,
+                        preservation_check=args.preservation_check,
+                        preservation_thresholds=preservation_thresholds,
+                    )
+                    continue
+                else:
+                    merge_shard_journals(
+                        input_json_path=input_json_path,
+                        run_json_path=run_json_path,
+                        journal_dir=journal_dir,
+                        num_shards=args.merge_shards,
+                        repeat_idx=i,
+                        metric_specs=metric_specs,
+                        task_name=args.task_name,
+                        rerun=not args.repeat_resume,
+                        schedule=args.schedule,
+                        prune=prune,
+                        summary_name=summary_name,
+                    )
+            elif args.repeat_resume:
                 if not os.path.exists(run_json_path):
                     with open(run_json_path, "w", encoding="utf-8") as f:
                         json.dump(base_data, f, ensure_ascii=False, indent=2)
@@ -321,14 +1169,25 @@ def main():
                     json.dump(base_data, f, ensure_ascii=False, indent=2)
                 rerun_flag = True
 
-            process_one_result_json(
-                result_json_path=run_json_path,
-                metric_specs=metric_specs,
-                gen_prefix=args.gen_prefix,
-                task_name=args.task_name,
-                rerun=rerun_flag,
-            )
-            default_summary_path = os.path.join(os.path.dirname(run_json_path), f"{args.task_name}_summary.json")
+            if not args.merge_shards and queue is None:
+                process_one_result_json(
+                    result_json_path=run_json_path,
+                    metric_specs=metric_specs,
+                    gen_prefix=args.gen_prefix,
+                    task_name=args.task_name,
+                    rerun=rerun_flag,
+                    message_layout=args.message_layout,
+                    image_service=image_service,
+                    price_input_per_m=args.price_input_per_m,
+                    price_output_per_m=args.price_output_per_m,
+                    schedule=args.schedule,
+                    prune=prune,
+                    prescreen=args.prescreen,
+                    preservation_check=args.preservation_check,
+                    preservation_thresholds=preservation_thresholds,
+                    summary_name=summary_name,
+                )
+            default_summary_path = _summary_path(run_json_path, summary_name)
             if os.path.exists(default_summary_path):
                 shutil.move(default_summary_path, run_summary_path)
             else:
@@ -338,13 +1197,32 @@ def main():
             with open(run_summary_path, "r", encoding="utf-8") as f:
                 run_summaries.append(json.load(f))
 
-        final_summary_path = os.path.join(os.path.dirname(p), f"{args.task_name}_summary.json")
+        if args.plan_only or shard is not None or args.queue_action == "enqueue":
+            return
+
+        final_summary_path = _summary_path(p, summary_name)
         agg = aggregate_run_summaries(run_summaries)
         with open(final_summary_path, "w", encoding="utf-8") as f:
             json.dump(agg, f, ensure_ascii=False, indent=2)
 
         print(f"[DONE] Wrote aggregated summary: {final_summary_path}")
 
+    if args.file_workers > 1 and len(result_files) > 1:
+        # threads of one process share the judge client, endpoint pool (rate limits) and image workers
+        with ThreadPoolExecutor(max_workers=min(args.file_workers, len(result_files))) as ex:
+            for fut in [ex.submit(_process_file, p) for p in result_files]:
+                fut.result()
+    else:
+        for p in result_files:
+            _process_file(p)
+
+    if image_service is not None:
+        image_service.close()
+    if queue is not None:
+        queue.close()
+    if report_startup:
+        print(startup_report(_IMPORT_S))
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,127 @@
+"""Static sharding of judge work across processes / machines.
+
+Every (task, id, metric, repeat) pair is owned by exactly one of N shards,
+chosen by a stable hash, so any host computes the same partition without
+coordination. Visual_Coherence is hashed with its item's Instruction_Adherence
+key, keeping the gating dependency inside one shard; with pruning (which needs
+all of an item's metrics) the whole item is hashed as one key.
+
+A shard never writes the canonical *_results_i.json. It appends one journal
+line per finished pair to
+
+    {journal_dir}/{run file stem}.shard-{i}-of-{N}.jsonl
+
+and `run_eval --merge_shards N` replays all journals onto the run's input file
+after checking that they cover the plan exactly once.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .planner import IA_METRIC, VC_METRIC
+
+JOURNAL_META = "_meta"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' (0-based i) -> (i, N)."""
+    try:
+        i_s, n_s = spec.split("/", 1)
+        i, n = int(i_s), int(n_s)
+    except ValueError:
+        raise ValueError(f"Invalid --shard {spec!r}. Use i/N, e.g. 0/4.")
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"Invalid --shard {spec!r}: need 0 <= i < N.")
+    return i, n
+
+
+def shard_of(task_name: str, sample_id: str, metric_name: str, repeat: int, num_shards: int,
+             metric_names: Iterable[str] = (), whole_item: bool = False) -> int:
+    if whole_item:
+        metric_name = "*"
+    elif metric_name == VC_METRIC and IA_METRIC in metric_names:
+        metric_name = IA_METRIC
+    key = f"{task_name}\x1f{sample_id}\x1f{metric_name}\x1f{repeat}".encode("utf-8")
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % num_shards
+
+
+def journal_path(journal_dir: str, run_json_path: str, shard: int, num_shards: int) -> str:
+    stem = os.path.splitext(os.path.basename(run_json_path))[0]
+    return os.path.join(journal_dir, f"{stem}.shard-{shard}-of-{num_shards}.jsonl")
+
+
+class JournalWriter:
+    """Append-only JSONL; each line is flushed and fsync'ed before returning."""
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8")
+        if fresh:
+            self._write({JOURNAL_META: meta})
+
+    def _write(self, obj: Dict[str, Any]) -> None:
+        self._f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def record(self, sample_id: str, metric_name: str, kind: str, value: Any) -> None:
+        self._write({"id": sample_id, "metric": metric_name, "kind": kind, "value": value})
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def read_journal(path: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(meta, records). A torn last line (killed writer) is ignored."""
+    meta: Optional[Dict[str, Any]] = None
+    records: List[Dict[str, Any]] = []
+    if not os.path.exists(path):
+        return None, records
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    for n, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            if n >= len(lines) - 2:
+                print(f"[WARN] Ignoring truncated last line of {path}")
+                continue
+            raise ValueError(f"Corrupt journal line {n + 1} in {path}")
+        if JOURNAL_META in obj:
+            meta = obj[JOURNAL_META]
+        else:
+            records.append(obj)
+    return meta, records
+
+
+def check_coverage(
+    expected: Dict[Tuple[str, str], int],
+    journals: Dict[int, List[Dict[str, Any]]],
+) -> List[str]:
+    """
+    expected: (id, metric) -> owning shard, for every planned pair.
+    journals: shard -> its records. Returns problem strings (empty = exact cover).
+    """
+    problems: List[str] = []
+    seen: Dict[Tuple[str, str], int] = {}
+    for shard, records in sorted(journals.items()):
+        for rec in records:
+            key = (str(rec.get("id")), str(rec.get("metric")))
+            if key not in expected:
+                problems.append(f"shard {shard}: {key} is not in the plan (input file changed?)")
+            elif expected[key] != shard:
+                problems.append(f"shard {shard}: {key} belongs to shard {expected[key]}")
+            if key in seen:
+                problems.append(f"{key} recorded by shard {seen[key]} and shard {shard}")
+            seen[key] = shard
+    missing = [k for k in expected if k not in seen]
+    if missing:
+        head = ", ".join(str(k) for k in missing[:5])
+        problems.append(f"{len(missing)} planned pairs have no journal record (e.g. {head})")
+    return problems
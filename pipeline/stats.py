@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+def usage_to_dict(usage: Any) -> Dict[str, int]:
+    """Extract token counts from a chat.completions `usage` object (or dict)."""
+    if usage is None:
+        return {}
+
+    def _get(obj: Any, key: str) -> Any:
+        if isinstance(obj, dict):
+            return obj.get(key)
+        return getattr(obj, key, None)
+
+    details = _get(usage, "prompt_tokens_details")
+    return {
+        "prompt_tokens": int(_get(usage, "prompt_tokens") or 0),
+        "completion_tokens": int(_get(usage, "completion_tokens") or 0),
+        "cached_tokens": int((_get(details, "cached_tokens") if details is not None else 0) or 0),
+    }
+
+
+def _percentile(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+@dataclass
+class CallStats:
+    """Per-task accounting of judge API calls."""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latencies: List[float] = field(default_factory=list)
+    endpoints: Dict[str, int] = field(default_factory=dict)
+    hedged: List[Dict[str, Any]] = field(default_factory=list)   # api_calls entries of hedged races
+    stream_outcomes: Dict[str, int] = field(default_factory=dict)
+    stream_saved_s: float = 0.0
+
+    def add(self, usage: Optional[Dict[str, int]], latency_s: Optional[float], endpoint: Optional[str] = None) -> None:
+        self.calls += 1
+        if endpoint is not None:
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+        if usage:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cached_tokens += usage.get("cached_tokens", 0)
+        if latency_s is not None:
+            self.latencies.append(float(latency_s))
+
+    def merge_eval_out(self, eval_out: Dict[str, Any]) -> None:
+        for call in eval_out.get("api_calls", []):
+            self.add(call.get("usage"), call.get("latency_s"), call.get("endpoint"))
+            if call.get("hedged"):
+                self.hedged.append(call)
+            stream = call.get("stream")
+            if stream:
+                self.stream_outcomes[stream["outcome"]] = self.stream_outcomes.get(stream["outcome"], 0) + 1
+                self.stream_saved_s += stream.get("saved_s_est") or 0.0
+
+    def unhedged_latencies(self) -> List[float]:
+        """Latencies had every request waited for its original attempt (a lower bound where it never answered)."""
+        lat = list(self.latencies)
+        for call in self.hedged:
+            lat.remove(call["latency_s"])
+            lat.append(call.get("primary_latency_s", call["latency_s"]))
+        return sorted(lat)
+
+    def summary(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None,
+            "completion_tokens": self.completion_tokens,
+            "latency_mean_s": round(sum(lat) / len(lat), 3) if lat else None,
+            "latency_p50_s": _percentile(lat, 0.50),
+            "latency_p95_s": _percentile(lat, 0.95),
+            "endpoints": dict(sorted(self.endpoints.items())),
+            "hedges": len(self.hedged),
+            "hedge_rate": round(len(self.hedged) / self.calls, 4) if self.calls else None,
+            "hedge_wins": sum(1 for call in self.hedged if call.get("hedge_won")),
+            "latency_p95_unhedged_s": _percentile(self.unhedged_latencies(), 0.95) if self.hedged else None,
+            "stream_outcomes": dict(sorted(self.stream_outcomes.items())),
+            "stream_saved_s_est": round(self.stream_saved_s, 3),
+        }
+
+    def report(self, label: str) -> None:
+        s = self.summary()
+        print(
+            f"[USAGE] {label}: calls={s['calls']} prompt_tokens={s['prompt_tokens']} "
+            f"cached_tokens={s['cached_tokens']} (ratio={s['cached_ratio']}) "
+            f"completion_tokens={s['completion_tokens']} "
+            f"latency mean={s['latency_mean_s']}s p50={s['latency_p50_s']}s p95={s['latency_p95_s']}s"
+            + ("" if not s["endpoints"] else " endpoints=" + ",".join(f"{k}:{v}" for k, v in s["endpoints"].items()))
+            + ("" if not s["hedges"] else f" hedged={s['hedges']} (rate={s['hedge_rate']}, won={s['hedge_wins']}) "
+                                         f"p95 without hedging={s['latency_p95_unhedged_s']}s")
+            + ("" if not s["stream_outcomes"] else " streams=" + ",".join(
+                f"{k}:{v}" for k, v in s["stream_outcomes"].items()) + f" saved~{s['stream_saved_s_est']}s")
+        )
@@ -0,0 +1,188 @@
+"""Streamed judge responses, closed as soon as the verdict JSON is complete.
+
+    run_eval ... --stream_verdicts
+
+The response is read chunk by chunk and scanned for top-level JSON objects
+(string- and escape-aware, so braces in the analysis text outside an object are
+skipped). When an object closes and the metric's parse_fn accepts it, the stream
+is closed and the rest of the judge's text is never generated or read. The
+verdict is the first complete object that parses, which is the object the full
+text would have been parsed from (the first ```json block) in the usual layout.
+
+The stream is abandoned early as a failure, so the retry starts sooner, when
+    - a ```json fence is followed by something other than "{",
+    - the object inside a ```json fence closes and does not parse (parse_fn
+      would read that same block from the full text),
+    - MAX_STREAM_CHARS arrive without a verdict.
+
+Time saved is estimated per metric: every CALIBRATE_EVERY-th stream (and the
+first) is read to the end, and the time it spent after its verdict is the
+estimate for the streams that were closed early.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .stats import usage_to_dict
+
+STREAM_ENV = "VIBE_STREAM_VERDICTS"
+
+MAX_STREAM_CHARS = 40000
+CALIBRATE_EVERY = 20
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*$", re.IGNORECASE)
+_OPEN_FENCE_RE = re.compile(r"```json\s*(\S)", re.IGNORECASE)
+
+
+def streaming_enabled() -> bool:
+    return os.environ.get(STREAM_ENV, "") not in ("", "0")
+
+
+class JsonObjectScanner:
+    """Incrementally finds the spans of top-level {...} objects in a growing text."""
+
+    def __init__(self) -> None:
+        self.pos = 0
+        self.depth = 0
+        self.start = -1
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str) -> List[Tuple[int, int]]:
+        """Scan text[self.pos:] (text is everything received so far); returns newly closed (start, end) spans."""
+        spans: List[Tuple[int, int]] = []
+        for k in range(self.pos, len(text)):
+            ch = text[k]
+            if self.depth == 0:
+                if ch == "{":
+                    self.depth, self.start = 1, k
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    spans.append((self.start, k + 1))
+        self.pos = len(text)
+        return spans
+
+
+class _TailTracker:
+    """Per metric: seconds that fully read streams spent after their verdict."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._n: Dict[str, int] = defaultdict(int)
+        self._tails: Dict[str, List[float]] = defaultdict(list)
+
+    def read_to_end(self, key: str) -> bool:
+        with self._lock:
+            self._n[key] += 1
+            return (self._n[key] - 1) % CALIBRATE_EVERY == 0
+
+    def add(self, key: str, tail_s: float) -> None:
+        with self._lock:
+            self._tails[key].append(tail_s)
+
+    def estimate(self, key: str) -> Optional[float]:
+        with self._lock:
+            tails = self._tails.get(key)
+            return sum(tails) / len(tails) if tails else None
+
+
+_tails = _TailTracker()
+
+
+def read_verdict_stream(
+    stream: Any,
+    parse_fn: Optional[Callable[[str], Any]],
+    key: str,
+    t0: float,
+) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Consume a chat.completions chunk stream started at perf_counter() `t0`.
+    Returns (text received, text to parse, stream info for the api_calls entry).
+    """
+    read_all = parse_fn is None or _tails.read_to_end(key)
+    scanner = JsonObjectScanner()
+    text = ""
+    verdict: Optional[str] = None
+    verdict_s: Optional[float] = None
+    ttft_s: Optional[float] = None
+    usage: Dict[str, int] = {}
+    outcome = "complete"
+    fence_checked = False
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = usage_to_dict(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            if ttft_s is None:
+                ttft_s = time.perf_counter() - t0
+            text += delta
+            if verdict is not None:
+                continue
+
+            if not fence_checked:
+                m = _OPEN_FENCE_RE.search(text)
+                if m:
+                    fence_checked = True
+                    if m.group(1) != "{":
+                        outcome = "fail_fast"
+                        break
+            for s, e in scanner.feed(text):
+                candidate = text[s:e]
+                payload, _, err = parse_fn(candidate) if parse_fn is not None else (None, None, "no parse_fn")
+                if err is None and isinstance(payload, dict):
+                    verdict, verdict_s = candidate, time.perf_counter() - t0
+                    break
+                if _FENCE_RE.search(text[:s]):
+                    outcome = "fail_fast"
+                    break
+            if outcome == "fail_fast":
+                break
+            if verdict is not None and not read_all:
+                outcome = "early"
+                break
+            if verdict is None and len(text) > MAX_STREAM_CHARS:
+                outcome = "fail_fast"
+                break
+    except BaseException:
+        stream.close()
+        raise
+    if outcome != "complete":
+        stream.close()
+
+    info: Dict[str, Any] = {
+        "latency_s": round(time.perf_counter() - t0, 3),
+        "usage": usage,
+        "stream": {
+            "outcome": outcome,
+            "ttft_s": round(ttft_s, 3) if ttft_s is not None else None,
+            "verdict_s": round(verdict_s, 3) if verdict_s is not None else None,
+            "chars": len(text),
+        },
+    }
+    if outcome == "complete" and verdict_s is not None:
+        _tails.add(key, time.perf_counter() - t0 - verdict_s)
+    elif outcome == "early":
+        saved = _tails.estimate(key)
+        info["stream"]["saved_s_est"] = round(saved, 3) if saved is not None else None
+    return text, verdict if verdict is not None else text, info
@@ -0,0 +1,176 @@
+"""Long-lived run_eval worker: one interpreter for a sweep of tasks.
+
+    python -m pipeline.worker                          # jobs on stdin, replies on stdout
+    python -m pipeline.worker --socket /tmp/vibe.sock  # jobs over a local unix socket
+
+A job is one JSON line, {"args": [...run_eval arguments...]}, optionally with
+"id" (echoed back), "cwd" (directory to run in) and "env" (variables set for
+this job only). Each job gets one JSON reply line:
+
+    {"id": ..., "ok": true, "elapsed_s": 12.3}
+    {"id": ..., "ok": false, "elapsed_s": 0.1, "error": "ValueError: ..."}
+
+Jobs run one at a time, exactly as `python -m pipeline.run_eval <args>` would,
+but the interpreter, the imported modules, the judge clients (with their open
+connections), the endpoint pool and the cached annotation/asset indexes are
+kept between jobs. Environment variables a job sets (its "env" or run_eval
+flags such as --endpoints) are undone after the job. In stdin mode the jobs'
+own output goes to stderr so stdout carries only replies.
+
+From a shell script, submit to a socket worker with
+
+    python -m pipeline.worker --socket /tmp/vibe.sock --submit -- --task_name ... --prompt ...
+
+which sends the current directory as "cwd", prints the reply and exits
+non-zero when the job failed.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from .lazy import startup_report
+
+
+@contextlib.contextmanager
+def _job_scope(cwd: Optional[str], env: Dict[str, str]) -> Iterator[None]:
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    try:
+        os.environ.update({str(k): str(v) for k, v in env.items()})
+        if cwd:
+            os.chdir(cwd)
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one job; returns its reply."""
+    from . import run_eval
+
+    reply: Dict[str, Any] = {"id": job.get("id")}
+    t0 = time.perf_counter()
+    try:
+        args = job.get("args")
+        if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+            raise ValueError('Job needs "args": a list of run_eval arguments')
+        with _job_scope(job.get("cwd"), job.get("env") or {}):
+            run_eval.main(args, report_startup=False)
+        reply["ok"] = True
+    except SystemExit as e:
+        # argparse errors and --help
+        reply["ok"] = e.code in (0, None)
+        if not reply["ok"]:
+            reply["error"] = f"run_eval exited with status {e.code}"
+    except Exception as e:
+        reply["ok"] = False
+        reply["error"] = f"{type(e).__name__}: {e}"
+    reply["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    return reply
+
+
+class _Worker:
+    def __init__(self, log: TextIO):
+        # imported here rather than at module level so that --submit starts quickly
+        from . import run_eval
+
+        self.import_s = run_eval._IMPORT_S
+        self.log = log
+        self.jobs = 0
+
+    def handle(self, line: str) -> Dict[str, Any]:
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("a job is a JSON object")
+        except ValueError as e:
+            return {"id": None, "ok": False, "elapsed_s": 0.0, "error": f"Bad job line: {e}"}
+        with contextlib.redirect_stdout(self.log):
+            reply = run_job(job)
+            self.jobs += 1
+            status = "done" if reply["ok"] else f"failed ({reply['error']})"
+            print(f"[WORKER] job {self.jobs} {status} in {reply['elapsed_s']:.1f}s")
+            if self.jobs == 1:
+                print(startup_report(self.import_s))
+        return reply
+
+
+def serve_stdin() -> None:
+    worker = _Worker(log=sys.stderr)
+    print(f"[WORKER] reading jobs from stdin (pid {os.getpid()})", file=sys.stderr)
+    for line in sys.stdin:
+        if line.strip():
+            sys.stdout.write(json.dumps(worker.handle(line), ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+
+def serve_socket(path: str) -> None:
+    if os.path.exists(path):
+        os.unlink(path)
+    worker = _Worker(log=sys.stdout)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(16)
+    print(f"[WORKER] listening on {path} (pid {os.getpid()})")
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile("rw", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        f.write(json.dumps(worker.handle(line), ensure_ascii=False) + "\n")
+                        f.flush()
+    finally:
+        server.close()
+        os.unlink(path)
+
+
+def submit(path: str, args: List[str]) -> int:
+    """Send one job to a socket worker and wait for its reply; returns an exit status."""
+    job = {"args": args, "cwd": os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(path)
+        with conn.makefile("rw", encoding="utf-8") as f:
+            f.write(json.dumps(job, ensure_ascii=False) + "\n")
+            f.flush()
+            conn.shutdown(socket.SHUT_WR)
+            line = f.readline()
+    if not line:
+        print(f"[WARN] Worker at {path} closed the connection without a reply")
+        return 1
+    reply = json.loads(line)
+    print(json.dumps(reply, ensure_ascii=False))
+    return 0 if reply.get("ok") else 1
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Run successive run_eval jobs in one long-lived process.")
+    ap.add_argument("--socket", default=None, help="Unix socket path to serve on (default: jobs on stdin).")
+    ap.add_argument("--submit", action="store_true",
+                    help="Send the run_eval arguments after `--` to the worker on --socket and wait.")
+    ap.add_argument("run_eval_args", nargs=argparse.REMAINDER, help="With --submit: -- <run_eval arguments>.")
+    args = ap.parse_args()
+
+    if args.submit:
+        if not args.socket:
+            raise ValueError("--submit needs --socket")
+        rest = args.run_eval_args[1:] if args.run_eval_args[:1] == ["--"] else args.run_eval_args
+        sys.exit(submit(args.socket, rest))
+    if args.run_eval_args:
+        raise ValueError("run_eval arguments are only taken with --submit; send jobs to the worker instead")
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        serve_stdin()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+from pipeline import config
+from pipeline.mock_server import start_mock_server
+
+REPO = Path(__file__).resolve().parents[1]
+PROMPTS = [
+    f"Instruction_Adherence={REPO / 'prompt' / 'Instruction_Adherence.txt'}",
+    f"Contextual_Preservation={REPO / 'prompt' / 'Contextual_Preservation.txt'}",
+    f"Visual_Coherence={REPO / 'prompt' / 'Visual_Coherence.txt'}",
+]
+N_ITEMS = 8
+
+
+@pytest.fixture
+def mock_judge(monkeypatch):
+    """pipeline.mock_server on a free port, with the client pointed at it."""
+    srv, base_url = start_mock_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def addition_task(tmp_path, monkeypatch):
+    """
+    A synthetic Addition task: annotations, sources, layers and generated images
+    under tmp_path/dataset. Returns a function copying the base result file into a
+    new run directory (returns the result json path) and the generated-image prefix.
+    """
+    ds = tmp_path / "dataset"
+    for sub in ("src", "layers", "gen/imgs"):
+        (ds / sub).mkdir(parents=True)
+    annotations, results = [], []
+    for i in range(N_ITEMS):
+        src = Image.new("RGB", (96, 64), (30 * i, 90, 40))
+        src.save(ds / "src" / f"{i}.jpg")
+        layer = Image.new("RGBA", (96, 64), (0, 0, 0, 0))
+        ImageDraw.Draw(layer).rectangle((10, 10, 30, 30), outline=(255, 0, 0, 255))
+        layer.save(ds / "layers" / f"{i}.png")
+        gen = src.copy()
+        ImageDraw.Draw(gen).ellipse((12, 12, 28, 28), fill=(0, 200, 0))
+        gen.save(ds / "gen" / "imgs" / f"{i}.png")
+        annotations.append({"id": f"A_{i}", "file_paths": {"source": f"src/{i}.jpg", "visual_instruction": f"layers/{i}.png"},
+                            "text_prompt": {"input_prompt": "add a ball"}})
+        results.append({"id": f"A_{i}", "status": "success", "saved_image_path": f"imgs/{i}.png",
+                        "input_prompt": "add a ball"})
+    (ds / "Addition.json").write_text(json.dumps(annotations))
+    (ds / "Addition_results.json").write_text(json.dumps(results))
+    monkeypatch.setitem(config.TASK_CONFIG, "Addition",
+                        {"json_path": str(ds / "Addition.json"), "task_dir": str(ds), "image_root": str(ds)})
+
+    def new_run(name: str) -> str:
+        run_dir = tmp_path / name
+        run_dir.mkdir()
+        return str(shutil.copy(ds / "Addition_results.json", run_dir / "Addition_results.json"))
+
+    return new_run, str(ds / "gen")
+
+
+def run_files(result_json: str):
+    """{file name: bytes} of the run files and summaries next to a result json."""
+    return {p.name: p.read_bytes() for p in sorted(Path(result_json).parent.glob("*.json"))}
@@ -0,0 +1,14 @@
+from pipeline.discovery import SKIP_REPEAT_COPY, SKIP_SUMMARY, skip_reason
+
+
+def test_derived_files_are_skipped():
+    names = {"A.json", "A_1.json", "A_pass_2.json", "A_summary.json", "A_summary_pass_2.json",
+             "foo_pass.json", "foo_pass_1.json", "B_pass_2.json"}
+    assert skip_reason("A.json", names) is None
+    assert skip_reason("A_1.json", names) == SKIP_REPEAT_COPY
+    assert skip_reason("A_pass_2.json", names) == SKIP_REPEAT_COPY
+    assert skip_reason("A_summary_pass_2.json", names) == SKIP_SUMMARY
+    # a repeat copy of a result file whose own name ends in _pass
+    assert skip_reason("foo_pass_1.json", names) == SKIP_REPEAT_COPY
+    # no B.json next to it: a result file in its own right
+    assert skip_reason("B_pass_2.json", names) is None
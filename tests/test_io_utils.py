@@ -0,0 +1,40 @@
+from PIL import Image
+
+from pipeline.io_utils import load_image, merge_source_and_layer
+
+
+def _palette_layer(path, size=(800, 600)):
+    """Palette PNG: index 0 transparent, a red box (index 1) in the top-left quarter."""
+    layer = Image.new("P", size, 0)
+    layer.putpalette([0, 0, 0, 255, 0, 0] + [0, 0, 0] * 254)
+    layer.paste(1, (0, 0, size[0] // 2, size[1] // 2))
+    layer.save(path, transparency=0)
+
+
+def test_merge_with_larger_palette_layer(tmp_path):
+    source = tmp_path / "source.png"
+    layer = tmp_path / "layer.png"
+    Image.new("RGB", (400, 300), (10, 200, 30)).save(source)
+    _palette_layer(layer)
+
+    merged = merge_source_and_layer(str(source), str(layer))
+
+    assert merged.mode == "RGBA" and merged.size == (400, 300)
+    assert merged.getpixel((50, 50)) == (255, 0, 0, 255)
+    # transparent palette entries leave the source untouched
+    assert merged.getpixel((350, 250)) == (10, 200, 30, 255)
+
+
+def test_reduced_decode_of_modes_reduce_rejects(tmp_path):
+    for mode in ("P", "1", "I;16"):
+        path = tmp_path / f"{mode.replace(';', '_')}.png"
+        Image.new(mode, (1024, 1024)).save(path)
+        im = load_image(str(path), target_size=(256, 256))
+        assert im.mode == "RGB" and im.size == (256, 256)
+
+    path = tmp_path / "palette_alpha.png"
+    _palette_layer(path, size=(1024, 1024))
+    im = load_image(str(path), target_size=(256, 256))
+    assert im.mode == "RGBA" and im.size == (256, 256)
+    assert im.getpixel((10, 10)) == (255, 0, 0, 255)
+    assert im.getpixel((200, 200))[3] == 0
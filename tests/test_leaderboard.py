@@ -0,0 +1,37 @@
+from pipeline.io_utils import write_json
+from pipeline.leaderboard import OVERALL, build_store, iter_item_scores, load_store, task_scores
+
+
+def test_sub_metrics_survive_unparseable_metric_score():
+    item = {
+        "id": "0", "status": "success", "score": 0.5,
+        "Visual_Coherence": {"score": "n/a", "Style_Consistency": {"score": 1}, "Visual_Seamlessness": {"score": 0}},
+    }
+    assert sorted(iter_item_scores(item)) == [
+        ("Visual_Coherence/Style_Consistency", 1.0),
+        ("Visual_Coherence/Visual_Seamlessness", 0.0),
+        (OVERALL, 0.5),
+    ]
+
+
+def _write(path, scores):
+    write_json(str(path), [{"id": sid, "status": "success", "score": s} for sid, s in scores.items()])
+
+
+def test_adaptive_passes_are_weighted_per_item(tmp_path):
+    adaptive = tmp_path / "results" / "m" / "L1" / "Addition"
+    repeated = tmp_path / "results" / "m" / "L1" / "Removal"
+    adaptive.mkdir(parents=True)
+    repeated.mkdir(parents=True)
+    _write(adaptive / "Addition_results_1.json", {"a": 1.0, "b": 1.0, "c": 0.0})
+    _write(adaptive / "Addition_results_pass_2.json", {"a": 0.0})
+    # left over from an earlier --repeat run in the same directory
+    _write(adaptive / "Addition_results_2.json", {"a": 0.0, "b": 0.0, "c": 0.0})
+    _write(repeated / "Removal_results_1.json", {"a": 1.0, "b": 1.0, "c": 0.0})
+    _write(repeated / "Removal_results_2.json", {"a": 0.0})
+
+    build_store(str(tmp_path / "results"), str(tmp_path / "store"))
+    scores = task_scores(load_store(str(tmp_path / "store")))
+    # item means 0.5, 1, 0 (as aggregate_adaptive) vs repeat means 2/3 and 0
+    assert scores[("m", "L1", "Addition")] == 50.0
+    assert scores[("m", "L1", "Removal")] == 33.33
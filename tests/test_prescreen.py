@@ -0,0 +1,43 @@
+import pytest
+from PIL import Image
+
+from pipeline import prescreen
+from pipeline.prescreen import MISSING, UNREADABLE, prescreen_payload, screen_generation
+from pipeline.records import collect_score_columns, summarize_columns
+
+
+def test_palette_generation_is_judged(tmp_path):
+    path = tmp_path / "gen.png"
+    im = Image.new("P", (1024, 1024), 0)
+    im.putpalette([0, 0, 0, 255, 0, 0, 0, 0, 255] + [0, 0, 0] * 253)
+    im.paste(1, (0, 0, 512, 512))
+    im.paste(2, (512, 0, 1024, 512))
+    im.save(path, transparency=0)
+    assert screen_generation(str(path)) is None
+
+
+def test_only_decode_errors_are_unreadable(tmp_path, monkeypatch):
+    path = tmp_path / "gen.png"
+    path.write_bytes(b"not an image")
+    assert screen_generation(str(path)) == UNREADABLE
+
+    def broken(*args, **kwargs):
+        raise ValueError("bug")
+
+    monkeypatch.setattr(prescreen, "load_image", broken)
+    with pytest.raises(ValueError):
+        screen_generation(str(path))
+
+
+def test_prescreened_items_count_in_sub_metric_means():
+    metric = "Wind_Contextual_Preservation"
+    judged = {"Wind-Identity_Preservation": {"reason": "r", "score": 1.0},
+              "Wind-Other_Preservation": {"reason": "r", "score": 1.0}, "score": 1.0}
+    items = [
+        {"id": "0", "status": "success", metric: judged},
+        {"id": "1", "status": "success", metric: prescreen_payload(metric, MISSING)},
+    ]
+    summary = summarize_columns(collect_score_columns(items, [metric]), [metric])
+    assert summary[metric] == 50.0
+    assert summary[f"{metric}/Wind-Identity_Preservation"] == 50.0
+    assert summary[f"{metric}/Wind-Other_Preservation"] == 50.0
@@ -0,0 +1,30 @@
+from pipeline.preservation import (
+    DECIDED_KEY,
+    PreservationThresholds,
+    _judge_score,
+    agreement_report,
+    can_decide,
+)
+
+KEEP = {"aligned": True, "n_blocks": 100, "outside": 0.8, "changed": 0.0, "mad": 0.01}
+CHANGE = {"aligned": True, "n_blocks": 100, "outside": 0.8, "changed": 0.44, "mad": 0.2}
+
+
+def test_only_region_bound_tasks_are_decided():
+    assert can_decide("Addition", "Contextual_Preservation")
+    assert can_decide("Draft_Instantiation", "Contextual_Preservation")
+    # lighting and wind rubrics allow scene-wide changes
+    assert not can_decide("Light_Control", "Contextual_Preservation")
+    assert not can_decide("Flow_Simulation", "Wind_Contextual_Preservation")
+    assert not can_decide("Reorientation", "Reorientation_Contextual_Preservation")
+
+
+def test_fractional_judge_scores_count_against_agreement():
+    assert _judge_score({"score": 0.5}) == 0.5
+    assert _judge_score({"score": 1, DECIDED_KEY: True}) is None
+
+    report = agreement_report([(1.0, KEEP), (0.5, KEEP), (0.0, CHANGE), (0.5, CHANGE)], PreservationThresholds())
+    assert report["decided"] == 4
+    assert report["agreement"] == 0.5
+    assert report["confusion"] == {"0": {"0": 1, "0.5": 1, "1": 0}, "1": {"0": 0, "0.5": 1, "1": 1}}
+    assert report["by_judge_score"]["0.5"]["n"] == 2
@@ -0,0 +1,70 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import run_eval
+from pipeline.jobqueue import JobQueue, LeaseLost
+from pipeline.planner import OUT_PAYLOAD
+
+from conftest import PROMPTS, run_files
+
+METRICS = [p.split("=", 1)[0] for p in PROMPTS]
+
+
+def _run(result_json, gen_prefix, *extra):
+    args = [a for p in PROMPTS for a in ("--prompt", p)]
+    run_eval.main(args + ["--task_name", "Addition", "--result_json", result_json, "--gen_prefix", gen_prefix,
+                          *extra], report_startup=False)
+
+
+def _work(queue, result_json, gen_prefix, worker_id):
+    _run(result_json, gen_prefix, "--queue", queue, "--queue_action", "work", "--worker_id", worker_id,
+         "--lease_s", "30")
+
+
+def test_two_workers_and_merge_match_single_process(mock_judge, addition_task, tmp_path, capsys):
+    new_run, gen_prefix = addition_task
+    single = new_run("single")
+    queued = new_run("queued")
+    queue = str(tmp_path / "q.db")
+    mock_judge.latency_s = 0.01  # keep both workers busy
+
+    _run(single, gen_prefix)
+    _run(queued, gen_prefix, "--queue", queue, "--queue_action", "enqueue")
+    with ThreadPoolExecutor(2) as ex:
+        for fut in [ex.submit(_work, queue, queued, gen_prefix, f"w{k}") for k in range(2)]:
+            fut.result()
+    _run(queued, gen_prefix, "--queue", queue, "--queue_action", "merge")
+
+    finished = dict(re.findall(r"\[QUEUE\] (w\d): finished (\d+) jobs", capsys.readouterr().out))
+    assert set(finished) == {"w0", "w1"} and all(int(n) > 0 for n in finished.values())
+    assert run_files(queued) == run_files(single)
+
+
+def test_expired_lease_is_requeued_and_stale_commit_rejected(mock_judge, addition_task, tmp_path, capsys):
+    new_run, gen_prefix = addition_task
+    single = new_run("single")
+    queued = new_run("queued")
+    queue = str(tmp_path / "q.db")
+
+    _run(single, gen_prefix)
+    _run(queued, gen_prefix, "--queue", queue, "--queue_action", "enqueue")
+
+    # a worker that leases a group with a short lease and then stalls
+    q = JobQueue(queue)
+    stale = q.lease("stalled", "Addition", METRICS, lease_s=0.2)
+    assert stale is not None and not stale.requeued
+    time.sleep(0.3)
+
+    _work(queue, queued, gen_prefix, "w0")
+    assert f"re-leased expired jobs {stale.sample_id}/{stale.grp}" in capsys.readouterr().out
+
+    # the stalled worker's late result is rejected: each job keeps exactly one outcome
+    with pytest.raises(LeaseLost):
+        q.commit(stale, "stalled", stale.todo[0][0], OUT_PAYLOAD, {"score": 0}, lease_s=0.2)
+    q.close()
+
+    _run(queued, gen_prefix, "--queue", queue, "--queue_action", "merge")
+    assert run_files(queued) == run_files(single)
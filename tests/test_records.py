@@ -0,0 +1,20 @@
+from pipeline.records import collect_score_columns, records_from_json, summarize_columns
+
+ITEMS = [
+    {"id": "0", "status": "success", "score": 0.5,
+     "M": {"score": 1, "reason": "r", "A": {"score": "0.5"}, "B": {"reason": "no score"}}},
+    {"id": "1", "status": "success", "score": "n/a",
+     "M": {"score": "bad", "A": {"score": 0}, "C": {"score": None}}},
+    {"id": "2", "status": "failed", "score": 1.0, "M": {"score": 0, "A": {"score": 1}}},
+    {"id": "3", "status": "success", "M": "not a payload"},
+]
+
+
+def test_summary_skips_unparseable_and_failed():
+    for items in (ITEMS, records_from_json(ITEMS)):
+        cols = collect_score_columns(items, ["M", "Unscored"])
+        assert summarize_columns(cols, ["M", "Unscored"]) == {
+            "score": 50.0, "M": 100.0, "M/A": 25.0, "Unscored": None,
+        }
+        cols.mask_metric(0, "M")
+        assert summarize_columns(cols, ["M"]) == {"score": 50.0, "M": None, "M/A": 0.0}
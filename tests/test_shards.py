@@ -0,0 +1,32 @@
+import json
+import os
+
+from pipeline import run_eval
+
+from conftest import PROMPTS, run_files
+
+
+def _run(result_json, gen_prefix, *extra):
+    args = [a for p in PROMPTS for a in ("--prompt", p)]
+    run_eval.main(args + ["--task_name", "Addition", "--result_json", result_json, "--gen_prefix", gen_prefix,
+                          "--repeat", "2", *extra], report_startup=False)
+
+
+def test_shards_and_merge_match_single_process(mock_judge, addition_task):
+    new_run, gen_prefix = addition_task
+    single = new_run("single")
+    sharded = new_run("sharded")
+
+    _run(single, gen_prefix)
+    for k in range(2):
+        _run(sharded, gen_prefix, "--shard", f"{k}/2")
+    _run(sharded, gen_prefix, "--merge_shards", "2")
+
+    expected = run_files(single)
+    assert set(expected) == {"Addition_results.json", "Addition_results_1.json", "Addition_results_2.json",
+                             "Addition_summary.json", "Addition_summary_1.json", "Addition_summary_2.json"}
+    assert run_files(sharded) == expected
+    # both shards judged part of each repeat
+    journals = os.listdir(os.path.join(os.path.dirname(sharded), "shards"))
+    assert sorted(journals) == [f"Addition_results_{i}.shard-{k}-of-2.jsonl" for i in (1, 2) for k in (0, 1)]
+    assert json.loads(expected["Addition_summary.json"])["mean"]["score"] is not None